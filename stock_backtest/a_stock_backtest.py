@@ -8,6 +8,9 @@ import io
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
+from resampler import convert_to_daily
+from daily_signals import DailySignals
+from performance import summarize
 
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
 plt.rcParams['axes.unicode_minus'] = False
@@ -161,27 +164,7 @@ class AStockBacktest:
         return df
 
     def _convert_to_daily(self, df: pd.DataFrame) -> pd.DataFrame:
-        if df.empty:
-            return pd.DataFrame()
-        
-        df['日期'] = pd.to_datetime(df['时间']).dt.date
-        df['日期'] = pd.to_datetime(df['日期'])
-        
-        daily = df.groupby('日期').agg({
-            '代码': 'first',
-            '名称': 'first',
-            '开盘价': 'first',
-            '收盘价': 'last',
-            '最高价': 'max',
-            '最低价': 'min',
-            '成交量': 'sum',
-            '成交额': 'sum',
-        }).reset_index()
-        
-        daily['涨跌幅'] = daily['收盘价'].pct_change() * 100
-        daily['振幅'] = ((daily['最高价'] - daily['最低价']) / daily['收盘价'].shift(1) * 100).fillna(0)
-        
-        return daily
+        return convert_to_daily(df)
 
     def _generate_signals(self, data: Dict, verbose: bool) -> pd.DataFrame:
         if verbose:
@@ -559,12 +542,12 @@ class BacktestEngine:
             self.sell(stock_code, price, date, reason)
 
     def run(self, data: Dict[str, pd.DataFrame], signals: pd.DataFrame):
-        all_dates = sorted(signals['date'].unique())
+        # 按日期排序分组一次，每天只切片当天的信号
+        daily_signals = DailySignals.from_frame(signals)
         
-        for date in all_dates:
-            daily_signals = signals[signals['date'] == date]
-            for _, signal in daily_signals.iterrows():
-                self.buy(signal['stock_code'], signal['price'], date)
+        for date, codes, buy_prices, _ in daily_signals:
+            for stock_code, price in zip(codes, buy_prices):
+                self.buy(stock_code, price, date)
             
             self.update(data, date)
             
@@ -598,54 +581,7 @@ class BacktestEngine:
         if not self.trades:
             return {}
         
-        final_value = self.equity_curve[-1]['portfolio_value'] if self.equity_curve else self.initial_capital
-        total_return = (final_value - self.initial_capital) / self.initial_capital
-        
-        days = len(self.equity_curve)
-        years = days / 252
-        annualized_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else 0
-        
-        if len(self.daily_returns) > 1:
-            volatility = np.std(self.daily_returns) * np.sqrt(252)
-            excess_returns = np.array(self.daily_returns) - 0.03 / 252
-            sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252) if np.std(excess_returns) > 0 else 0
-        else:
-            volatility = 0
-            sharpe_ratio = 0
-        
-        win_trades = [t for t in self.trades if t['return_pct'] > 0]
-        lose_trades = [t for t in self.trades if t['return_pct'] <= 0]
-        
-        win_rate = len(win_trades) / len(self.trades) if self.trades else 0
-        
         values = np.array([e['portfolio_value'] for e in self.equity_curve])
-        peak = np.maximum.accumulate(values)
-        drawdown = (values - peak) / peak
-        max_drawdown = np.min(drawdown) if len(drawdown) > 0 else 0
-        
-        trades_df = pd.DataFrame(self.trades)
-        avg_holding_days = trades_df['holding_days'].mean() if not trades_df.empty else 0
-        
-        profit_factor = 0
-        if lose_trades:
-            avg_loss = np.mean([t['return_pct'] for t in lose_trades])
-            avg_win = np.mean([t['return_pct'] for t in win_trades]) if win_trades else 0
-            profit_factor = abs(avg_win / avg_loss) * (len(win_trades) / len(lose_trades)) if avg_loss != 0 else 0
-        
-        return {
-            'initial_capital': self.initial_capital,
-            'final_value': final_value,
-            'total_return': total_return,
-            'annualized_return': annualized_return,
-            'volatility': volatility,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': max_drawdown,
-            'total_trades': len(self.trades),
-            'win_rate': win_rate,
-            'win_trades': len(win_trades),
-            'lose_trades': len(lose_trades),
-            'avg_win': np.mean([t['return_pct'] for t in win_trades]) if win_trades else 0,
-            'avg_loss': np.mean([t['return_pct'] for t in lose_trades]) if lose_trades else 0,
-            'profit_factor': profit_factor,
-            'avg_holding_days': avg_holding_days,
-        }
+        trade_returns = np.array([t['return_pct'] for t in self.trades])
+        holding_days = np.array([t['holding_days'] for t in self.trades])
+        return summarize(values, self.daily_returns, trade_returns, holding_days, self.initial_capital)
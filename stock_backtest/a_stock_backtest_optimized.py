@@ -5,15 +5,78 @@ import zipfile
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import os
 import io
+import copy
+import itertools
 from multiprocessing import Pool, cpu_count
 from data_db_cache import DatabaseCache
+from daily_signals import DailySignals
+from data_panel import MarketPanel, PanelData
+from data_ingest import ArchiveIngestor
+from data_optimizer import Prefetcher
+from performance import analyze, summarize
+from position_book import PositionBook
+from price_matrix import PriceMatrix
+from resampler import convert_to_daily
+from shared_frames import pack_frames, unpack_frames, ensure_tracker
+from signal_cache import SignalCache
+from trade_ledger import TradeLedger, EquityCurve
 
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
 plt.rcParams['axes.unicode_minus'] = False
 
+# 参数扫描中只影响交易引擎的参数，选股参数为strategy.params中的键
+ENGINE_PARAMS = (
+    'initial_capital', 'stop_loss_pct', 'take_profit_trigger', 'take_profit_fallback', 'max_holding_days',
+    'max_positions', 'position_size', 'commission', 'slippage', 'legacy_calendar',
+)
+
+# 只在构造回测对象时生效的参数，出现在扫描配置中时忽略
+CONSTRUCTOR_PARAMS = (
+    'data_dir', 'min_holding_days', 'years', 'panel_dir', 'cache_codec', 'db_path', 'signal_cache_dir', 'workers',
+)
+
+SWEEP_METRICS = [
+    'total_return', 'annualized_return', 'volatility', 'sharpe_ratio', 'max_drawdown',
+    'total_trades', 'win_rate', 'profit_factor', 'avg_holding_days', 'final_value',
+]
+
+# 逐行选股用到的方法，select_signals是它们合在一起的向量化实现
+ROW_SELECTION_METHODS = ('select_stock', 'is_limit_up', 'count_limit_up_days', 'get_latest_limit_up_info')
+
+# 单进程加载时预取线程提前读取并解压的股票数
+PREFETCH_WINDOW = 8
+
+# 加载数据的工作进程中只读共享的回测对象，任务只传一组股票代码
+_load_state = {}
+
+def _init_load_worker(backtest: 'AStockBacktest'):
+    """工作进程启动时接收一次回测对象，数据库连接在进程内首次使用时建立"""
+    _load_state['backtest'] = backtest
+
+def _load_stocks_task(stock_codes: List[str]) -> tuple:
+    """日线的数值列写入一块共享内存，只把描述信息传回主进程"""
+    return len(stock_codes), pack_frames(_load_state['backtest']._load_stocks(stock_codes))
+
+# 扫描工作进程中只读共享的数据、价格矩阵和各组信号
+_sweep_state = {}
+
+def _init_sweep_worker(data: Dict, prices: PriceMatrix, signals: Dict[tuple, DailySignals]):
+    """工作进程启动时接收一次数据，之后每个任务只传参数"""
+    _sweep_state.update(data=data, prices=prices, signals=signals)
+
+def _run_sweep_task(task: tuple) -> Dict:
+    signal_key, engine_params = task
+    signals = _sweep_state['signals'][signal_key]
+    if len(signals) == 0:
+        return {}
+    
+    engine = BacktestEngine(**engine_params)
+    engine.run(_sweep_state['data'], signals, _sweep_state['prices'])
+    return engine.calculate_metrics()
+
 class AStockBacktest:
     def __init__(
         self,
@@ -28,7 +91,13 @@ class AStockBacktest:
         position_size: float = 0.15,
         commission: float = 0.0003,
         slippage: float = 0.001,
-        years: List[int] = None
+        years: List[int] = None,
+        panel_dir: Optional[str] = None,
+        cache_codec: str = 'none',
+        db_path: str = 'stock_data.db',
+        signal_cache_dir: Optional[str] = None,
+        legacy_calendar: bool = False,
+        workers: Optional[int] = None
     ):
         self.data_dir = data_dir
         self.initial_capital = initial_capital
@@ -42,7 +111,13 @@ class AStockBacktest:
         self.position_size = position_size
         self.commission = commission
         self.slippage = slippage
+        # 为True时按旧方式只在有信号的日期检查持仓，用于对比
+        self.legacy_calendar = legacy_calendar
         self.years = years or list(range(2015, 2025))
+        self.panel_dir = panel_dir
+        self.panel = None
+        # 加载和导入数据的工作进程数，默认使用全部CPU
+        self.workers = workers or cpu_count()
         
         self.strategy_params = {
             'limit_up_pct': 9.9,
@@ -52,7 +127,9 @@ class AStockBacktest:
         }
         
         self.strategy = LimitUpStrategy(self.strategy_params)
-        self.data_cache = DatabaseCache('stock_data.db')
+        self.data_cache = DatabaseCache(db_path, cache_codec)
+        # 默认不缓存选股信号，每次运行重新生成；传入目录后才启用缓存
+        self.signal_cache = SignalCache(signal_cache_dir) if signal_cache_dir else None
 
     def run(self, stock_pool: Optional[List[str]] = None, verbose: bool = True, batch_size: int = 100) -> Dict:
         if verbose:
@@ -60,13 +137,22 @@ class AStockBacktest:
             print("A股策略回测")
             print("=" * 80)
         
-        data = self._load_data(stock_pool, verbose, batch_size)
+        # 每只股票一到达就生成信号，与后续股票的读取和解压重叠
+        # 信号缓存的键由全部数据计算，加载完成后才能查询，未命中时直接使用这些信号
+        stock_signals = None
+        on_stock = None
+        if getattr(self.strategy, 'vectorized', False):
+            stock_signals = {}
+            def on_stock(stock_code: str, df: pd.DataFrame):
+                stock_signals[stock_code] = self._stock_signals(stock_code, df, self.strategy)
+        
+        data = self._load_data(stock_pool, verbose, batch_size, on_stock)
         if not data:
             if verbose:
                 print("未加载到任何数据，回测终止")
             return {}
         
-        signals = self._generate_signals(data, verbose)
+        signals = self._get_signals(data, verbose, stock_signals=stock_signals)
         if signals.empty:
             if verbose:
                 print("未生成任何交易信号，回测终止")
@@ -81,10 +167,12 @@ class AStockBacktest:
             max_positions=self.max_positions,
             position_size=self.position_size,
             commission=self.commission,
-            slippage=self.slippage
+            slippage=self.slippage,
+            legacy_calendar=self.legacy_calendar
         )
         
-        engine.run(data, signals)
+        prices = PriceMatrix.from_panel(self.panel, years=self.years) if self.panel is not None else None
+        engine.run(data, signals, prices)
         results = engine.calculate_metrics()
         
         if verbose:
@@ -96,18 +184,20 @@ class AStockBacktest:
         
         return results
 
-    def _load_data(self, stock_pool: Optional[List[str]], verbose: bool, batch_size: int) -> Dict:
+    def _load_data(self, stock_pool: Optional[List[str]], verbose: bool, batch_size: int,
+                   on_stock: Optional[Callable[[str, pd.DataFrame], None]] = None) -> Dict:
+        """on_stock在每只股票加载完成时于主进程中调用，此时其余股票仍在后台加载"""
         if verbose:
             print(f"\n加载数据...")
         
+        if self.panel_dir and MarketPanel.exists(self.panel_dir):
+            return self._load_panel_data(stock_pool, verbose)
+        
+        ingestor = ArchiveIngestor(self.data_dir, self.data_cache, workers=self.workers)
+        fingerprints = ingestor.source_fingerprints(self.years)
         all_stock_codes = set()
-        for year in self.years:
-            zip_path = os.path.join(self.data_dir, f'{year}_60min.zip')
-            if os.path.exists(zip_path):
-                with zipfile.ZipFile(zip_path) as z:
-                    filenames = z.namelist()
-                    codes = [f.split('_')[0] for f in filenames if f.endswith('.csv')]
-                    all_stock_codes.update(codes)
+        for year_fingerprints in fingerprints.values():
+            all_stock_codes.update(year_fingerprints)
         
         stock_codes = stock_pool or list(all_stock_codes)
         
@@ -116,33 +206,83 @@ class AStockBacktest:
             print(f"股票池大小: {len(stock_codes)}")
             print(f"\n加载历史数据并转换为日线...")
         
-        data = {}
+        # 未缓存或压缩包、日线转换版本已变化的股票一次性从各年度压缩包重新导入，每个压缩包只打开一次
+        missing = self.data_cache.find_stale(stock_codes, self.years, fingerprints)
+        if missing:
+            if verbose:
+                print(f"需要从压缩包导入 {len(missing)} 只股票")
+            ingestor.ingest(self.years, missing, verbose)
+        
+        loaded = {}
         total = len(stock_codes)
+        workers = min(self.workers, total)
+        
+        # 整个加载过程只启动一个进程池，回测对象在进程启动时传一次，结果按完成顺序流式返回
+        if workers > 1:
+            chunk_size = max(1, min(batch_size, total // (workers * 4)))
+            chunks = [stock_codes[i:i+chunk_size] for i in range(0, total, chunk_size)]
+            ensure_tracker()
+            with Pool(workers, initializer=_init_load_worker, initargs=(self,)) as pool:
+                results = ((count, unpack_frames(packed)) for count, packed in pool.imap_unordered(_load_stocks_task, chunks))
+                self._collect_stocks(results, loaded, total, verbose, batch_size, on_stock)
+        else:
+            # 预取线程按股票池顺序提前读取并解码后面的股票；SQLite连接不能跨线程共用，预取线程使用数据缓存的副本
+            loader = copy.copy(self)
+            loader.data_cache = copy.copy(self.data_cache)
+            prefetcher = Prefetcher(loader._load_stock, stock_codes, window=PREFETCH_WINDOW, max_workers=1,
+                                    on_close=loader.data_cache.close)
+            results = ((1, {stock_code: df} if not df.empty else {}) for stock_code, df in prefetcher)
+            self._collect_stocks(results, loaded, total, verbose, batch_size, on_stock)
         
-        for i in range(0, total, batch_size):
-            batch_codes = stock_codes[i:i+batch_size]
-            
-            with Pool(min(cpu_count(), 4)) as pool:
-                batch_results = pool.map(self._process_single_stock, batch_codes)
-            
-            for stock_code, daily_df in batch_results:
-                if not daily_df.empty:
-                    data[stock_code] = daily_df
+        # 按股票池的顺序排列，信号和回测结果不受完成顺序影响
+        data = {stock_code: loaded[stock_code] for stock_code in stock_codes if stock_code in loaded}
+        
+        if verbose:
+            print(f"成功加载 {len(data)} 只股票的日线数据\n")
+        
+        return data
+
+    def _collect_stocks(self, results, loaded: Dict, total: int, verbose: bool, batch_size: int,
+                        on_stock: Optional[Callable[[str, pd.DataFrame], None]] = None):
+        processed = 0
+        for count, frames in results:
+            loaded.update(frames)
+            if on_stock is not None:
+                for stock_code, df in frames.items():
+                    on_stock(stock_code, df)
             
-            if verbose:
-                processed = min(i + batch_size, total)
+            # 每跨过batch_size只股票报告一次进度
+            reported = processed // batch_size
+            processed += count
+            if verbose and (processed // batch_size > reported or processed == total):
                 print(f"已加载 {processed}/{total} 只股票")
+
+    def _load_stocks(self, stock_codes: List[str]) -> Dict[str, pd.DataFrame]:
+        frames = {}
+        for stock_code in stock_codes:
+            daily_df = self._load_stock(stock_code)
+            if not daily_df.empty:
+                frames[stock_code] = daily_df
+        return frames
+
+    def _load_stock(self, stock_code: str) -> pd.DataFrame:
+        return self._process_single_stock(stock_code)[1]
+
+    def _load_panel_data(self, stock_pool: Optional[List[str]], verbose: bool) -> PanelData:
+        """不生成日线DataFrame，信号生成和扫描的工作进程直接读取内存映射的列"""
+        self.panel = MarketPanel(self.panel_dir)
+        data = PanelData(self.panel, stock_pool, self.years)
         
         if verbose:
+            print(f"从内存映射面板加载: {self.panel_dir}")
             print(f"成功加载 {len(data)} 只股票的日线数据\n")
         
         return data
 
     def _process_single_stock(self, stock_code: str) -> tuple:
-        if self.data_cache.is_cached(stock_code, self.years):
-            daily_df = self.data_cache.load_from_cache(stock_code, self.years)
-            if not daily_df.empty:
-                return stock_code, daily_df
+        cached = self.data_cache.get_or_none(stock_code, self.years)
+        if cached is not None:
+            return stock_code, cached
         
         df = self._load_single_stock(stock_code)
         if df.empty:
@@ -186,32 +326,40 @@ class AStockBacktest:
         return df
 
     def _convert_to_daily(self, df: pd.DataFrame) -> pd.DataFrame:
-        if df.empty:
-            return pd.DataFrame()
-        
-        df['日期'] = pd.to_datetime(df['时间']).dt.date
-        df['日期'] = pd.to_datetime(df['日期'])
-        
-        daily = df.groupby('日期').agg({
-            '代码': 'first',
-            '名称': 'first',
-            '开盘价': 'first',
-            '收盘价': 'last',
-            '最高价': 'max',
-            '最低价': 'min',
-            '成交量': 'sum',
-            '成交额': 'sum',
-        }).reset_index()
-        
-        daily['涨跌幅'] = daily['收盘价'].pct_change() * 100
-        daily['振幅'] = ((daily['最高价'] - daily['最低价']) / daily['收盘价'].shift(1) * 100).fillna(0)
-        
-        return daily
+        return convert_to_daily(df)
+
+    def _get_signals(self, data: Dict, verbose: bool, strategy: Optional['LimitUpStrategy'] = None,
+                     stock_signals: Optional[Dict] = None) -> pd.DataFrame:
+        """策略参数、年份和数据都未变化时直接读取持久缓存中的信号，否则生成并保存；
+        stock_signals为加载过程中按当前策略生成的各股票信号，未命中时合并使用"""
+        strategy = strategy or self.strategy
+        if self.signal_cache is not None:
+            key = self.signal_cache.get_key(strategy, self.years, data)
+            signals = self.signal_cache.load(key)
+            if signals is not None:
+                if verbose:
+                    print(f"从信号缓存读取 {len(signals)} 个信号\n")
+                return signals
+        
+        if stock_signals is not None:
+            signals = self._merge_signals(data, stock_signals, verbose)
+        else:
+            signals = self._generate_signals(data, verbose, strategy)
+        if self.signal_cache is not None:
+            self.signal_cache.save(key, signals)
+        return signals
 
-    def _generate_signals(self, data: Dict, verbose: bool) -> pd.DataFrame:
+    def _generate_signals(self, data: Dict, verbose: bool, strategy: Optional['LimitUpStrategy'] = None) -> pd.DataFrame:
         if verbose:
             print("生成选股信号...")
         
+        strategy = strategy or self.strategy
+        if getattr(strategy, 'vectorized', False):
+            signals_df = self._generate_signals_vectorized(data, strategy)
+            if verbose:
+                print(f"共生成 {len(signals_df)} 个信号\n")
+            return signals_df
+        
         signals = []
         
         for stock_code, df in data.items():
@@ -219,7 +367,7 @@ class AStockBacktest:
                 continue
             
             for idx in range(25, len(df)):
-                result = self.strategy.select_stock(df, idx)
+                result = strategy.select_stock(df, idx)
                 if result['selected']:
                     signals.append({
                         'stock_code': stock_code,
@@ -236,6 +384,57 @@ class AStockBacktest:
         
         return signals_df
 
+    def _generate_signals_vectorized(self, data: Dict, strategy: Optional['LimitUpStrategy'] = None) -> pd.DataFrame:
+        """整列计算每只股票的全部信号，输出与逐行循环完全一致"""
+        strategy = strategy or self.strategy
+        frames = [self._stock_signals(stock_code, self._signal_input(data, stock_code, strategy), strategy)
+                  for stock_code in data]
+        frames = [frame for frame in frames if frame is not None]
+        
+        if not frames:
+            return pd.DataFrame()
+        
+        return pd.concat(frames, ignore_index=True)
+
+    def _stock_signals(self, stock_code: str, df: pd.DataFrame, strategy: 'LimitUpStrategy') -> Optional[pd.DataFrame]:
+        if len(df) < 25:
+            return None
+        
+        result = strategy.select_signals(df)
+        hits = result['index']
+        if len(hits) == 0:
+            return None
+        
+        return pd.DataFrame({
+            'stock_code': stock_code,
+            'date': np.asarray(df['日期'])[hits],
+            'price': result['current_price'],
+            'limit_up_price': result['limit_up_price'],
+            'volume_ratio': result['volume_ratio'],
+        })
+
+    def _signal_input(self, data: Dict, stock_code: str, strategy: 'LimitUpStrategy'):
+        """面板数据且策略只按列名读取数组时直接传入面板的列视图，不生成DataFrame"""
+        if isinstance(data, PanelData) and getattr(strategy, 'column_arrays', False):
+            return data.arrays(stock_code)
+        return data[stock_code]
+
+    def _merge_signals(self, data: Dict, stock_signals: Dict, verbose: bool) -> pd.DataFrame:
+        """按数据的股票顺序合并加载过程中生成的信号，与一次性生成的结果一致；未经加载流程到达的股票在此补算"""
+        frames = []
+        for stock_code in data:
+            if stock_code in stock_signals:
+                frame = stock_signals[stock_code]
+            else:
+                frame = self._stock_signals(stock_code, self._signal_input(data, stock_code, self.strategy), self.strategy)
+            if frame is not None:
+                frames.append(frame)
+        
+        signals_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if verbose:
+            print(f"共生成 {len(signals_df)} 个信号\n")
+        return signals_df
+
     def _print_results(self, metrics: Dict):
         print()
         print("=" * 80)
@@ -264,12 +463,9 @@ class AStockBacktest:
         fig, axes = plt.subplots(2, 2, figsize=(15, 10))
         fig.suptitle('策略回测结果', fontsize=16, fontweight='bold')
         
-        equity = results.get('equity_curve', [])
+        equity = results.get('equity_curve')
         if equity:
-            dates = [e['date'] for e in equity]
-            values = [e['portfolio_value'] for e in equity]
-            
-            axes[0, 0].plot(dates, values, linewidth=2)
+            axes[0, 0].plot(equity.dates, equity.values, linewidth=2)
             axes[0, 0].axhline(y=self.initial_capital, color='r', linestyle='--', alpha=0.5, label='初始资金')
             axes[0, 0].set_title('资金曲线', fontsize=12, fontweight='bold')
             axes[0, 0].set_xlabel('日期')
@@ -279,7 +475,7 @@ class AStockBacktest:
             axes[0, 0].tick_params(axis='x', rotation=45)
             
             daily_returns = results.get('daily_returns', [])
-            if daily_returns:
+            if len(daily_returns) > 0:
                 axes[0, 1].hist(daily_returns, bins=50, edgecolor='black', alpha=0.7)
                 axes[0, 1].axvline(x=0, color='r', linestyle='--', linewidth=2)
                 axes[0, 1].set_title('每日收益率分布', fontsize=12, fontweight='bold')
@@ -287,10 +483,10 @@ class AStockBacktest:
                 axes[0, 1].set_ylabel('频数')
                 axes[0, 1].grid(True, alpha=0.3, axis='y')
         
-        trades = results.get('trades', [])
+        trades = results.get('trades')
         if trades:
-            returns = [t['return_pct'] for t in trades]
-            colors = ['green' if r > 0 else 'red' for r in returns]
+            returns = trades.return_pct
+            colors = np.where(returns > 0, 'green', 'red')
             axes[1, 0].bar(range(len(returns)), returns, color=colors, alpha=0.7)
             axes[1, 0].axhline(y=0, color='black', linestyle='-', linewidth=1)
             axes[1, 0].set_title('单笔交易盈亏', fontsize=12, fontweight='bold')
@@ -298,14 +494,14 @@ class AStockBacktest:
             axes[1, 0].set_ylabel('收益率 (%)')
             axes[1, 0].grid(True, alpha=0.3, axis='y')
             
-            win_trades = [t for t in trades if t['return_pct'] > 0]
-            lose_trades = [t for t in trades if t['return_pct'] <= 0]
+            win_count = int((returns > 0).sum())
+            lose_count = len(returns) - win_count
             
             labels = ['盈利', '亏损']
-            sizes = [len(win_trades), len(lose_trades)]
+            sizes = [win_count, lose_count]
             colors_pie = ['green', 'red']
             axes[1, 1].pie(sizes, labels=labels, colors=colors_pie, autopct='%1.1f%%', startangle=90)
-            axes[1, 1].set_title(f'胜率: {len(win_trades)/len(trades)*100:.1f}%', fontsize=12, fontweight='bold')
+            axes[1, 1].set_title(f'胜率: {win_count/len(returns)*100:.1f}%', fontsize=12, fontweight='bold')
         
         plt.tight_layout()
         
@@ -315,45 +511,85 @@ class AStockBacktest:
         else:
             plt.show()
 
+    def sweep(self, param_grid: Dict[str, List], stock_pool: Optional[List[str]] = None,
+              workers: Optional[int] = None, verbose: bool = True) -> pd.DataFrame:
+        """参数网格扫描：param_grid为参数名 -> 候选值列表，对全部组合回测，每组参数一行"""
+        names = list(param_grid)
+        configs = [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+        return self.run_configs(configs, stock_pool, workers, verbose)
+
+    def run_configs(self, configs: List[Dict], stock_pool: Optional[List[str]] = None,
+                    workers: Optional[int] = None, verbose: bool = True) -> pd.DataFrame:
+        """数据只加载一次，选股参数相同的配置共用一份信号，交易引擎在进程池中并行运行；
+        配置中可包含name、选股参数（strategy.params中的键）和交易引擎参数（ENGINE_PARAMS），
+        未给出的参数沿用当前回测对象的设置；构造参数（CONSTRUCTOR_PARAMS）提示后忽略"""
+        for config in configs:
+            unknown = set(config) - {'name'} - set(self.strategy.params) - set(ENGINE_PARAMS)
+            ignored = unknown & set(CONSTRUCTOR_PARAMS)
+            if unknown - ignored:
+                raise ValueError(f"未知的参数: {', '.join(sorted(unknown - ignored))}")
+            if ignored:
+                print(f"警告: {', '.join(sorted(ignored))} 只在创建回测对象时生效，配置中的值已忽略")
+        
+        data = self._load_data(stock_pool, verbose, 100)
+        if not data:
+            if verbose:
+                print("未加载到任何数据")
+            return pd.DataFrame()
+        
+        prices = PriceMatrix.from_panel(self.panel, years=self.years) if self.panel is not None else PriceMatrix.from_frames(data)
+        
+        signals = {}
+        tasks = []
+        for config in configs:
+            selection = {**self.strategy.params, **{k: v for k, v in config.items() if k in self.strategy.params}}
+            signal_key = tuple(sorted(selection.items()))
+            if signal_key not in signals:
+                strategy = copy.copy(self.strategy)
+                strategy.params = selection
+                # 每组信号只按日期分组一次，各进程中的交易引擎直接切片
+                signals[signal_key] = DailySignals.from_frame(self._get_signals(data, False, strategy))
+            
+            engine_params = {name: getattr(self, name) for name in ENGINE_PARAMS}
+            engine_params.update({k: v for k, v in config.items() if k in ENGINE_PARAMS})
+            tasks.append((signal_key, engine_params))
+        
+        if verbose:
+            print(f"{len(configs)} 组参数，生成 {len(signals)} 组选股信号")
+        
+        workers = min(workers or self.workers, len(tasks))
+        if workers > 1:
+            with Pool(workers, initializer=_init_sweep_worker, initargs=(data, prices, signals)) as pool:
+                results = pool.map(_run_sweep_task, tasks)
+        else:
+            _init_sweep_worker(data, prices, signals)
+            results = [_run_sweep_task(task) for task in tasks]
+        
+        rows = [{**config, **{metric: metrics.get(metric, np.nan) for metric in SWEEP_METRICS}}
+                for config, metrics in zip(configs, results)]
+        return pd.DataFrame(rows)
+
     def compare_strategies(self, strategies: List[Dict], stock_pool: Optional[List[str]] = None) -> pd.DataFrame:
         print("=" * 80)
         print("策略对比回测")
         print("=" * 80)
         print()
         
-        comparison_results = []
-        
-        for i, strategy_config in enumerate(strategies):
-            print(f"\n回测策略 {i+1}/{len(strategies)}: {strategy_config.get('name', '未命名')}")
-            
-            params = strategy_config.copy()
-            strategy_name = params.pop('name', f'策略{i+1}')
-            
-            backtest = AStockBacktest(
-                data_dir=self.data_dir,
-                initial_capital=self.initial_capital,
-                years=self.years,
-                **params
-            )
-            
-            results = backtest.run(stock_pool=stock_pool, verbose=False)
-            
-            if results:
-                results['strategy_name'] = strategy_name
-                comparison_results.append(results)
+        configs = [{'name': f'策略{i+1}', **config} for i, config in enumerate(strategies)]
+        comparison_df = self.run_configs(configs, stock_pool, verbose=False)
         
-        if not comparison_results:
+        if comparison_df.empty or comparison_df['total_trades'].isna().all():
             print("未获得任何回测结果")
             return pd.DataFrame()
         
-        comparison_df = pd.DataFrame(comparison_results)
+        comparison_df = comparison_df[comparison_df['total_trades'].notna()].rename(columns={'name': 'strategy_name'})
         
         metrics_to_show = [
             'strategy_name', 'total_return', 'annualized_return', 'sharpe_ratio',
             'max_drawdown', 'total_trades', 'win_rate', 'profit_factor'
         ]
         
-        comparison_df = comparison_df[metrics_to_show]
+        comparison_df = comparison_df[metrics_to_show].reset_index(drop=True)
         
         print()
         print("=" * 80)
@@ -412,9 +648,34 @@ class AStockBacktest:
 
 
 class LimitUpStrategy:
+    # 使用select_signals一次性计算整段历史的信号，可按实例关闭以回退到逐行select_stock
+    vectorized = True
+    # 选股逻辑变化时加1，信号缓存中旧逻辑生成的信号随之失效
+    cache_version = 1
+    # select_signals只用len和按列名取数组，可以直接传入内存映射面板的列视图
+    column_arrays = True
+    # 选股读取的日线列，信号缓存只对这些列的数据做指纹
+    signal_columns = ('日期', '涨跌幅', '收盘价', '成交量')
+
     def __init__(self, params: Dict):
         self.params = params
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # select_signals内联了逐行选股及其辅助方法的逻辑，子类重写其中任何一个却没有对应的向量化实现时，只能走逐行循环
+        if 'select_signals' in cls.__dict__:
+            # 提供了向量化实现的子类即使继承自已回退的父类，也使用select_signals
+            if 'vectorized' not in cls.__dict__:
+                cls.vectorized = True
+        elif any(name in cls.__dict__ for name in ROW_SELECTION_METHODS):
+            cls.vectorized = False
+        # 重写的select_signals默认按DataFrame传入，确认只按列名读取时可在子类中设column_arrays = True
+        if 'select_signals' in cls.__dict__ and 'column_arrays' not in cls.__dict__:
+            cls.column_arrays = False
+        # 重写了读取日线的方法却没有声明signal_columns时，信号缓存对全部列做指纹
+        if any(name in cls.__dict__ for name in ROW_SELECTION_METHODS + ('select_signals',)) and 'signal_columns' not in cls.__dict__:
+            cls.signal_columns = None
+
     def is_limit_up(self, pct_change: float) -> bool:
         return pct_change >= self.params['limit_up_pct'] * 0.95
 
@@ -474,6 +735,58 @@ class LimitUpStrategy:
             'volume_ratio': volume_ratio,
         }
 
+    def select_signals(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """select_stock的向量化版本，返回所有入选行的位置及对应字段；df也可以是面板的列视图"""
+        n = len(df)
+        idx = np.arange(n)
+        pct = np.asarray(df['涨跌幅'], dtype=np.float64)
+        close = np.asarray(df['收盘价'], dtype=np.float64)
+        volume = np.asarray(df['成交量'], dtype=np.float64)
+        
+        limit_up = ~np.isnan(pct) & (pct >= self.params['limit_up_pct'] * 0.95)
+        
+        # 滚动窗口内的涨停次数
+        cum = np.concatenate(([0], np.cumsum(limit_up)))
+        start = np.clip(idx - self.params['days_to_check'] + 1, 0, idx + 1)
+        count = cum[idx + 1] - cum[start]
+        
+        # 距离最近一次涨停的天数
+        last_limit_up = np.maximum.accumulate(np.where(limit_up, idx, -1))
+        bars_since = idx - last_limit_up
+        limit_up_price = np.where(last_limit_up >= 0, close[np.maximum(last_limit_up, 0)], 0)
+        
+        selected = (idx >= 25) & ~np.isnan(pct) & (count == 1) & (last_limit_up >= 0)
+        selected &= (bars_since >= 1) & (bars_since <= 5)
+        
+        # 涨停后每天收盘价都不能跌破涨停价的一定比例
+        min_close = limit_up_price * self.params['min_close_after_limit']
+        for k in range(5):
+            broken = close[np.maximum(idx - k, 0)] < min_close
+            selected &= ~((k < bars_since) & broken)
+        
+        # 前5日均量，按位置顺序累加以保证与逐行mean结果一致
+        valid = ~np.isnan(volume)
+        filled = np.where(valid, volume, 0.0)
+        volume_sum = np.zeros(n)
+        volume_count = np.zeros(n, dtype=np.int64)
+        for lag in range(5, 0, -1):
+            volume_sum[lag:] = volume_sum[lag:] + filled[:n - lag]
+            volume_count[lag:] += valid[:n - lag]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_avg = np.where(volume_count > 0, volume_sum / volume_count, np.nan)
+            volume_ratio = np.where((volume_avg > 0) & (volume > 0), volume / volume_avg, 0.0)
+        
+        selected &= volume_ratio >= self.params['min_volume_ratio']
+        hits = np.flatnonzero(selected)
+        
+        return {
+            'index': hits,
+            'limit_up_price': limit_up_price[hits],
+            'current_price': close[hits],
+            'volume_ratio': volume_ratio[hits],
+        }
+
 
 class BacktestEngine:
     def __init__(
@@ -486,14 +799,18 @@ class BacktestEngine:
         max_positions: int,
         position_size: float,
         commission: float,
-        slippage: float
+        slippage: float,
+        legacy_calendar: bool = False,
+        position_capacity: Optional[int] = None
     ):
         self.initial_capital = initial_capital
         self.cash = initial_capital
-        self.positions = {}
-        self.trades = []
-        self.equity_curve = []
-        self.daily_returns = []
+        # 持仓表预分配的槽位数，默认等于最大持仓数，不够时自动扩容
+        self.positions = PositionBook(position_capacity or max_positions)
+        self.prices = None
+        # 成交记录和净值曲线按列存入定长数组，计算指标和画图直接读取
+        self.trades = TradeLedger()
+        self.equity_curve = EquityCurve()
         self.commission = commission
         self.slippage = slippage
         self.stop_loss_pct = stop_loss_pct
@@ -502,6 +819,7 @@ class BacktestEngine:
         self.max_holding_days = max_holding_days
         self.max_positions = max_positions
         self.position_size = position_size
+        self.legacy_calendar = legacy_calendar
 
     def buy(self, stock_code: str, price: float, date: pd.Timestamp) -> bool:
         if len(self.positions) >= self.max_positions:
@@ -519,160 +837,112 @@ class BacktestEngine:
             return False
         
         self.cash -= cost
-        self.positions[stock_code] = {
-            'entry_price': buy_price,
-            'entry_date': date,
-            'quantity': quantity,
-            'highest_price': buy_price,
-            'take_profit_active': False,
-        }
+        # 记录价格矩阵中的列号和最近一个有效收盘价，逐日检查和估值时不再按代码查找
+        column = self.prices.code_index.get(stock_code) if self.prices is not None else None
+        self.positions.open(stock_code, column, buy_price, date, quantity, price)
         return True
 
     def sell(self, stock_code: str, price: float, date: pd.Timestamp, reason: str):
         if stock_code not in self.positions:
             return
         
-        pos = self.positions[stock_code]
+        entry_price, entry_date, quantity = self.positions.close(stock_code)
         sell_price = price * (1 - self.slippage)
-        revenue = sell_price * pos['quantity'] * (1 - self.commission)
+        revenue = sell_price * quantity * (1 - self.commission)
         
         self.cash += revenue
-        pct_return = (sell_price - pos['entry_price']) / pos['entry_price']
-        
-        self.trades.append({
-            'stock_code': stock_code,
-            'entry_date': pos['entry_date'],
-            'exit_date': date,
-            'entry_price': pos['entry_price'],
-            'exit_price': sell_price,
-            'return_pct': pct_return,
-            'holding_days': (date - pos['entry_date']).days,
-            'reason': reason,
-        })
         
-        del self.positions[stock_code]
+        self.trades.append(stock_code, entry_date, date, entry_price, sell_price, quantity,
+                           revenue - entry_price * quantity, reason)
+
+    def _check_exits(self, day_prices: Optional[np.ndarray], date: pd.Timestamp):
+        """对全部持仓一次向量化检查止损、止盈和持有期，按开仓顺序卖出"""
+        exits = self.positions.check_exits(
+            day_prices, date, self.stop_loss_pct, self.take_profit_trigger, self.take_profit_fallback, self.max_holding_days
+        )
+        for stock_code, price, reason in exits:
+            self.sell(stock_code, price, date, reason)
+
+    def _day_prices(self, date: pd.Timestamp) -> Optional[np.ndarray]:
+        row = self.prices.date_row(date)
+        return self.prices.values[row] if row is not None else None
 
     def update(self, data: Dict[str, pd.DataFrame], date: pd.Timestamp):
-        to_sell = []
+        if self.prices is None:
+            self.prices = PriceMatrix.from_frames(data)
         
-        for stock_code, pos in self.positions.items():
-            if stock_code not in data:
-                continue
-            
-            df = data[stock_code]
-            row = df[df['日期'] == date]
-            if row.empty:
-                continue
-            
-            current_price = row.iloc[0]['收盘价']
+        self._check_exits(self._day_prices(date), date)
+
+    def run(self, data: Dict[str, pd.DataFrame], signals, prices: Optional[PriceMatrix] = None):
+        """signals为信号DataFrame或已按日期分组的DailySignals"""
+        # 一次性构建日期×股票价格矩阵，之后每个持仓每天O(1)取价
+        self.prices = prices if prices is not None else PriceMatrix.from_frames(data)
+        if not isinstance(signals, DailySignals):
+            signals = DailySignals.from_frame(signals)
+        
+        if self.legacy_calendar:
+            self._run_signal_dates(data, signals)
+        else:
+            self._run_calendar(signals)
+        
+        for stock_code in self.positions:
+            if stock_code in data:
+                df = data[stock_code]
+                last_date = df.iloc[-1]['日期']
+                self.sell(stock_code, df.iloc[-1]['收盘价'], last_date, '回测结束')
+
+    @property
+    def daily_returns(self) -> np.ndarray:
+        return self.equity_curve.returns()
+
+    def _record_equity(self, date: pd.Timestamp, portfolio_value: float):
+        self.equity_curve.append(date, portfolio_value)
+
+    def _run_calendar(self, signals: DailySignals):
+        """从第一个信号日起逐个交易日推进：先按当日收盘价检查卖出，再买入当日信号，最后按收盘价估值；
+        每天的工作量只与持仓数有关，停牌的持仓按最近一个有效收盘价估值"""
+        # 价格矩阵行号 -> 信号日序号
+        signal_days = {int(row): i for i, row in enumerate(signals.rows(self.prices.date_index)) if row >= 0}
+        if not signal_days:
+            return
+        
+        values = self.prices.values
+        dates = self.prices.dates
+        for row in range(min(signal_days), len(dates)):
+            date = dates[row]
+            day_prices = values[row]
             
-            if current_price > pos['highest_price']:
-                pos['highest_price'] = current_price
+            self._check_exits(day_prices, date)
             
-            pct_return = (current_price - pos['entry_price']) / pos['entry_price']
-            holding_days = (date - pos['entry_date']).days
+            i = signal_days.get(row)
+            if i is not None:
+                codes, buy_prices, _ = signals.day(i)
+                for stock_code, price in zip(codes, buy_prices):
+                    self.buy(stock_code, price, date)
             
-            if pct_return <= self.stop_loss_pct:
-                to_sell.append((stock_code, current_price, f'止损 {pct_return:.2%}'))
-            elif pct_return >= self.take_profit_trigger:
-                pos['take_profit_active'] = True
-                drawdown = (pos['highest_price'] - current_price) / pos['highest_price']
-                if drawdown >= abs(self.take_profit_fallback):
-                    to_sell.append((stock_code, current_price, f'止盈 {pct_return:.2%}'))
-            elif holding_days >= self.max_holding_days:
-                to_sell.append((stock_code, current_price, f'时间止损 {holding_days}天'))
-        
-        for stock_code, price, reason in to_sell:
-            self.sell(stock_code, price, date, reason)
+            portfolio_value = self.cash + self.positions.market_value().sum()
+            self._record_equity(date, portfolio_value)
 
-    def run(self, data: Dict[str, pd.DataFrame], signals: pd.DataFrame):
-        all_dates = sorted(signals['date'].unique())
-        
-        for date in all_dates:
-            daily_signals = signals[signals['date'] == date]
-            for _, signal in daily_signals.iterrows():
-                self.buy(signal['stock_code'], signal['price'], date)
+    def _run_signal_dates(self, data: Dict[str, pd.DataFrame], signals: DailySignals):
+        """旧方式：只在有信号的日期买入、检查持仓和估值"""
+        for date, codes, buy_prices, _ in signals:
+            for stock_code, price in zip(codes, buy_prices):
+                self.buy(stock_code, price, date)
             
             self.update(data, date)
             
-            portfolio_value = self.cash
-            for stock_code, pos in self.positions.items():
-                if stock_code in data:
-                    df = data[stock_code]
-                    row = df[df['日期'] == date]
-                    if not row.empty:
-                        portfolio_value += row.iloc[0]['收盘价'] * pos['quantity']
-            
-            self.equity_curve.append({
-                'date': date,
-                'portfolio_value': portfolio_value
-            })
-            
-            if len(self.equity_curve) > 1:
-                prev_value = self.equity_curve[-2]['portfolio_value']
-                daily_return = (portfolio_value - prev_value) / prev_value
-                self.daily_returns.append(daily_return)
-            else:
-                self.daily_returns.append(0)
-        
-        for stock_code in list(self.positions.keys()):
-            if stock_code in data:
-                df = data[stock_code]
-                last_date = df.iloc[-1]['日期']
-                self.sell(stock_code, df.iloc[-1]['收盘价'], last_date, '回测结束')
+            # 当日没有价格的持仓不计入市值
+            day_prices = self._day_prices(date)
+            market_value = self.positions.market_value(day_prices).sum() if day_prices is not None else 0.0
+            self._record_equity(date, self.cash + market_value)
 
     def calculate_metrics(self) -> Dict:
         if not self.trades:
             return {}
         
-        final_value = self.equity_curve[-1]['portfolio_value'] if self.equity_curve else self.initial_capital
-        total_return = (final_value - self.initial_capital) / self.initial_capital
-        
-        days = len(self.equity_curve)
-        years = days / 252
-        annualized_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else 0
-        
-        if len(self.daily_returns) > 1:
-            volatility = np.std(self.daily_returns) * np.sqrt(252)
-            excess_returns = np.array(self.daily_returns) - 0.03 / 252
-            sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252) if np.std(excess_returns) > 0 else 0
-        else:
-            volatility = 0
-            sharpe_ratio = 0
-        
-        win_trades = [t for t in self.trades if t['return_pct'] > 0]
-        lose_trades = [t for t in self.trades if t['return_pct'] <= 0]
-        
-        win_rate = len(win_trades) / len(self.trades) if self.trades else 0
-        
-        values = np.array([e['portfolio_value'] for e in self.equity_curve])
-        peak = np.maximum.accumulate(values)
-        drawdown = (values - peak) / peak
-        max_drawdown = np.min(drawdown) if len(drawdown) > 0 else 0
-        
-        trades_df = pd.DataFrame(self.trades)
-        avg_holding_days = trades_df['holding_days'].mean() if not trades_df.empty else 0
-        
-        profit_factor = 0
-        if lose_trades:
-            avg_loss = np.mean([t['return_pct'] for t in lose_trades])
-            avg_win = np.mean([t['return_pct'] for t in win_trades]) if win_trades else 0
-            profit_factor = abs(avg_win / avg_loss) * (len(win_trades) / len(lose_trades)) if avg_loss != 0 else 0
-        
-        return {
-            'initial_capital': self.initial_capital,
-            'final_value': final_value,
-            'total_return': total_return,
-            'annualized_return': annualized_return,
-            'volatility': volatility,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': max_drawdown,
-            'total_trades': len(self.trades),
-            'win_rate': win_rate,
-            'win_trades': len(win_trades),
-            'lose_trades': len(lose_trades),
-            'avg_win': np.mean([t['return_pct'] for t in win_trades]) if win_trades else 0,
-            'avg_loss': np.mean([t['return_pct'] for t in lose_trades]) if lose_trades else 0,
-            'profit_factor': profit_factor,
-            'avg_holding_days': avg_holding_days,
-        }
+        return summarize(self.equity_curve.values, self.daily_returns, self.trades.return_pct,
+                         self.trades.holding_days, self.initial_capital)
+
+    def analyze(self, window: int = 63) -> Dict:
+        """滚动波动率/夏普、回撤序列、月度和年度收益、按卖出原因和股票的盈亏归因、逐笔收益分布"""
+        return analyze(self.equity_curve, self.trades, self.initial_capital, window)
@@ -1,10 +1,18 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
+from daily_signals import DailySignals
+from performance import summarize
+from price_matrix import PriceMatrix
+from trade_ledger import TradeLedger
 from config import BACKTEST_CONFIG, STRATEGY_CONFIG, RISK_FREE_RATE, TRADING_DAYS_PER_YEAR
 
 class Position:
+    # 固定属性，不为每个持仓创建__dict__
+    __slots__ = ('stock_code', 'entry_price', 'entry_date', 'quantity', 'stop_loss_price', 'highest_price',
+                 'take_profit_active', 'exit_price', 'exit_date', 'exit_reason')
+
     def __init__(self, stock_code: str, entry_price: float, entry_date: pd.Timestamp, 
                  quantity: int, stop_loss_price: float):
         self.stock_code = stock_code
@@ -47,7 +55,8 @@ class BacktestEngine:
         self.initial_capital = initial_capital or BACKTEST_CONFIG['initial_capital']
         self.cash = self.initial_capital
         self.positions: Dict[str, Position] = {}
-        self.trades: List[Dict] = []
+        self.prices: Optional[PriceMatrix] = None
+        self.trades = TradeLedger()
         self.daily_returns: List[float] = []
         self.portfolio_values: List[float] = []
         self.dates: List[pd.Timestamp] = []
@@ -99,37 +108,22 @@ class BacktestEngine:
         position.exit_date = date
         position.exit_reason = reason
         
-        pct_return = (sell_price - position.entry_price) / position.entry_price
-        
-        self.trades.append({
-            'stock_code': stock_code,
-            'entry_date': position.entry_date,
-            'exit_date': date,
-            'entry_price': position.entry_price,
-            'exit_price': sell_price,
-            'quantity': position.quantity,
-            'return_pct': pct_return,
-            'holding_days': (date - position.entry_date).days,
-            'reason': reason,
-            'profit': total_value - position.entry_price * position.quantity
-        })
+        self.trades.append(stock_code, position.entry_date, date, position.entry_price, sell_price, position.quantity,
+                           total_value - position.entry_price * position.quantity, reason)
         
         del self.positions[stock_code]
 
     def update_positions(self, stock_data: Dict[str, pd.DataFrame], current_date: pd.Timestamp):
+        if self.prices is None:
+            self.prices = PriceMatrix.from_frames(stock_data, price_column='收盘')
+        
         to_sell = []
+        row = self.prices.date_row(current_date)
         
         for stock_code, position in self.positions.items():
-            if stock_code not in stock_data:
+            current_price = self.prices.price_at(row, stock_code)
+            if np.isnan(current_price):
                 continue
-            
-            df = stock_data[stock_code]
-            row = df[df['日期'] == current_date]
-            
-            if row.empty:
-                continue
-            
-            current_price = row.iloc[0]['收盘']
             position.update_highest_price(current_price)
             
             holding_days = (current_date - position.entry_date).days
@@ -142,23 +136,22 @@ class BacktestEngine:
             self.sell_stock(stock_code, price, current_date, reason)
 
     def run(self, data: Dict[str, pd.DataFrame], signals_df: pd.DataFrame):
-        all_dates = sorted(signals_df['date'].unique())
+        self.prices = PriceMatrix.from_frames(data, price_column='收盘')
+        # 按日期排序分组一次，每天只切片当天的信号
+        daily_signals = DailySignals.from_frame(signals_df)
         
-        for i, date in enumerate(all_dates):
-            daily_signals = signals_df[signals_df['date'] == date]
-            
-            for _, signal in daily_signals.iterrows():
-                self.buy_stock(signal['stock_code'], signal['price'], date)
+        for i, (date, codes, buy_prices, _) in enumerate(daily_signals):
+            for stock_code, price in zip(codes, buy_prices):
+                self.buy_stock(stock_code, price, date)
             
             self.update_positions(data, date)
             
             portfolio_value = self.cash
+            row = self.prices.date_row(date)
             for stock_code, position in self.positions.items():
-                if stock_code in data:
-                    df = data[stock_code]
-                    row = df[df['日期'] == date]
-                    if not row.empty:
-                        portfolio_value += row.iloc[0]['收盘'] * position.quantity
+                current_price = self.prices.price_at(row, stock_code)
+                if not np.isnan(current_price):
+                    portfolio_value += current_price * position.quantity
             
             self.portfolio_values.append(portfolio_value)
             self.dates.append(date)
@@ -179,66 +172,11 @@ class BacktestEngine:
         if not self.trades and len(self.portfolio_values) < 2:
             return {}
         
-        final_value = self.portfolio_values[-1] if self.portfolio_values else self.initial_capital
-        total_return = (final_value - self.initial_capital) / self.initial_capital
-        
-        days = len(self.portfolio_values)
-        years = days / TRADING_DAYS_PER_YEAR
-        
-        annualized_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else 0
-        
-        if len(self.daily_returns) > 1:
-            volatility = np.std(self.daily_returns) * np.sqrt(TRADING_DAYS_PER_YEAR)
-            excess_returns = np.array(self.daily_returns) - RISK_FREE_RATE / TRADING_DAYS_PER_YEAR
-            sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(TRADING_DAYS_PER_YEAR) if np.std(excess_returns) > 0 else 0
-        else:
-            volatility = 0
-            sharpe_ratio = 0
-        
-        win_trades = [t for t in self.trades if t['return_pct'] > 0]
-        lose_trades = [t for t in self.trades if t['return_pct'] <= 0]
-        
-        win_rate = len(win_trades) / len(self.trades) if self.trades else 0
-        
-        avg_win = np.mean([t['return_pct'] for t in win_trades]) if win_trades else 0
-        avg_loss = np.mean([t['return_pct'] for t in lose_trades]) if lose_trades else 0
-        
-        profit_factor = abs(avg_win / avg_loss) * (len(win_trades) / len(lose_trades)) if lose_trades and avg_loss != 0 else 0
-        
-        max_drawdown = self._calculate_max_drawdown()
-        
-        trades_df = pd.DataFrame(self.trades)
-        avg_holding_days = trades_df['holding_days'].mean() if not trades_df.empty else 0
-        
-        return {
-            'initial_capital': self.initial_capital,
-            'final_value': final_value,
-            'total_return': total_return,
-            'annualized_return': annualized_return,
-            'volatility': volatility,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': max_drawdown,
-            'total_trades': len(self.trades),
-            'win_rate': win_rate,
-            'win_trades': len(win_trades),
-            'lose_trades': len(lose_trades),
-            'avg_win': avg_win,
-            'avg_loss': avg_loss,
-            'profit_factor': profit_factor,
-            'avg_holding_days': avg_holding_days,
-        }
-
-    def _calculate_max_drawdown(self) -> float:
-        if len(self.portfolio_values) < 2:
-            return 0
-        
-        values = np.array(self.portfolio_values)
-        peak = np.maximum.accumulate(values)
-        drawdown = (values - peak) / peak
-        return np.min(drawdown)
+        return summarize(np.array(self.portfolio_values), self.daily_returns, self.trades.return_pct, self.trades.holding_days,
+                         self.initial_capital, RISK_FREE_RATE, TRADING_DAYS_PER_YEAR)
 
     def get_trades_df(self) -> pd.DataFrame:
-        return pd.DataFrame(self.trades)
+        return self.trades.to_frame()
 
     def get_equity_curve(self) -> pd.DataFrame:
         return pd.DataFrame({
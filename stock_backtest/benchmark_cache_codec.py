@@ -0,0 +1,73 @@
+from cache_codec import Codec, available_codecs, loads
+from data_cache_optimized import OptimizedDataCache
+from data_db_cache import DatabaseCache
+from a_stock_backtest_optimized import AStockBacktest
+import tempfile
+import pickle
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+
+def load_samples() -> dict:
+    source = OptimizedDataCache(CACHE_DIR)
+    stock_codes = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR) if f.endswith('.lz4'))
+    data = {code: source.load_from_cache(code, YEARS) for code in stock_codes}
+    for df in data.values():
+        df['名称'] = df['名称'].astype(str)
+    return data
+
+def benchmark_codec(codec: Codec, data: dict, raw_bytes: int, repeat: int) -> dict:
+    frames = list(data.values())
+    
+    start_time = time.time()
+    for _ in range(repeat):
+        encoded = [codec.dumps(df) for df in frames]
+    encode_seconds = (time.time() - start_time) / repeat
+    
+    start_time = time.time()
+    for _ in range(repeat):
+        for blob in encoded:
+            loads(blob)
+    decode_seconds = (time.time() - start_time) / repeat
+    
+    return {
+        'ratio': raw_bytes / sum(len(blob) for blob in encoded),
+        'encode_mb_s': raw_bytes / 1024 / 1024 / encode_seconds,
+        'decode_mb_s': raw_bytes / 1024 / 1024 / decode_seconds,
+    }
+
+def benchmark_load_data(codec: Codec, data: dict, tmp_dir: str) -> dict:
+    db_path = os.path.join(tmp_dir, f"{codec.spec.replace(':', '_').replace('+', '_')}.db")
+    db_cache = DatabaseCache(db_path, codec)
+    db_cache.batch_save(data, YEARS)
+    size_mb = db_cache.get_cache_stats()['size_mb']
+    db_cache.close()
+    
+    # 数据目录中没有压缩包，全部股票从数据库缓存读取；数据库和信号缓存都在临时目录中
+    backtest = AStockBacktest(data_dir=tmp_dir, years=YEARS, cache_codec=codec, db_path=db_path,
+                              signal_cache_dir=os.path.join(tmp_dir, 'signal_cache'))
+    start_time = time.time()
+    loaded = backtest._load_data(list(data), False, 100)
+    seconds = time.time() - start_time
+    assert len(loaded) == len(data)
+    return {'db_mb': size_mb, 'load_seconds': seconds}
+
+def benchmark_cache_codec(repeat: int = 5):
+    data = load_samples()
+    raw_bytes = sum(len(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)) for df in data.values())
+    print(f"样本: {len(data)} 只股票, pickle后 {raw_bytes / 1024 / 1024:.2f} MB")
+    print()
+    print(f"{'编码':<16}{'压缩比':>8}{'编码MB/s':>12}{'解码MB/s':>12}{'数据库MB':>10}{'_load_data秒':>14}")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for spec in available_codecs():
+            codec = Codec.parse(spec)
+            result = benchmark_codec(codec, data, raw_bytes, repeat)
+            result.update(benchmark_load_data(codec, data, tmp_dir))
+            print(f"{codec.spec:<16}{result['ratio']:>8.2f}{result['encode_mb_s']:>12.0f}{result['decode_mb_s']:>12.0f}"
+                  f"{result['db_mb']:>10.2f}{result['load_seconds']:>14.2f}")
+
+if __name__ == "__main__":
+    benchmark_cache_codec()
@@ -0,0 +1,57 @@
+from price_matrix import PriceMatrix
+import pandas as pd
+import numpy as np
+import time
+
+def generate_close_data(num_stocks: int, num_years: int, seed: int = 42) -> dict:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-01', periods=num_years * 243)
+    
+    data = {}
+    for i in range(num_stocks):
+        # 随机剔除部分交易日，模拟停牌和上市时间不同
+        keep = rng.random(len(dates)) > 0.05
+        closes = 10 * np.cumprod(1 + rng.normal(0, 0.02, keep.sum()))
+        data[f'sz{i:06d}'] = pd.DataFrame({'日期': dates[keep], '收盘价': np.round(closes, 2)})
+    return data
+
+def benchmark_price_lookup(num_stocks: int = 5000, num_years: int = 10, max_positions: int = 5):
+    print(f"生成 {num_stocks} 只股票 × {num_years} 年的模拟数据...")
+    data = generate_close_data(num_stocks, num_years)
+    stock_codes = list(data.keys())
+    all_dates = sorted(set().union(*(df['日期'] for df in data.values())))
+    
+    # 模拟回测：每个交易日持有max_positions只股票，update和估值各查一次价格
+    rng = np.random.default_rng(0)
+    queries = [(date, stock_codes[j]) for date in all_dates
+               for j in rng.choice(len(stock_codes), max_positions, replace=False)] * 2
+    print(f"交易日: {len(all_dates)}, 价格查询次数: {len(queries)}")
+    print()
+    
+    start_time = time.time()
+    old_prices = []
+    for date, stock_code in queries:
+        df = data[stock_code]
+        row = df[df['日期'] == date]
+        old_prices.append(row.iloc[0]['收盘价'] if not row.empty else np.nan)
+    old_elapsed = time.time() - start_time
+    print(f"逐行布尔过滤: {old_elapsed:.2f} 秒")
+    
+    start_time = time.time()
+    prices = PriceMatrix.from_frames(data)
+    build_elapsed = time.time() - start_time
+    
+    start_time = time.time()
+    new_prices = []
+    for date, stock_code in queries:
+        new_prices.append(prices.get(stock_code, date))
+    lookup_elapsed = time.time() - start_time
+    print(f"价格矩阵: 构建 {build_elapsed:.2f} 秒, 查询 {lookup_elapsed:.2f} 秒")
+    
+    assert np.array_equal(np.array(old_prices, dtype=float), np.array(new_prices), equal_nan=True)
+    
+    speedup = old_elapsed / (build_elapsed + lookup_elapsed)
+    print(f"\n速度提升: {speedup:.1f} 倍 (含矩阵构建)")
+
+if __name__ == "__main__":
+    benchmark_price_lookup()
@@ -0,0 +1,186 @@
+import pickle
+import struct
+import numpy as np
+from typing import Any, List
+import lz4.frame
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 编码后的数据以固定头开始：魔数、压缩算法、压缩级别、标志位
+MAGIC = b'SCC1'
+HEADER = struct.Struct('<4sBbB')
+
+CODEC_IDS = {'none': 0, 'lz4': 1, 'zstd': 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+# 不带数据头的旧格式 -> 对应的压缩算法：pickle为未压缩的pickle，lz4frame为lz4.frame压缩的pickle；
+# 各文件缓存默认仍按旧格式写入，loads直接识别
+LEGACY_CODECS = {'pickle': 'none', 'lz4frame': 'lz4'}
+
+# 标志位：数据按元素字节重排（compress时高4位为元素字节数）；数据是带带外缓冲区的pickle
+FLAG_SHUFFLE = 1
+FLAG_PICKLE = 2
+
+# 旧格式：lz4.frame压缩的文件以该魔数开始
+LZ4_FRAME_MAGIC = b'\x04\x22\x4d\x18'
+
+# 带外缓冲区的描述：长度、元素字节数
+BUFFER_ENTRY = struct.Struct('<QB')
+BUFFER_COUNT = struct.Struct('<I')
+
+# 解码损坏或不兼容的缓存数据时可能出现的错误：解压失败、数据头或长度不符、pickle无法还原（含引用的类已不存在）
+DECODE_ERRORS = (ValueError, RuntimeError, EOFError, struct.error, pickle.UnpicklingError, AttributeError, ImportError)
+if zstandard is not None:
+    DECODE_ERRORS += (zstandard.ZstdError,)
+
+def _shuffle(data: bytes, itemsize: int) -> bytes:
+    """把每个元素的第k个字节排在一起，浮点数的指数位、整数的高位字节集中后更容易压缩"""
+    if itemsize <= 1 or len(data) % itemsize:
+        return data
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+def _unshuffle(data: bytes, itemsize: int) -> bytes:
+    if itemsize <= 1 or len(data) % itemsize:
+        return data
+    return np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+
+class Codec:
+    """缓存数据的压缩编码：none、lz4、zstd(需安装zstandard)，可选按元素字节重排；解码时按数据头自动识别。
+    pickle、lz4frame为不带数据头的旧格式，只影响dumps"""
+    def __init__(self, name: str = 'lz4', level: int = 0, shuffle: bool = False):
+        if name not in CODEC_IDS and name not in LEGACY_CODECS:
+            raise ValueError(f"不支持的压缩算法: {name}，可选 {', '.join(list(CODEC_IDS) + list(LEGACY_CODECS))}")
+        if name == 'zstd' and zstandard is None:
+            raise ImportError("zstd压缩需要安装zstandard: pip install zstandard")
+        if name in LEGACY_CODECS and shuffle:
+            raise ValueError(f"旧格式{name}不支持按字节重排")
+        
+        self.name = name
+        # 实际使用的压缩算法
+        self.algorithm = LEGACY_CODECS.get(name, name)
+        self.level = level
+        self.shuffle = shuffle
+    
+    @classmethod
+    def parse(cls, spec) -> 'Codec':
+        """从字符串创建，如 'lz4'、'zstd:3'、'zstd:9+shuffle'、'none'；已是Codec时原样返回"""
+        if isinstance(spec, Codec):
+            return spec
+        if spec is None:
+            return cls('none')
+        
+        shuffle = spec.endswith('+shuffle')
+        name, _, level = spec[:-len('+shuffle')].partition(':') if shuffle else spec.partition(':')
+        default_level = 3 if name == 'zstd' else 0
+        return cls(name, int(level) if level else default_level, shuffle)
+    
+    @property
+    def legacy(self) -> bool:
+        return self.name in LEGACY_CODECS
+    
+    @property
+    def spec(self) -> str:
+        spec = self.name if self.algorithm == 'none' else f"{self.name}:{self.level}"
+        return spec + '+shuffle' if self.shuffle else spec
+    
+    def __repr__(self):
+        return f"Codec({self.spec!r})"
+    
+    def _compress(self, data: bytes) -> bytes:
+        if self.algorithm == 'lz4':
+            return lz4.frame.compress(data, compression_level=self.level)
+        if self.algorithm == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return data
+    
+    def compress(self, data: bytes, itemsize: int = 1) -> bytes:
+        """压缩一段定长元素的数组数据，itemsize为元素字节数；数组数据没有旧格式，旧格式按对应的算法加数据头"""
+        flags = 0
+        if self.shuffle and itemsize > 1:
+            data = _shuffle(data, itemsize)
+            flags = FLAG_SHUFFLE | itemsize << 4
+        return HEADER.pack(MAGIC, CODEC_IDS[self.algorithm], self.level, flags) + self._compress(data)
+    
+    def dumps(self, obj: Any) -> bytes:
+        """pickle后压缩；numpy数组以带外缓冲区取出，按各自的元素字节数重排"""
+        if self.legacy:
+            return self._compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        
+        buffers = []
+        body = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        
+        parts = [BUFFER_COUNT.pack(len(buffers))]
+        chunks = []
+        for buffer in buffers:
+            view = memoryview(buffer)
+            raw = buffer.raw().tobytes()
+            itemsize = view.itemsize if self.shuffle else 1
+            parts.append(BUFFER_ENTRY.pack(len(raw), itemsize))
+            chunks.append(_shuffle(raw, itemsize))
+        
+        payload = b''.join(parts + [body] + chunks)
+        flags = FLAG_PICKLE | (FLAG_SHUFFLE if self.shuffle else 0)
+        return HEADER.pack(MAGIC, CODEC_IDS[self.name], self.level, flags) + self._compress(payload)
+
+def _decompress_payload(data: bytes) -> tuple:
+    _, codec_id, _, flags = HEADER.unpack_from(data)
+    payload = memoryview(data)[HEADER.size:]
+    
+    name = CODEC_NAMES.get(codec_id)
+    if name == 'lz4':
+        payload = lz4.frame.decompress(payload)
+    elif name == 'zstd':
+        if zstandard is None:
+            raise ImportError("读取zstd压缩的缓存需要安装zstandard: pip install zstandard")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif name is None:
+        raise ValueError(f"未知的压缩算法编号: {codec_id}")
+    return bytes(payload), flags
+
+def is_encoded(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+def decompress(data: bytes) -> bytes:
+    """Codec.compress的逆操作；没有数据头的原始数据原样返回"""
+    if not is_encoded(data):
+        return data
+    
+    payload, flags = _decompress_payload(data)
+    if flags & FLAG_SHUFFLE:
+        payload = _unshuffle(payload, flags >> 4)
+    return payload
+
+def loads(data: bytes) -> Any:
+    """Codec.dumps的逆操作，也能读取旧格式：lz4.frame压缩的pickle和未压缩的pickle"""
+    if data[:len(LZ4_FRAME_MAGIC)] == LZ4_FRAME_MAGIC:
+        return pickle.loads(lz4.frame.decompress(data))
+    if not is_encoded(data):
+        return pickle.loads(data)
+    
+    payload, flags = _decompress_payload(data)
+    count = BUFFER_COUNT.unpack_from(payload)[0]
+    offset = BUFFER_COUNT.size
+    entries: List[tuple] = []
+    for _ in range(count):
+        entries.append(BUFFER_ENTRY.unpack_from(payload, offset))
+        offset += BUFFER_ENTRY.size
+    
+    body_end = len(payload) - sum(length for length, _ in entries)
+    body = payload[offset:body_end]
+    
+    buffers = []
+    offset = body_end
+    for length, itemsize in entries:
+        chunk = payload[offset:offset + length]
+        buffers.append(bytearray(_unshuffle(chunk, itemsize)))
+        offset += length
+    return pickle.loads(body, buffers=buffers)
+
+def available_codecs() -> List[str]:
+    codecs = ['pickle', 'lz4frame:0', 'none', 'lz4:0', 'lz4:9', 'lz4:0+shuffle']
+    if zstandard is not None:
+        codecs += ['zstd:1', 'zstd:3', 'zstd:9', 'zstd:3+shuffle', 'zstd:9+shuffle']
+    return codecs
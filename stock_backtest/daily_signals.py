@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from typing import Iterator, Tuple
+
+class DailySignals:
+    """按日期分组的信号：稳定排序一次后代码、价格、评分存为连续数组，offsets[i]:offsets[i+1]是第i个信号日的信号，
+    同一天内保持原来的先后顺序"""
+    def __init__(self, dates, offsets: np.ndarray, codes: np.ndarray, prices: np.ndarray, scores: np.ndarray):
+        self.dates = pd.DatetimeIndex(dates)
+        self.offsets = offsets
+        self.codes = codes
+        self.prices = prices
+        self.scores = scores
+    
+    @classmethod
+    def from_frame(cls, signals: pd.DataFrame, score_column: str = 'volume_ratio', date_column: str = 'date',
+                   code_column: str = 'stock_code', price_column: str = 'price') -> 'DailySignals':
+        if signals.empty:
+            return cls([], np.zeros(1, dtype=np.int64), np.empty(0, dtype=object), np.empty(0), np.empty(0))
+        
+        dates = signals[date_column].to_numpy(dtype='datetime64[ns]')
+        order = np.argsort(dates, kind='stable')
+        dates = dates[order]
+        
+        # 每组第一条信号的位置，末尾补上总数
+        starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
+        offsets = np.append(starts, len(dates))
+        
+        codes = signals[code_column].to_numpy(dtype=object)[order]
+        prices = signals[price_column].to_numpy(dtype=np.float64)[order]
+        if score_column in signals.columns:
+            scores = signals[score_column].to_numpy(dtype=np.float64)[order]
+        else:
+            scores = np.full(len(order), np.nan)
+        
+        return cls(dates[starts], offsets, codes, prices, scores)
+    
+    def __len__(self) -> int:
+        return len(self.dates)
+    
+    @property
+    def total(self) -> int:
+        return int(self.offsets[-1])
+    
+    def day(self, i: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.codes[start:end], self.prices[start:end], self.scores[start:end]
+    
+    def __iter__(self) -> Iterator[Tuple[pd.Timestamp, np.ndarray, np.ndarray, np.ndarray]]:
+        for i, date in enumerate(self.dates):
+            yield (date,) + self.day(i)
+    
+    def rows(self, date_index: dict) -> np.ndarray:
+        """每个信号日在价格矩阵中的行号，矩阵中没有的日期为-1"""
+        return np.array([date_index.get(date, -1) for date in self.dates], dtype=np.int64)
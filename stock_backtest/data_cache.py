@@ -1,13 +1,15 @@
 import os
 import pandas as pd
-import pickle
+from cache_codec import Codec, loads
 from typing import Dict, List
 import zipfile
 import io
 
 class DataCache:
-    def __init__(self, cache_dir: str = 'data_cache'):
+    def __init__(self, cache_dir: str = 'data_cache', codec: str = 'pickle'):
         self.cache_dir = cache_dir
+        # 写入时使用的压缩编码，读取时按文件头自动识别，旧版未压缩的pickle仍可读取
+        self.codec = Codec.parse(codec)
         os.makedirs(self.cache_dir, exist_ok=True)
     
     def get_cache_key(self, stock_code: str, years: List[int]) -> str:
@@ -28,7 +30,7 @@ class DataCache:
         
         try:
             with open(cache_path, 'rb') as f:
-                df = pickle.load(f)
+                df = loads(f.read())
             return df
         except Exception:
             return pd.DataFrame()
@@ -42,7 +44,7 @@ class DataCache:
         
         try:
             with open(cache_path, 'wb') as f:
-                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.write(self.codec.dumps(df))
         except Exception:
             pass
     
@@ -1,79 +1,88 @@
 import os
 import pandas as pd
 import pickle
+from cache_codec import Codec, loads
+from collections import defaultdict
+from indexed_file import IndexedFiles
 from typing import Dict, List
 import numpy as np
 import tempfile
 
+# 批量文件：依次存放每只股票编码后的数据，末尾是索引(代码 -> (偏移, 长度))和固定长度的文件尾，
+# 新股票直接追加，不需要读出整个批次再重写
+BATCH_MAGIC = b'PKLBATCH'
+
 class BatchDataCache:
-    def __init__(self, cache_dir: str = 'data_cache'):
+    def __init__(self, cache_dir: str = 'data_cache', codec: str = 'pickle'):
         self.cache_dir = cache_dir
         self.batch_size = 100
+        # 写入时使用的压缩编码，读取时按数据头自动识别
+        self.codec = Codec.parse(codec)
+        # 批量文件的索引按文件大小和修改时间缓存
+        self._batches = IndexedFiles(BATCH_MAGIC, '批量文件')
         os.makedirs(self.cache_dir, exist_ok=True)
     
     def get_batch_cache_key(self, batch_id: int, years: List[int]) -> str:
         years_str = '_'.join(map(str, sorted(years)))
-        return f"batch_{batch_id}_{years_str}.pkl"
+        return f"batch_{batch_id}_{years_str}.pkb"
     
     def get_batch_path(self, batch_id: int, years: List[int]) -> str:
         cache_key = self.get_batch_cache_key(batch_id, years)
         return os.path.join(self.cache_dir, cache_key)
     
+    def get_legacy_batch_path(self, batch_id: int, years: List[int]) -> str:
+        # 旧版整个批次pickle成一个字典
+        return self.get_batch_path(batch_id, years)[:-len('.pkb')] + '.pkl'
+    
     def get_stock_batch_id(self, stock_code: str) -> int:
         code_num = int(stock_code.lstrip('sh').lstrip('sz'))
         return code_num // self.batch_size
     
-    def load_from_cache(self, stock_code: str, years: List[int]) -> pd.DataFrame:
-        batch_id = self.get_stock_batch_id(stock_code)
-        batch_path = self.get_batch_path(batch_id, years)
-        
-        if not os.path.exists(batch_path):
+    def _load_legacy(self, stock_code: str, years: List[int]) -> pd.DataFrame:
+        legacy_path = self.get_legacy_batch_path(self.get_stock_batch_id(stock_code), years)
+        if not os.path.exists(legacy_path):
             return pd.DataFrame()
         
+        with open(legacy_path, 'rb') as f:
+            batch_data = pickle.load(f)
+        return batch_data.get(stock_code, pd.DataFrame())
+    
+    def load_from_cache(self, stock_code: str, years: List[int]) -> pd.DataFrame:
+        batch_path = self.get_batch_path(self.get_stock_batch_id(stock_code), years)
+        
         try:
-            with open(batch_path, 'rb') as f:
-                batch_data = pickle.load(f)
-            
-            if stock_code in batch_data:
-                return batch_data[stock_code]
-            return pd.DataFrame()
+            blob = self._batches.read(batch_path, stock_code)
+            if blob is None:
+                return self._load_legacy(stock_code, years)
+            return loads(blob)
         except Exception:
             return pd.DataFrame()
     
     def save_to_cache(self, stock_code: str, years: List[int], df: pd.DataFrame):
-        if df.empty:
-            return
-        
-        batch_id = self.get_stock_batch_id(stock_code)
-        batch_path = self.get_batch_path(batch_id, years)
-        
-        batch_data = {}
-        if os.path.exists(batch_path):
+        self.save_many({stock_code: df}, years)
+    
+    def save_many(self, stock_data: Dict[str, pd.DataFrame], years: List[int]):
+        """按批次分组后每个批量文件只追加一次，每只股票的数据只写一次"""
+        batches = defaultdict(dict)
+        for stock_code, df in stock_data.items():
+            if df.empty:
+                continue
             try:
-                with open(batch_path, 'rb') as f:
-                    batch_data = pickle.load(f)
+                batches[self.get_stock_batch_id(stock_code)][stock_code] = self.codec.dumps(df)
             except Exception:
-                pass
-        
-        batch_data[stock_code] = df
+                continue
         
-        try:
-            with open(batch_path, 'wb') as f:
-                pickle.dump(batch_data, f, protocol=pickle.HIGHEST_PROTOCOL)
-        except Exception:
-            pass
+        # 写入失败直接抛出，已写入的批量文件保持完整
+        for batch_id, records in batches.items():
+            self._batches.append(self.get_batch_path(batch_id, years), records)
     
     def is_cached(self, stock_code: str, years: List[int]) -> bool:
         batch_id = self.get_stock_batch_id(stock_code)
-        batch_path = self.get_batch_path(batch_id, years)
-        
-        if not os.path.exists(batch_path):
-            return False
         
         try:
-            with open(batch_path, 'rb') as f:
-                batch_data = pickle.load(f)
-            return stock_code in batch_data
+            if stock_code in self._batches.read_index(self.get_batch_path(batch_id, years)):
+                return True
+            return not self._load_legacy(stock_code, years).empty
         except Exception:
             return False
     
@@ -82,4 +91,5 @@ class BatchDataCache:
             file_path = os.path.join(self.cache_dir, file)
             if os.path.isfile(file_path):
                 os.remove(file_path)
+        self._batches.forget()
         print(f"缓存已清空: {self.cache_dir}")
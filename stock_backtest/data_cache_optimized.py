@@ -1,55 +1,166 @@
 import os
 import pandas as pd
-import pickle
-from typing import Dict, List
-import lz4.frame
+from typing import Dict, List, Optional
+from cache_codec import Codec, DECODE_ERRORS, loads
+from indexed_file import IndexedFiles
+
+# 分片文件：依次存放每只股票压缩编码后的数据，末尾是索引(代码 -> (偏移, 长度))和固定长度的文件尾
+SHARD_MAGIC = b'LZ4SHARD'
+SHARD_SUFFIX = '.lz4s'
+
+# 单个分片超过该大小后新建下一个分片
+MAX_SHARD_BYTES = 256 * 1024 * 1024
 
 class OptimizedDataCache:
-    def __init__(self, cache_dir: str = 'data_cache'):
+    """同一年份组合的股票打包在少数几个分片文件中，按文件尾的索引定位并只读取一只股票的数据"""
+    def __init__(self, cache_dir: str = 'data_cache', max_shard_bytes: int = MAX_SHARD_BYTES, codec: str = 'lz4frame'):
         self.cache_dir = cache_dir
+        self.max_shard_bytes = max_shard_bytes
+        # 写入时使用的压缩编码，每条记录自带编码信息，更换编码后旧记录仍可读取
+        self.codec = Codec.parse(codec)
+        # 分片文件的索引按文件大小和修改时间缓存，文件变化后重新读取
+        self._shards = IndexedFiles(SHARD_MAGIC, '分片文件')
+        # 年份组合 -> (列出时缓存目录的修改时间, 分片路径)；目录没有变化时不再重新列出
+        self._shard_lists = {}
         os.makedirs(self.cache_dir, exist_ok=True)
     
+    def get_years_key(self, years: List[int]) -> str:
+        return '_'.join(map(str, sorted(years)))
+    
     def get_cache_key(self, stock_code: str, years: List[int]) -> str:
-        years_str = '_'.join(map(str, sorted(years)))
-        return f"{stock_code}_{years_str}.lz4"
+        return f"{stock_code}_{self.get_years_key(years)}.lz4"
     
     def get_cache_path(self, cache_key: str) -> str:
         return os.path.join(self.cache_dir, cache_key)
     
+    def get_shard_path(self, years: List[int], shard_id: int) -> str:
+        return os.path.join(self.cache_dir, f"shard_{self.get_years_key(years)}_{shard_id:04d}{SHARD_SUFFIX}")
+    
+    def _list_shards(self, years: List[int]) -> List[str]:
+        years_key = self.get_years_key(years)
+        # 其他进程新建或删除分片时目录的修改时间随之变化
+        mtime = os.stat(self.cache_dir).st_mtime_ns
+        cached = self._shard_lists.get(years_key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        prefix = f"shard_{years_key}_"
+        shards = sorted(
+            os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+            if name.startswith(prefix) and name.endswith(SHARD_SUFFIX)
+        )
+        self._shard_lists[years_key] = (mtime, shards)
+        return shards
+    
+    def _locate(self, stock_code: str, years: List[int]) -> Optional[tuple]:
+        # 同一只股票重复写入时以最新的分片为准
+        for shard_path in reversed(self._list_shards(years)):
+            entry = self._shards.read_index(shard_path).get(stock_code)
+            if entry is not None:
+                return shard_path, entry[0], entry[1]
+        return None
+    
     def is_cached(self, stock_code: str, years: List[int]) -> bool:
-        cache_key = self.get_cache_key(stock_code, years)
-        cache_path = self.get_cache_path(cache_key)
-        return os.path.exists(cache_path)
+        if self._locate(stock_code, years) is not None:
+            return True
+        return os.path.exists(self.get_cache_path(self.get_cache_key(stock_code, years)))
     
     def load_from_cache(self, stock_code: str, years: List[int]) -> pd.DataFrame:
-        cache_key = self.get_cache_key(stock_code, years)
-        cache_path = self.get_cache_path(cache_key)
-        
+        """未缓存、文件读取失败或数据无法解码时返回空表，其余错误照常抛出"""
         try:
-            with lz4.frame.open(cache_path, 'rb') as f:
-                data = f.read()
-                df = pickle.loads(data)
-            return df
-        except Exception:
+            location = self._locate(stock_code, years)
+            if location is not None:
+                shard_path, offset, length = location
+                with open(shard_path, 'rb') as f:
+                    f.seek(offset)
+                    return loads(f.read(length))
+            
+            # 兼容旧版每只股票一个.lz4文件
+            cache_path = self.get_cache_path(self.get_cache_key(stock_code, years))
+            with open(cache_path, 'rb') as f:
+                return loads(f.read())
+        except FileNotFoundError:
+            return pd.DataFrame()
+        except (OSError,) + DECODE_ERRORS as e:
+            print(f"警告: {stock_code} 的缓存数据无法读取，按未缓存处理: {e!r}")
             return pd.DataFrame()
     
     def save_to_cache(self, stock_code: str, years: List[int], df: pd.DataFrame):
-        if df.empty:
-            return
+        self.save_many({stock_code: df}, years)
+    
+    def save_many(self, stock_data: Dict[str, pd.DataFrame], years: List[int]):
+        """多只股票一次追加到当前分片，只重写一次索引"""
+        records = {}
+        for stock_code, df in stock_data.items():
+            if df.empty:
+                continue
+            try:
+                records[stock_code] = self.codec.dumps(df)
+            except Exception:
+                continue
         
-        cache_key = self.get_cache_key(stock_code, years)
-        cache_path = self.get_cache_path(cache_key)
+        if records:
+            self._append_records(years, records)
+    
+    def _append_records(self, years: List[int], records: Dict[str, bytes]):
+        shards = self._list_shards(years)
+        if shards and os.path.getsize(shards[-1]) < self.max_shard_bytes:
+            shard_path = shards[-1]
+        else:
+            shard_path = self.get_shard_path(years, len(shards))
         
-        try:
-            data = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
-            with lz4.frame.open(cache_path, 'wb') as f:
-                f.write(data)
-        except Exception:
-            pass
+        self._shards.append(shard_path, records)
+        
+        # 新建的分片直接加入列表，不再重新列出目录
+        if shard_path not in shards:
+            self._shard_lists[self.get_years_key(years)] = (os.stat(self.cache_dir).st_mtime_ns, shards + [shard_path])
+    
+    def migrate_legacy(self, batch_size: int = 500) -> int:
+        """把旧版每只股票一个的.lz4文件原样打包进分片并删除，返回迁移的文件数"""
+        groups = {}
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.lz4'):
+                continue
+            stock_code, _, years_key = name[:-len('.lz4')].partition('_')
+            if years_key:
+                groups.setdefault(years_key, []).append((stock_code, name))
+        
+        migrated = 0
+        for years_key, entries in groups.items():
+            years = [int(year) for year in years_key.split('_')]
+            for i in range(0, len(entries), batch_size):
+                batch = entries[i:i+batch_size]
+                records = {}
+                for stock_code, name in batch:
+                    with open(self.get_cache_path(name), 'rb') as f:
+                        records[stock_code] = f.read()
+                self._append_records(years, records)
+                for _, name in batch:
+                    os.remove(self.get_cache_path(name))
+                migrated += len(batch)
+        
+        return migrated
+    
+    def get_cache_stats(self) -> Dict:
+        shards = [name for name in os.listdir(self.cache_dir) if name.endswith(SHARD_SUFFIX)]
+        stocks = 0
+        size = 0
+        for name in shards:
+            shard_path = os.path.join(self.cache_dir, name)
+            stocks += len(self._shards.read_index(shard_path))
+            size += os.path.getsize(shard_path)
+        
+        return {
+            'shards': len(shards),
+            'records': stocks,
+            'size_mb': size / 1024 / 1024,
+        }
     
     def clear_cache(self):
         for file in os.listdir(self.cache_dir):
             file_path = os.path.join(self.cache_dir, file)
             if os.path.isfile(file_path):
                 os.remove(file_path)
+        self._shards.forget()
+        self._shard_lists.clear()
         print(f"缓存已清空: {self.cache_dir}")
@@ -1,19 +1,100 @@
 import os
 import sqlite3
 import pandas as pd
+import numpy as np
 import pickle
 import io
-from typing import Dict, List
+from cache_codec import Codec, DECODE_ERRORS, decompress
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# 列式存储字段：字段名 -> (日线列名, 默认磁盘类型)，日期按自1970-01-01起的天数保存；
+# 默认类型不能无损保存的列（如带小数的成交额、有缺失的成交量、非0.01价位的价格）按float64保存，各分区记录实际类型
+FIELDS = {
+    'date': ('日期', np.int64),
+    'open': ('开盘价', np.float32),
+    'close': ('收盘价', np.float32),
+    'high': ('最高价', np.float32),
+    'low': ('最低价', np.float32),
+    'volume': ('成交量', np.int64),
+    'amount': ('成交额', np.int64),
+}
+
+# 价格以float32保存，读取时按最小价位还原；写入时检查还原后与原始float64完全一致，否则改存float64
+PRICE_DECIMALS = 2
+
+DAILY_COLUMNS = ['日期', '代码', '名称', '开盘价', '收盘价', '最高价', '最低价', '成交量', '成交额', '涨跌幅', '振幅']
+
+# 派生列在读取时按请求的年份范围重新计算，与_convert_to_daily的结果一致
+DERIVED_COLUMNS = {
+    '涨跌幅': ['收盘价'],
+    '振幅': ['最高价', '最低价', '收盘价'],
+}
+
+# 连接参数：WAL模式下读不阻塞写，多进程写入只在提交时短暂加锁；page_size只对新建的数据库生效
+PAGE_SIZE = 16384
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+BUSY_TIMEOUT = 30
+
+# 名称变更点在查询中拼成一个字段返回时使用的分隔符
+NAME_SEPARATOR = '\x1f'
 
 class DatabaseCache:
-    def __init__(self, db_path: str = 'stock_data.db'):
+    def __init__(self, db_path: str = 'stock_data.db', codec: str = 'none'):
         self.db_path = db_path
+        # 新写入分区的字段压缩编码；每个分区记录是否已编码，更换编码后旧分区仍可读取
+        self.codec = Codec.parse(codec)
+        self.encoded = int(self.codec.algorithm != 'none' or self.codec.shuffle)
+        self._conn = None
+        self._pid = None
         self._init_db()
     
+    def _connect(self) -> sqlite3.Connection:
+        """每个进程复用同一个连接；fork出的子进程或反序列化后的对象各自重新连接"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+            conn.execute(f"PRAGMA page_size = {PAGE_SIZE}")
+            for name, value in PRAGMAS.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+    
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._pid = None
+    
+    def __getstate__(self):
+        # 连接不能跨进程传递，传给子进程时只带数据库路径
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_pid'] = None
+        return state
+    
     def _init_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # 旧版按(股票, 年份组合)保存的pickle数据，仅用于兼容读取
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS stock_data (
             stock_code TEXT,
@@ -23,133 +104,590 @@ class DatabaseCache:
             PRIMARY KEY (stock_code, years)
         )''')
         
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS symbols (
+            symbol_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stock_code TEXT UNIQUE
+        )''')
+        
+        # 股票名称按变更点保存（如更名为ST），不在每行重复
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS symbol_names (
+            symbol_id INTEGER,
+            start_day INTEGER,
+            name TEXT,
+            PRIMARY KEY (symbol_id, start_day)
+        )''')
+        
+        field_columns = ',\n            '.join(f'{field} BLOB' for field in FIELDS)
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS daily_bars (
+            symbol_id INTEGER,
+            year INTEGER,
+            rows INTEGER,
+            {field_columns},
+            timestamp INTEGER,
+            encoded INTEGER DEFAULT 0,
+            source TEXT,
+            dtypes TEXT,
+            PRIMARY KEY (symbol_id, year)
+        )''')
+        
+        # 旧数据库没有的列：其中的分区都是未编码的原始数组，来源未知，各字段为默认类型
+        self._add_missing_columns(cursor, 'daily_bars', {'encoded': 'INTEGER DEFAULT 0', 'source': 'TEXT', 'dtypes': 'TEXT'})
+        
+        # 已完整导入的年度压缩包，文件大小或修改时间变化后需要重新导入
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_checkpoints (
+            archive TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime INTEGER,
+            members INTEGER,
+            timestamp INTEGER,
+            version INTEGER DEFAULT 0
+        )''')
+        self._add_missing_columns(cursor, 'archive_checkpoints', {'version': 'INTEGER DEFAULT 0'})
+        
+        # 每只股票已导入的最后一根60分钟线时间（秒），增量更新只导入其后的数据
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS watermarks (
+            symbol_id INTEGER PRIMARY KEY,
+            last_time INTEGER,
+            timestamp INTEGER
+        )''')
+        
         conn.commit()
-        conn.close()
+    
+    @staticmethod
+    def _add_missing_columns(cursor, table: str, columns: Dict[str, str]):
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
     
     def get_years_key(self, years: List[int]) -> str:
         return '_'.join(map(str, sorted(years)))
     
+    def _get_symbol_id(self, cursor, stock_code: str, create: bool = False) -> Optional[int]:
+        cursor.execute("SELECT symbol_id FROM symbols WHERE stock_code = ?", (stock_code,))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        
+        cursor.execute("INSERT INTO symbols (stock_code) VALUES (?)", (stock_code,))
+        return cursor.lastrowid
+    
     def is_cached(self, stock_code: str, years: List[int]) -> bool:
-        years_key = self.get_years_key(years)
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._connect().cursor()
+        years = sorted(set(years))
+        placeholders = ','.join(['?'] * len(years))
         
         cursor.execute(
-            "SELECT 1 FROM stock_data WHERE stock_code = ? AND years = ?",
-            (stock_code, years_key)
+            f"SELECT COUNT(*) FROM daily_bars JOIN symbols USING (symbol_id) "
+            f"WHERE stock_code = ? AND year IN ({placeholders})",
+            [stock_code] + years
         )
+        if cursor.fetchone()[0] == len(years):
+            return True
         
-        exists = cursor.fetchone() is not None
-        conn.close()
-        return exists
+        cursor.execute(
+            "SELECT 1 FROM stock_data WHERE stock_code = ? AND years = ?",
+            (stock_code, self.get_years_key(years))
+        )
+        return cursor.fetchone() is not None
     
-    def load_from_cache(self, stock_code: str, years: List[int]) -> pd.DataFrame:
-        years_key = self.get_years_key(years)
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_or_none(self, stock_code: str, years: List[int], columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """判断是否已缓存并读取，命中时只执行一条查询；未缓存返回None，已缓存但区间内无交易返回空表"""
+        return self._load(self._connect().cursor(), stock_code, years, columns)
+    
+    def load_from_cache(self, stock_code: str, years: List[int], columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """读取指定年份分区，columns为需要的日线列（日期总会返回），默认全部列"""
+        df = self.get_or_none(stock_code, years, columns)
+        return pd.DataFrame() if df is None else df
+    
+    def _load(self, cursor, stock_code: str, years: List[int], columns: Optional[List[str]]) -> Optional[pd.DataFrame]:
+        """优先读取列式分区，没有时读取旧版记录；数据无法解码时提示并按未缓存处理，数据库错误照常抛出"""
+        try:
+            df = self._load_columnar(cursor, stock_code, years, columns)
+            if df is None:
+                df = self._load_legacy(cursor, stock_code, years, columns)
+            return df
+        except DECODE_ERRORS as e:
+            print(f"警告: {stock_code} 的缓存数据无法解码，按未缓存处理: {e!r}")
+            return None
+    
+    def _load_columnar(self, cursor, stock_code: str, years: List[int], columns: Optional[List[str]]) -> Optional[pd.DataFrame]:
+        columns = DAILY_COLUMNS if columns is None else columns
+        fields = self._fields_for(columns)
+        years = sorted(set(years))
+        placeholders = ','.join(['?'] * len(years))
+        
+        # 名称变更点作为一个拼接字段随分区一起取出，不再单独查询
+        names_column = 'NULL'
+        if '名称' in columns:
+            names_column = (
+                "(SELECT group_concat(start_day || ':' || name, char(31)) "
+                "FROM symbol_names WHERE symbol_id = d.symbol_id)"
+            )
+        
+        cursor.execute(
+            f"SELECT year, rows, encoded, dtypes, {names_column}, {', '.join(fields)} FROM daily_bars d "
+            f"JOIN symbols USING (symbol_id) WHERE stock_code = ? AND year IN ({placeholders}) ORDER BY year",
+            [stock_code] + years
+        )
+        partitions = cursor.fetchall()
+        if len(partitions) != len(years):
+            return None
+        
+        arrays = {}
+        dtypes = [self._field_dtypes(row[3]) for row in partitions]
+        for i, field in enumerate(fields):
+            chunks = [self._decode_field(row[5 + i], row[2], row_dtypes[field])
+                      for row, row_dtypes in zip(partitions, dtypes) if row[1] > 0]
+            arrays[field] = np.concatenate(chunks) if chunks else np.empty(0, dtype=FIELDS[field][1])
         
+        if len(arrays['date']) == 0:
+            return pd.DataFrame()
+        
+        names = None
+        if '名称' in columns:
+            packed = partitions[0][4]
+            names = sorted(
+                (int(start_day), name)
+                for start_day, name in (item.split(':', 1) for item in packed.split(NAME_SEPARATOR))
+            ) if packed else []
+        
+        return self._build_frame(stock_code, arrays, names, columns)
+    
+    def _load_legacy(self, cursor, stock_code: str, years: List[int], columns: Optional[List[str]]) -> Optional[pd.DataFrame]:
         cursor.execute(
             "SELECT data FROM stock_data WHERE stock_code = ? AND years = ?",
-            (stock_code, years_key)
+            (stock_code, self.get_years_key(years))
         )
         
         row = cursor.fetchone()
-        conn.close()
-        
         if not row:
-            return pd.DataFrame()
+            return None
         
-        try:
-            df = pickle.loads(row[0])
-            return df
-        except Exception:
-            return pd.DataFrame()
+        df = pickle.loads(row[0])
+        if columns is not None:
+            df = df[[c for c in DAILY_COLUMNS if c == '日期' or c in columns]]
+        return df
+    
+    def _fields_for(self, columns: List[str]) -> List[str]:
+        needed = {'日期'}
+        for column in columns:
+            needed.add(column)
+            needed.update(DERIVED_COLUMNS.get(column, []))
+        return [field for field, (column, _) in FIELDS.items() if column in needed]
+    
+    def _build_frame(self, stock_code: str, arrays: Dict[str, np.ndarray], names, columns: List[str]) -> pd.DataFrame:
+        days = arrays['date']
+        df = pd.DataFrame({'日期': pd.to_datetime(days.astype('datetime64[D]'))})
+        
+        if '代码' in columns:
+            df['代码'] = np.full(len(days), stock_code, dtype=object)
+        
+        if names is not None:
+            starts = np.array([start for start, _ in names], dtype=np.int64)
+            labels = np.array([name for _, name in names], dtype=object)
+            pos = np.clip(np.searchsorted(starts, days, side='right') - 1, 0, None)
+            df['名称'] = labels[pos] if len(labels) else np.full(len(days), '', dtype=object)
+        
+        for field, (column, _) in FIELDS.items():
+            if field == 'date' or field not in arrays:
+                continue
+            df[column] = arrays[field]
+        
+        if '涨跌幅' in columns:
+            df['涨跌幅'] = df['收盘价'].pct_change() * 100
+        if '振幅' in columns:
+            df['振幅'] = ((df['最高价'] - df['最低价']) / df['收盘价'].shift(1) * 100).fillna(0)
+        
+        return df[[c for c in DAILY_COLUMNS if c == '日期' or c in columns]]
+    
+    @staticmethod
+    def _decode_blob(blob: bytes, encoded: int, dtype) -> np.ndarray:
+        return np.frombuffer(decompress(blob) if encoded else blob, dtype=dtype)
+    
+    @classmethod
+    def _decode_field(cls, blob: bytes, encoded: int, dtype) -> np.ndarray:
+        values = cls._decode_blob(blob, encoded, dtype)
+        if dtype == np.float32:
+            values = np.round(values.astype(np.float64), PRICE_DECIMALS)
+        return values
+    
+    @staticmethod
+    def _field_dtypes(packed: Optional[str]) -> Dict[str, np.dtype]:
+        """分区记录的各字段类型，旧分区没有记录时为默认类型"""
+        if not packed:
+            return {field: np.dtype(dtype) for field, (_, dtype) in FIELDS.items()}
+        return {field: np.dtype(code) for field, code in zip(FIELDS, packed.split(','))}
+    
+    @staticmethod
+    def _storage_dtype(field: str, values: np.ndarray) -> np.dtype:
+        """默认类型能无损保存时使用默认类型，否则使用float64"""
+        dtype = np.dtype(FIELDS[field][1])
+        if field == 'date' or (dtype == np.int64 and values.dtype.kind in 'iu'):
+            return dtype
+        
+        values = np.asarray(values, dtype=np.float64)
+        if dtype == np.float32:
+            restored = np.round(values.astype(np.float32).astype(np.float64), PRICE_DECIMALS)
+            return dtype if np.array_equal(restored, values, equal_nan=True) else np.dtype(np.float64)
+        
+        with np.errstate(invalid='ignore'):
+            lossless = np.isfinite(values).all() and (np.abs(values) < 2.0 ** 63).all() and (values == np.trunc(values)).all()
+        return dtype if lossless else np.dtype(np.float64)
+    
+    def _encode_partitions(self, df: pd.DataFrame, years: List[int]) -> List[tuple]:
+        days = df['日期'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        row_years = days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+        
+        partitions = []
+        for year in sorted(set(years)):
+            mask = row_years == year
+            blobs = []
+            dtypes = []
+            for field, (column, _) in FIELDS.items():
+                values = days[mask] if field == 'date' else df[column].to_numpy()[mask]
+                dtype = self._storage_dtype(field, values)
+                blob = np.ascontiguousarray(values, dtype=dtype).tobytes()
+                blobs.append(self.codec.compress(blob, dtype.itemsize) if self.encoded else blob)
+                dtypes.append(dtype.str)
+            partitions.append((year, int(mask.sum()), blobs, ','.join(dtypes)))
+        return partitions
+    
+    def _name_changes(self, df: pd.DataFrame) -> List[tuple]:
+        if '名称' not in df.columns:
+            return []
+        
+        names = df['名称'].to_numpy()
+        days = df['日期'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        changed = np.ones(len(names), dtype=bool)
+        changed[1:] = names[1:] != names[:-1]
+        return [(int(day), str(name)) for day, name in zip(days[changed], names[changed])]
+    
+    def _write_stock(self, cursor, stock_code: str, years: List[int], df: pd.DataFrame, timestamp: int, source: Optional[str] = None):
+        symbol_id = self._get_symbol_id(cursor, stock_code, create=True)
+        
+        field_names = ', '.join(FIELDS)
+        placeholders = ', '.join(['?'] * (len(FIELDS) + 7))
+        for year, rows, blobs, dtypes in self._encode_partitions(df, years):
+            cursor.execute(
+                f"INSERT OR REPLACE INTO daily_bars (symbol_id, year, rows, {field_names}, timestamp, encoded, source, dtypes) VALUES ({placeholders})",
+                [symbol_id, year, rows] + blobs + [timestamp, self.encoded, source, dtypes]
+            )
+        
+        cursor.executemany(
+            "INSERT OR REPLACE INTO symbol_names (symbol_id, start_day, name) VALUES (?, ?, ?)",
+            [(symbol_id, day, name) for day, name in self._name_changes(df)]
+        )
+    
+    def _append_stock(self, cursor, stock_code: str, df: pd.DataFrame, timestamp: int, source: Optional[str] = None) -> int:
+        symbol_id = self._get_symbol_id(cursor, stock_code, create=True)
+        price_columns = [column for column, _ in FIELDS.values() if column != '日期']
+        field_names = ', '.join(FIELDS)
+        placeholders = ', '.join(['?'] * (len(FIELDS) + 7))
+        
+        days = df['日期'].to_numpy().astype('datetime64[D]')
+        row_years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+        
+        appended = 0
+        for year in np.unique(row_years):
+            year = int(year)
+            new = df[row_years == year]
+            
+            cursor.execute(
+                f"SELECT rows, encoded, dtypes, {field_names} FROM daily_bars WHERE symbol_id = ? AND year = ?",
+                (symbol_id, year)
+            )
+            row = cursor.fetchone()
+            
+            # 只读出新数据所在年份的分区，更早的年份不动
+            if row and row[0] > 0:
+                dtypes = self._field_dtypes(row[2])
+                arrays = {field: self._decode_field(row[3 + i], row[1], dtypes[field]) for i, field in enumerate(FIELDS)}
+                old = self._build_frame(stock_code, arrays, None, price_columns)
+                last_day = old['日期'].iloc[-1]
+                new = new[new['日期'] >= last_day]
+                if new.empty:
+                    continue
+                
+                # 上次导入停在当天盘中时，与已保存的当天日线合并
+                if new['日期'].iloc[0] == last_day:
+                    first = new.iloc[0]
+                    i = len(old) - 1
+                    if pd.notna(first['收盘价']):
+                        old.loc[i, '收盘价'] = first['收盘价']
+                    old.loc[i, '最高价'] = np.fmax(old.loc[i, '最高价'], first['最高价'])
+                    old.loc[i, '最低价'] = np.fmin(old.loc[i, '最低价'], first['最低价'])
+                    old.loc[i, '成交量'] += first['成交量']
+                    old.loc[i, '成交额'] += first['成交额']
+                    new = new.iloc[1:]
+                
+                combined = pd.concat([old, new[['日期'] + price_columns]], ignore_index=True)
+            else:
+                combined = new
+            
+            for _, rows, blobs, dtypes in self._encode_partitions(combined, [year]):
+                cursor.execute(
+                    f"INSERT OR REPLACE INTO daily_bars (symbol_id, year, rows, {field_names}, timestamp, encoded, source, dtypes) VALUES ({placeholders})",
+                    [symbol_id, year, rows] + blobs + [timestamp, self.encoded, source, dtypes]
+                )
+            appended += len(new)
+        
+        # 只追加与已保存的最新名称不同的变更点
+        cursor.execute(
+            "SELECT name FROM symbol_names WHERE symbol_id = ? ORDER BY start_day DESC LIMIT 1",
+            (symbol_id,)
+        )
+        row = cursor.fetchone()
+        changes = self._name_changes(df)
+        if row and changes and changes[0][1] == row[0]:
+            changes = changes[1:]
+        cursor.executemany(
+            "INSERT OR REPLACE INTO symbol_names (symbol_id, start_day, name) VALUES (?, ?, ?)",
+            [(symbol_id, day, name) for day, name in changes]
+        )
+        
+        return appended
+    
+    def _save_watermarks(self, cursor, watermarks: Dict[str, int], timestamp: int):
+        # 高水位只前进不后退，按年份乱序导入时也保持为最新的时间
+        for stock_code, last_time in watermarks.items():
+            symbol_id = self._get_symbol_id(cursor, stock_code, create=True)
+            cursor.execute(
+                "INSERT INTO watermarks (symbol_id, last_time, timestamp) VALUES (?, ?, ?) "
+                "ON CONFLICT(symbol_id) DO UPDATE SET last_time = MAX(last_time, excluded.last_time), timestamp = excluded.timestamp",
+                (symbol_id, int(last_time), timestamp)
+            )
+    
+    def get_watermarks(self) -> Dict[str, int]:
+        """每只股票的高水位（自1970-01-01起的秒数）；没有记录的股票按已缓存的最后一个交易日收盘计"""
+        cursor = self._connect().cursor()
+        
+        cursor.execute("SELECT stock_code, last_time FROM watermarks JOIN symbols USING (symbol_id)")
+        watermarks = dict(cursor.fetchall())
+        
+        # 最新非空分区日期列的最后8字节即最后一个交易日，已编码的分区需要整列解码
+        cursor.execute('''
+        SELECT stock_code, CASE WHEN encoded THEN date ELSE substr(date, -8) END, encoded
+        FROM daily_bars d JOIN symbols USING (symbol_id)
+        WHERE rows > 0
+          AND symbol_id NOT IN (SELECT symbol_id FROM watermarks)
+          AND year = (SELECT MAX(year) FROM daily_bars WHERE symbol_id = d.symbol_id AND rows > 0)
+        ''')
+        for stock_code, tail, encoded in cursor.fetchall():
+            last_day = int(self._decode_blob(tail, encoded, np.int64)[-1])
+            watermarks[stock_code] = (last_day + 1) * 86400 - 1
+        return watermarks
+    
+    def append_bars(self, stock_data: Dict[str, pd.DataFrame], watermarks: Dict[str, int], sources: Optional[Dict[str, str]] = None) -> int:
+        """把高水位之后的新日线追加到对应年份分区末尾并推进高水位，返回新增的交易日数；sources同batch_save"""
+        # 涨跌幅、振幅不落盘，读取时按前一日收盘价重新计算，新数据第一天的涨跌幅随之正确
+        with self._transaction() as cursor:
+            timestamp = int(pd.Timestamp.now().timestamp())
+            
+            appended = 0
+            for stock_code, df in stock_data.items():
+                if df.empty:
+                    continue
+                appended += self._append_stock(cursor, stock_code, df, timestamp, (sources or {}).get(stock_code))
+            
+            self._save_watermarks(cursor, watermarks, timestamp)
+        return appended
     
     def save_to_cache(self, stock_code: str, years: List[int], df: pd.DataFrame):
         if df.empty:
             return
         
-        years_key = self.get_years_key(years)
-        data = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
         timestamp = int(pd.Timestamp.now().timestamp())
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._transaction() as cursor:
+            self._write_stock(cursor, stock_code, years, df, timestamp)
+    
+    def fill_missing_partitions(self, years: List[int], stock_codes: Optional[List[str]] = None):
+        """为没有数据的(股票, 年份)写入空分区，表示该年已导入但未上市或停牌"""
+        with self._transaction() as cursor:
+            timestamp = int(pd.Timestamp.now().timestamp())
+            
+            if stock_codes is not None:
+                for stock_code in stock_codes:
+                    self._get_symbol_id(cursor, stock_code, create=True)
+            
+            field_names = ', '.join(FIELDS)
+            empty_blobs = ', '.join(["x''"] * len(FIELDS))
+            
+            # 指定股票时分批拼接IN条件，避免超过SQLite的参数个数上限
+            if stock_codes is None:
+                filters = [('', [])]
+            else:
+                codes = list(stock_codes)
+                filters = [
+                    (f"WHERE stock_code IN ({','.join(['?'] * len(codes[i:i+500]))})", codes[i:i+500])
+                    for i in range(0, len(codes), 500)
+                ]
+            
+            for year in sorted(set(years)):
+                for symbol_filter, params in filters:
+                    cursor.execute(
+                        f"INSERT OR IGNORE INTO daily_bars (symbol_id, year, rows, {field_names}, timestamp) "
+                        f"SELECT symbol_id, ?, 0, {empty_blobs}, ? FROM symbols {symbol_filter}",
+                        [year, timestamp] + params
+                    )
+    
+    def clear_absent_partitions(self, year: int, present: set, stock_codes: Optional[List[str]] = None):
+        """压缩包中已经没有的股票，把该年的分区重置为空；stock_codes不为None时只处理其中的股票"""
+        cursor = self._connect().cursor()
+        cursor.execute(
+            "SELECT symbol_id, stock_code FROM daily_bars JOIN symbols USING (symbol_id) WHERE year = ? AND rows > 0",
+            (year,)
+        )
+        wanted = set(stock_codes) if stock_codes is not None else None
+        absent = [
+            symbol_id for symbol_id, stock_code in cursor.fetchall()
+            if stock_code not in present and (wanted is None or stock_code in wanted)
+        ]
+        if not absent:
+            return
+        
+        with self._transaction() as cursor:
+            timestamp = int(pd.Timestamp.now().timestamp())
+            field_names = ', '.join(FIELDS)
+            placeholders = ', '.join(['?'] * (len(FIELDS) + 5))
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO daily_bars (symbol_id, year, rows, {field_names}, timestamp, encoded) VALUES ({placeholders})",
+                [[symbol_id, year, 0] + [b''] * len(FIELDS) + [timestamp, 0] for symbol_id in absent]
+            )
+    
+    def find_stale(self, stock_codes: List[str], years: List[int], fingerprints: Dict[int, Dict[str, str]]) -> List[str]:
+        """返回需要重新导入的股票：缺少分区，或分区记录的源数据指纹与当前压缩包不一致；
+        fingerprints为每个现有压缩包中各股票的指纹，压缩包不存在的年份只检查是否已缓存"""
+        cursor = self._connect().cursor()
+        years = sorted(set(years))
+        placeholders = ','.join(['?'] * len(years))
         
         cursor.execute(
-            "INSERT OR REPLACE INTO stock_data (stock_code, years, data, timestamp) VALUES (?, ?, ?, ?)",
-            (stock_code, years_key, data, timestamp)
+            f"SELECT stock_code, year, source FROM daily_bars JOIN symbols USING (symbol_id) WHERE year IN ({placeholders})",
+            years
         )
+        cached = defaultdict(dict)
+        for stock_code, year, source in cursor.fetchall():
+            cached[stock_code][year] = source
         
-        conn.commit()
-        conn.close()
+        stale = []
+        for stock_code in stock_codes:
+            sources = cached.get(stock_code, {})
+            if len(sources) < len(years):
+                # 只有旧版pickle记录的股票没有来源信息，仍按已缓存处理
+                if not self.is_cached(stock_code, years):
+                    stale.append(stock_code)
+                continue
+            
+            if any(sources[year] != fingerprints[year].get(stock_code) for year in years if year in fingerprints):
+                stale.append(stock_code)
+        return stale
     
-    def clear_cache(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_archive_checkpoint(self, archive: str) -> Optional[Dict]:
+        cursor = self._connect().cursor()
         
-        cursor.execute("DELETE FROM stock_data")
-        conn.commit()
-        conn.close()
+        cursor.execute(
+            "SELECT size, mtime, members, version FROM archive_checkpoints WHERE archive = ?",
+            (archive,)
+        )
+        row = cursor.fetchone()
+        
+        if not row:
+            return None
+        return {'size': row[0], 'mtime': row[1], 'members': row[2], 'version': row[3]}
+    
+    def save_archive_checkpoint(self, archive: str, size: int, mtime: int, members: int, version: int = 0):
+        timestamp = int(pd.Timestamp.now().timestamp())
+        
+        with self._transaction() as cursor:
+            cursor.execute(
+                "INSERT OR REPLACE INTO archive_checkpoints (archive, size, mtime, members, timestamp, version) VALUES (?, ?, ?, ?, ?, ?)",
+                (archive, size, mtime, members, timestamp, version)
+            )
+    
+    def migrate_legacy(self) -> int:
+        """把旧版pickle记录转换为列式分区，返回转换的记录数"""
+        with self._transaction() as cursor:
+            cursor.execute("SELECT stock_code, years, data FROM stock_data")
+            rows = cursor.fetchall()
+            timestamp = int(pd.Timestamp.now().timestamp())
+            
+            migrated = 0
+            for stock_code, years_key, data in rows:
+                try:
+                    df = pickle.loads(data)
+                except Exception:
+                    continue
+                if df.empty:
+                    continue
+                years = [int(y) for y in years_key.split('_')]
+                self._write_stock(cursor, stock_code, years, df, timestamp)
+                migrated += 1
+            
+            cursor.execute("DELETE FROM stock_data")
+        return migrated
+    
+    def clear_cache(self):
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM stock_data")
+            cursor.execute("DELETE FROM daily_bars")
+            cursor.execute("DELETE FROM symbol_names")
+            cursor.execute("DELETE FROM symbols")
+            cursor.execute("DELETE FROM archive_checkpoints")
+            cursor.execute("DELETE FROM watermarks")
         
         print(f"数据库缓存已清空: {self.db_path}")
     
     def get_cache_stats(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._connect().cursor()
         
-        cursor.execute("SELECT COUNT(*) FROM stock_data")
-        count = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(DISTINCT symbol_id), COUNT(*) FROM daily_bars")
+        stocks, partitions = cursor.fetchone()
         
-        cursor.execute("SELECT SUM(LENGTH(data)) FROM stock_data")
+        blob_lengths = ' + '.join(f'LENGTH({field})' for field in FIELDS)
+        cursor.execute(f"SELECT SUM({blob_lengths}) FROM daily_bars")
         size = cursor.fetchone()[0] or 0
         
-        conn.close()
+        cursor.execute("SELECT COUNT(*), SUM(LENGTH(data)) FROM stock_data")
+        legacy_count, legacy_size = cursor.fetchone()
         
         return {
-            'records': count,
-            'size_mb': size / 1024 / 1024
+            'records': stocks + legacy_count,
+            'partitions': partitions,
+            'size_mb': (size + (legacy_size or 0)) / 1024 / 1024
         }
     
-    def batch_save(self, stock_data: Dict[str, pd.DataFrame], years: List[int]):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for stock_code, df in stock_data.items():
-            if df.empty:
-                continue
-            
-            years_key = self.get_years_key(years)
-            data = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    def batch_save(self, stock_data: Dict[str, pd.DataFrame], years: List[int], watermarks: Optional[Dict[str, int]] = None,
+                   sources: Optional[Dict[str, str]] = None):
+        """一个事务写入多只股票；watermarks为各股票已导入的最后一根60分钟线时间，同时记录为高水位；
+        sources为各股票源数据的指纹，记录在写入的分区上，用于判断缓存是否过期"""
+        with self._transaction() as cursor:
             timestamp = int(pd.Timestamp.now().timestamp())
             
-            cursor.execute(
-                "INSERT OR REPLACE INTO stock_data (stock_code, years, data, timestamp) VALUES (?, ?, ?, ?)",
-                (stock_code, years_key, data, timestamp)
-            )
-        
-        conn.commit()
-        conn.close()
+            for stock_code, df in stock_data.items():
+                if df.empty:
+                    continue
+                
+                self._write_stock(cursor, stock_code, years, df, timestamp, (sources or {}).get(stock_code))
+            
+            if watermarks:
+                self._save_watermarks(cursor, watermarks, timestamp)
     
-    def batch_load(self, stock_codes: List[str], years: List[int]) -> Dict[str, pd.DataFrame]:
-        years_key = self.get_years_key(years)
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        placeholders = ','.join(['?'] * len(stock_codes))
-        cursor.execute(
-            f"SELECT stock_code, data FROM stock_data WHERE stock_code IN ({placeholders}) AND years = ?",
-            stock_codes + [years_key]
-        )
+    def batch_load(self, stock_codes: List[str], years: List[int], columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        cursor = self._connect().cursor()
         
         results = {}
-        for row in cursor.fetchall():
-            try:
-                df = pickle.loads(row['data'])
-                results[row['stock_code']] = df
-            except Exception:
-                pass
-        
-        conn.close()
+        for stock_code in stock_codes:
+            df = self._load(cursor, stock_code, years, columns)
+            if df is not None and not df.empty:
+                results[stock_code] = df
         return results
@@ -1,16 +1,20 @@
 import os
 import zipfile
-import pandas as pd
 import numpy as np
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
 from data_db_cache import DatabaseCache
+from data_panel import PanelWriter, MarketPanel
+from data_ingest import ArchiveIngestor
 
 DATA_DIR = r'D:\BaiduNetdiskDownload\沪深个股60分钟_按年汇总'
+PANEL_DIR = 'panel_data'
 
 class DataImporter:
-    def __init__(self, data_dir: str = DATA_DIR):
+    def __init__(self, data_dir: str = DATA_DIR, num_workers: int = None):
         self.data_dir = data_dir
         self.db_cache = DatabaseCache('stock_data.db')
+        # 解析CSV和转换日线的工作进程数，数据库只由当前进程写入
+        self.num_workers = num_workers or cpu_count()
     
     def get_all_stock_codes(self) -> list:
         """获取所有股票代码"""
@@ -26,70 +30,6 @@ class DataImporter:
         
         return list(all_codes)
     
-    def process_single_stock(self, stock_code: str, years: list):
-        """处理单个股票的历史数据"""
-        try:
-            all_data = []
-            
-            for year in years:
-                zip_path = os.path.join(self.data_dir, f'{year}_60min.zip')
-                if not os.path.exists(zip_path):
-                    continue
-                
-                with zipfile.ZipFile(zip_path) as z:
-                    filename = f'{stock_code}_{year}.csv'
-                    if filename not in z.namelist():
-                        continue
-                    
-                    data = z.read(filename)
-                    try:
-                        df = pd.read_csv(data, encoding='gbk')
-                    except UnicodeDecodeError:
-                        try:
-                            df = pd.read_csv(data, encoding='utf-8')
-                        except UnicodeDecodeError:
-                            df = pd.read_csv(data, encoding='gb18030')
-                    all_data.append(df)
-            
-            if not all_data:
-                return stock_code, False
-            
-            df = pd.concat(all_data, ignore_index=True)
-            df = df.sort_values('时间').reset_index(drop=True)
-            
-            daily_df = self._convert_to_daily(df)
-            
-            if not daily_df.empty:
-                self.db_cache.save_to_cache(stock_code, years, daily_df)
-                return stock_code, True
-            return stock_code, False
-        except Exception as e:
-            return stock_code, False
-    
-    def _convert_to_daily(self, df: pd.DataFrame) -> pd.DataFrame:
-        """将60分钟数据转换为日线数据"""
-        if df.empty:
-            return pd.DataFrame()
-        
-        df['日期'] = pd.to_datetime(df['时间']).dt.date
-        df['日期'] = pd.to_datetime(df['日期'])
-        
-        daily = df.groupby('日期').agg({
-            '代码': 'first',
-            '名称': 'first',
-            '开盘价': 'first',
-            '收盘价': 'last',
-            '最高价': 'max',
-            '最低价': 'min',
-            '成交量': 'sum',
-            '成交额': 'sum',
-        }).reset_index()
-        
-        daily['涨跌幅'] = daily['收盘价'].pct_change() * 100
-        daily['振幅'] = ((daily['最高价'] - daily['最低价']) / daily['收盘价'].shift(1) * 100).fillna(0)
-        
-        return daily
-    
     def import_all_data(self, years: list = None):
         """导入所有股票数据"""
         if years is None:
@@ -98,70 +38,82 @@ class DataImporter:
         print(f"开始导入所有股票数据（年份: {years}）...")
         print()
         
-        stock_codes = self.get_all_stock_codes()
-        total = len(stock_codes)
-        print(f"发现 {total} 只股票")
-        print()
+        # 每个年度压缩包只读取一次，已完整导入且未变化的压缩包直接跳过
+        ingestor = ArchiveIngestor(self.data_dir, self.db_cache, workers=self.num_workers)
+        result = ingestor.ingest(years)
         
-        # 检查已缓存的股票
-        cached_count = 0
-        for stock_code in stock_codes:
-            if self.db_cache.is_cached(stock_code, years):
-                cached_count += 1
-        
-        print(f"已缓存 {cached_count} 只股票，需要导入 {total - cached_count} 只股票")
         print()
+        print(f"导入完成！")
+        print(f"处理压缩包: {result['archives']}, 跳过: {result['skipped']}, "
+              f"文件数: {result['members']}, 股票数: {result['stocks']}")
         
-        # 过滤未缓存的股票
-        to_import = [code for code in stock_codes if not self.db_cache.is_cached(code, years)]
+        # 显示数据库统计信息
+        stats = self.db_cache.get_cache_stats()
+        print(f"\n数据库统计:")
+        print(f"记录数: {stats['records']}")
+        print(f"数据库大小: {stats['size_mb']:.2f} MB")
         
-        if not to_import:
-            print("所有股票数据已缓存，无需导入")
-            return
+        if result['archives'] > 0 or not MarketPanel.exists(PANEL_DIR):
+            self.export_panel(years)
+    
+    def export_panel(self, years: list = None, panel_dir: str = PANEL_DIR):
+        """把数据库中的日线导出为(交易日 × 股票)内存映射面板"""
+        if years is None:
+            years = list(range(2015, 2025))
         
-        # 并行处理
-        print("开始并行导入数据...")
-        print()
+        print(f"\n导出内存映射面板到: {panel_dir}")
         
-        batch_size = 100
-        processed = 0
-        success = 0
+        # 第一遍只读取日期列，确定交易日历和股票列表
+        stock_codes = []
+        all_dates = []
+        for stock_code in sorted(self.get_all_stock_codes()):
+            df = self.db_cache.load_from_cache(stock_code, years, columns=['日期'])
+            if not df.empty:
+                stock_codes.append(stock_code)
+                all_dates.append(df['日期'].to_numpy())
         
-        with Pool(min(cpu_count(), 8)) as pool:
-            tasks = [(code, years) for code in to_import]
-            results = pool.starmap(self.process_single_stock, tasks)
+        if not stock_codes:
+            print("数据库中没有可导出的数据")
+            return
         
-        for stock_code, status in results:
-            processed += 1
-            if status:
-                success += 1
-            
-            if processed % 100 == 0:
-                print(f"已处理: {processed}/{len(to_import)}, 成功: {success}")
+        writer = PanelWriter(panel_dir, np.unique(np.concatenate(all_dates)), stock_codes)
         
-        print()
-        print(f"导入完成！")
-        print(f"总处理: {len(to_import)}, 成功: {success}")
+        batch_size = 200
+        for i in range(0, len(stock_codes), batch_size):
+            batch = self.db_cache.batch_load(stock_codes[i:i+batch_size], years)
+            for stock_code, df in batch.items():
+                writer.write_stock(stock_code, df)
         
-        # 显示数据库统计信息
-        stats = self.db_cache.get_cache_stats()
-        print(f"\n数据库统计:")
-        print(f"记录数: {stats['records']}")
-        print(f"数据库大小: {stats['size_mb']:.2f} MB")
+        panel = writer.close()
+        print(f"面板大小: {panel.shape[0]} 个交易日 × {panel.shape[1]} 只股票")
     
-    def update_data(self, years: list = None):
-        """更新股票数据"""
+    def update_data(self, years: list = None, full: bool = False):
+        """更新股票数据；默认增量追加新交易日，full=True时清空数据库后重新导入"""
         if years is None:
             years = list(range(2015, 2025))
         
-        print(f"开始更新股票数据（年份: {years}）...")
+        if full:
+            print(f"开始重新导入股票数据（年份: {years}）...")
+            self.db_cache.clear_cache()
+            print("数据库已清空，开始重新导入...")
+            print()
+            self.import_all_data(years)
+            return
+        
+        print(f"开始增量更新股票数据（年份: {years}）...")
+        print()
+        
+        # 只读取有变化的压缩包，每只股票从上次导入的最后一根60分钟线之后追加
+        ingestor = ArchiveIngestor(self.data_dir, self.db_cache, workers=self.num_workers)
+        result = ingestor.update(years)
         
-        # 清理数据库
-        self.db_cache.clear_cache()
-        print("数据库已清空，开始重新导入...")
         print()
+        print(f"更新完成！")
+        print(f"处理压缩包: {result['archives']}, 跳过: {result['skipped']}, "
+              f"新增60分钟线: {result['rows']}, 涉及股票: {result['stocks']}")
         
-        self.import_all_data(years)
+        if result['rows'] > 0 or not MarketPanel.exists(PANEL_DIR):
+            self.export_panel(years)
     
     def check_status(self):
         """检查导入状态"""
@@ -193,6 +145,7 @@ if __name__ == "__main__":
     print("1. 导入所有股票数据")
     print("2. 更新股票数据")
     print("3. 检查导入状态")
+    print("4. 清空后重新导入")
     print("=" * 80)
     
     choice = input("请选择操作: ")
@@ -203,5 +156,7 @@ if __name__ == "__main__":
         importer.update_data()
     elif choice == '3':
         importer.check_status()
+    elif choice == '4':
+        importer.update_data(full=True)
     else:
         print("无效选择")
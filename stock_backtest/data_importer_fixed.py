@@ -6,6 +6,7 @@ import logging
 import io
 from multiprocessing import Pool, cpu_count
 from data_db_cache import DatabaseCache
+from resampler import convert_to_daily
 
 DATA_DIR = r'D:\BaiduNetdiskDownload\沪深个股60分钟_按年汇总'
 
@@ -78,27 +79,7 @@ class DataImporter:
     
     def _convert_to_daily(self, df: pd.DataFrame) -> pd.DataFrame:
         """将60分钟数据转换为日线数据"""
-        if df.empty:
-            return pd.DataFrame()
-        
-        df['日期'] = pd.to_datetime(df['时间']).dt.date
-        df['日期'] = pd.to_datetime(df['日期'])
-        
-        daily = df.groupby('日期').agg({
-            '代码': 'first',
-            '名称': 'first',
-            '开盘价': 'first',
-            '收盘价': 'last',
-            '最高价': 'max',
-            '最低价': 'min',
-            '成交量': 'sum',
-            '成交额': 'sum',
-        }).reset_index()
-        
-        daily['涨跌幅'] = daily['收盘价'].pct_change() * 100
-        daily['振幅'] = ((daily['最高价'] - daily['最低价']) / daily['收盘价'].shift(1) * 100).fillna(0)
-        
-        return daily
+        return convert_to_daily(df)
     
     def import_all_data(self, years: list = None):
         """导入所有股票数据"""
@@ -0,0 +1,349 @@
+import os
+import io
+import hashlib
+import time
+import zipfile
+import zlib
+import pandas as pd
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Dict, List, Optional
+from data_db_cache import DatabaseCache
+from resampler import resample_stocks, RESAMPLER_VERSION
+from shared_frames import pack_frames, unpack_frames, ensure_tracker, SHARED_MEMORY
+
+try:
+    import pyarrow
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+# 60分钟CSV的固定格式，显式指定列和类型以跳过类型推断
+CSV_DTYPES = {
+    '时间': str,
+    '代码': str,
+    '名称': str,
+    '开盘价': 'float64',
+    '收盘价': 'float64',
+    '最高价': 'float64',
+    '最低价': 'float64',
+    '成交量': 'int64',
+    '成交额': 'int64',
+}
+
+ENCODINGS = ('gbk', 'utf-8', 'gb18030')
+
+# 工作进程返回的日线列
+PACKED_COLUMNS = ['日期', '名称', '开盘价', '收盘价', '最高价', '最低价', '成交量', '成交额']
+
+STAGES = ('read', 'resample', 'write')
+
+def member_fingerprints(z: zipfile.ZipFile) -> Dict[str, str]:
+    """每只股票的CSV成员在压缩包目录中的文件名、大小、修改时间、CRC加上日线转换版本的摘要，不读取文件内容"""
+    members = defaultdict(list)
+    for info in z.infolist():
+        if info.filename.endswith('.csv'):
+            stock_code = os.path.basename(info.filename).split('_')[0]
+            members[stock_code].append(f"{info.filename}:{info.file_size}:{info.date_time}:{info.CRC:08x}")
+    
+    return {
+        stock_code: hashlib.sha1('\n'.join([f'v{RESAMPLER_VERSION}'] + sorted(items)).encode('utf-8')).hexdigest()[:16]
+        for stock_code, items in members.items()
+    }
+
+def _read_chunk(task: tuple) -> Dict:
+    """工作进程：读取一个压缩包中的一组CSV并转换为日线，多进程时日线的数值数据放入共享内存，只把描述信息返回给写入进程"""
+    zip_path, year, filenames, watermarks, shared, encoding = task
+    result = {'zip_path': zip_path, 'year': year, 'members': len(filenames), 'rows': 0, 'encoding': None}
+    
+    start_time = time.time()
+    accumulators = defaultdict(list)
+    # 编码由_plan按压缩包检测一次，个别文件解码失败时read_member才重新检测
+    with zipfile.ZipFile(zip_path) as z:
+        for filename in filenames:
+            stock_code = os.path.basename(filename).split('_')[0]
+            df, encoding = ArchiveIngestor.read_member(z, filename, encoding)
+            if watermarks is not None and stock_code in watermarks and not df.empty:
+                last_time = pd.Timestamp(watermarks[stock_code], unit='s')
+                df = df[pd.to_datetime(df['时间']) > last_time]
+            if df.empty:
+                continue
+            result['rows'] += len(df)
+            accumulators[stock_code].append(df)
+    result['encoding'] = encoding
+    result['read_seconds'] = time.time() - start_time
+    
+    start_time = time.time()
+    frames = {
+        stock_code: pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        for stock_code, parts in accumulators.items()
+    }
+    result['last_times'] = {
+        stock_code: int(pd.Timestamp(df['时间'].max()).timestamp())
+        for stock_code, df in frames.items()
+    }
+    daily = {stock_code: df[PACKED_COLUMNS] for stock_code, df in resample_stocks(frames).items()}
+    result['daily'] = pack_frames(daily, shared)
+    result['resample_seconds'] = time.time() - start_time
+    return result
+
+class ArchiveIngestor:
+    """按年度压缩包单遍导入：工作进程解析CSV并转换为日线，由当前进程作为唯一的写入方批量写入数据库"""
+    def __init__(self, data_dir: str, db_cache: DatabaseCache, flush_size: int = 200, workers: int = 1, chunk_size: int = 50):
+        self.data_dir = data_dir
+        self.db_cache = db_cache
+        self.flush_size = flush_size
+        self.workers = workers
+        self.chunk_size = chunk_size
+    
+    def get_archive_path(self, year: int) -> str:
+        return os.path.join(self.data_dir, f'{year}_60min.zip')
+    
+    def source_fingerprints(self, years: List[int]) -> Dict[int, Dict[str, str]]:
+        """每个现有压缩包中各股票的源数据指纹，只读取压缩包目录"""
+        fingerprints = {}
+        for year in sorted(set(years)):
+            zip_path = self.get_archive_path(year)
+            if os.path.exists(zip_path):
+                with zipfile.ZipFile(zip_path) as z:
+                    fingerprints[year] = member_fingerprints(z)
+        return fingerprints
+    
+    def ingest(self, years: List[int], stock_codes: Optional[List[str]] = None, verbose: bool = True) -> Dict:
+        """导入指定年份；stock_codes为None时导入全部股票并记录每个压缩包的断点"""
+        wanted = set(stock_codes) if stock_codes is not None else None
+        stats = self._run(years, wanted, None, verbose)
+        
+        # 压缩包中没有的股票写入空分区，避免之后被当作未缓存而重复导入
+        self.db_cache.fill_missing_partitions(years, stock_codes)
+        return stats
+    
+    def update(self, years: List[int], verbose: bool = True) -> Dict:
+        """增量更新：只读取有变化的压缩包，跳过每只股票高水位之前的60分钟线，新日线追加到已有分区末尾"""
+        stats = self._run(years, None, self.db_cache.get_watermarks(), verbose)
+        self.db_cache.fill_missing_partitions(years)
+        return stats
+    
+    def _run(self, years: List[int], wanted: Optional[set], watermarks: Optional[Dict[str, int]], verbose: bool) -> Dict:
+        stats = {
+            'archives': 0, 'skipped': 0, 'members': 0, 'stocks': set(), 'rows': 0, 'archive_stats': [],
+            'stages': {stage: {'rows': 0, 'seconds': 0.0} for stage in STAGES},
+        }
+        start_time = time.time()
+        
+        tasks, archives = self._plan(years, wanted, watermarks, stats, verbose)
+        
+        if self.workers > 1 and len(tasks) > 1:
+            ensure_tracker()
+            with Pool(min(self.workers, len(tasks))) as pool:
+                self._write_results(pool.imap_unordered(_read_chunk, tasks), archives, wanted, watermarks, stats, verbose)
+        else:
+            self._write_results(map(_read_chunk, tasks), archives, wanted, watermarks, stats, verbose)
+        
+        stats['seconds'] = time.time() - start_time
+        for stage in stats['stages'].values():
+            stage['rows_per_sec'] = stage['rows'] / stage['seconds'] if stage['seconds'] > 0 else 0
+        stats['stocks'] = len(stats['stocks'])
+        
+        if verbose and tasks:
+            self._print_stages(stats)
+        return stats
+    
+    def _plan(self, years: List[int], wanted: Optional[set], watermarks: Optional[Dict[str, int]], stats: Dict, verbose: bool) -> tuple:
+        """列出需要读取的压缩包成员并按chunk_size分组为任务，增量模式下任务只带相关股票的高水位"""
+        tasks = []
+        archives = {}
+        
+        for year in sorted(set(years)):
+            zip_path = self.get_archive_path(year)
+            if not os.path.exists(zip_path):
+                continue
+            
+            archive = os.path.basename(zip_path)
+            file_stat = os.stat(zip_path)
+            size, mtime = file_stat.st_size, int(file_stat.st_mtime)
+            
+            if wanted is None and self._is_archive_done(archive, size, mtime):
+                stats['skipped'] += 1
+                if verbose:
+                    print(f"{archive} 已导入，跳过")
+                continue
+            
+            with zipfile.ZipFile(zip_path) as z:
+                filenames = [
+                    info.filename for info in z.infolist()
+                    if info.filename.endswith('.csv')
+                    and (wanted is None or os.path.basename(info.filename).split('_')[0] in wanted)
+                ]
+                fingerprints = member_fingerprints(z)
+                encoding = self._archive_encoding(z, filenames)
+            
+            chunks = [filenames[i:i+self.chunk_size] for i in range(0, len(filenames), self.chunk_size)]
+            for chunk in chunks:
+                chunk_marks = None
+                if watermarks is not None:
+                    codes = (os.path.basename(filename).split('_')[0] for filename in chunk)
+                    chunk_marks = {code: watermarks[code] for code in codes if code in watermarks}
+                # 多进程时日线经共享内存传回，单进程时不需要
+                tasks.append((zip_path, year, chunk, chunk_marks, SHARED_MEMORY and self.workers > 1, encoding))
+            
+            archives[zip_path] = {
+                'archive': archive, 'year': year, 'size': size, 'mtime': mtime, 'pending': len(chunks),
+                'members': 0, 'rows': 0, 'encoding': None, 'seconds': 0.0, 'fingerprints': fingerprints,
+            }
+            if not chunks:
+                self._finish_archive(archives[zip_path], wanted, stats, verbose)
+        
+        return tasks, archives
+    
+    def _write_results(self, results, archives: Dict, wanted: Optional[set], watermarks: Optional[Dict[str, int]], stats: Dict, verbose: bool):
+        """写入进程：按年份缓存工作进程的结果，攒够flush_size只股票后在一个事务中写入"""
+        buffers = defaultdict(lambda: ({}, {}, {}))
+        buffered = 0
+        finished = []
+        
+        for result in results:
+            for stage in ('read', 'resample'):
+                stats['stages'][stage]['rows'] += result['rows']
+                stats['stages'][stage]['seconds'] += result[f'{stage}_seconds']
+            
+            archive = archives[result['zip_path']]
+            daily, last_times, sources = buffers[result['year']]
+            chunk_daily = unpack_frames(result['daily'])
+            for stock_code, df in chunk_daily.items():
+                daily[stock_code] = df
+                sources[stock_code] = archive['fingerprints'].get(stock_code)
+                stats['stocks'].add(stock_code)
+            last_times.update(result['last_times'])
+            buffered += len(chunk_daily)
+            
+            archive['members'] += result['members']
+            archive['rows'] += result['rows']
+            archive['seconds'] += result['read_seconds'] + result['resample_seconds']
+            archive['encoding'] = archive['encoding'] or result['encoding']
+            archive['pending'] -= 1
+            if archive['pending'] == 0:
+                finished.append(archive)
+            
+            if buffered >= self.flush_size:
+                self._flush(buffers, watermarks is not None, stats)
+                buffered = 0
+            
+            # 压缩包的全部数据落盘后才记录断点
+            if finished and buffered == 0:
+                for archive in finished:
+                    self._finish_archive(archive, wanted, stats, verbose)
+                finished = []
+        
+        self._flush(buffers, watermarks is not None, stats)
+        for archive in finished:
+            self._finish_archive(archive, wanted, stats, verbose)
+    
+    def _flush(self, buffers: Dict, append: bool, stats: Dict):
+        start_time = time.time()
+        rows = 0
+        for year, (daily, last_times, sources) in buffers.items():
+            if not daily and not last_times:
+                continue
+            if append:
+                self.db_cache.append_bars(daily, last_times, sources)
+            else:
+                self.db_cache.batch_save(daily, [year], last_times, sources)
+            rows += sum(len(df) for df in daily.values())
+        buffers.clear()
+        
+        stats['stages']['write']['rows'] += rows
+        stats['stages']['write']['seconds'] += time.time() - start_time
+    
+    def _finish_archive(self, archive: Dict, wanted: Optional[set], stats: Dict, verbose: bool):
+        stats['archives'] += 1
+        stats['members'] += archive['members']
+        stats['rows'] += archive['rows']
+        stats['archive_stats'].append({
+            'archive': archive['archive'],
+            'members': archive['members'],
+            'rows': archive['rows'],
+            'encoding': archive['encoding'],
+            'seconds': archive['seconds'],
+            'rows_per_sec': archive['rows'] / archive['seconds'] if archive['seconds'] > 0 else 0,
+        })
+        
+        # 压缩包中已删除的股票不再保留旧数据，否则会一直被判断为过期
+        self.db_cache.clear_absent_partitions(archive['year'], set(archive['fingerprints']), wanted)
+        
+        if wanted is None:
+            self.db_cache.save_archive_checkpoint(archive['archive'], archive['size'], archive['mtime'], archive['members'], RESAMPLER_VERSION)
+        
+        if verbose:
+            print(f"{archive['archive']}: {archive['members']} 个文件, {archive['rows']} 行, 编码 {archive['encoding']}, "
+                  f"解析耗时 {archive['seconds']:.1f} 秒, {archive['rows'] / max(archive['seconds'], 1e-9):,.0f} 行/秒")
+    
+    def _print_stages(self, stats: Dict):
+        # 读取和转换的耗时是各工作进程累加的，乘以进程数才是并行后的吞吐，与写入比较可以看出瓶颈
+        workers = max(1, self.workers)
+        stages = stats['stages']
+        print(f"总耗时 {stats['seconds']:.1f} 秒, 工作进程 {workers} 个")
+        print(f"  读取解析: 每进程 {stages['read']['rows_per_sec']:,.0f} 行/秒, "
+              f"合计约 {stages['read']['rows_per_sec'] * workers:,.0f} 行/秒")
+        print(f"  日线转换: 每进程 {stages['resample']['rows_per_sec']:,.0f} 行/秒, "
+              f"合计约 {stages['resample']['rows_per_sec'] * workers:,.0f} 行/秒")
+        print(f"  写入数据库: {stages['write']['rows']} 条日线, 耗时 {stages['write']['seconds']:.1f} 秒, "
+              f"{stages['write']['rows_per_sec']:,.0f} 条/秒")
+    
+    def _is_archive_done(self, archive: str, size: int, mtime: int) -> bool:
+        checkpoint = self.db_cache.get_archive_checkpoint(archive)
+        # 日线转换版本变化后需要按新逻辑重新导入
+        return (checkpoint is not None and checkpoint['size'] == size and checkpoint['mtime'] == mtime
+                and checkpoint['version'] == RESAMPLER_VERSION)
+    
+    def _archive_encoding(self, z: zipfile.ZipFile, filenames: List[str]) -> Optional[str]:
+        """同一压缩包中的文件编码相同，用第一个能读取的文件检测一次"""
+        for filename in filenames:
+            try:
+                return self.detect_encoding(z.read(filename))
+            except (zipfile.BadZipFile, zlib.error, OSError):
+                continue
+        return None
+    
+    @classmethod
+    def read_member(cls, z: zipfile.ZipFile, member, encoding: Optional[str] = None) -> tuple:
+        """读取一个CSV文件，返回(数据, 实际使用的编码)；encoding为预先检测到的编码，解码失败时重新检测"""
+        try:
+            data = z.read(member)
+        except Exception:
+            return pd.DataFrame(), encoding
+        
+        if encoding is not None:
+            try:
+                return cls.parse_csv(data, encoding), encoding
+            except UnicodeDecodeError:
+                pass
+            except Exception:
+                return pd.DataFrame(), encoding
+        
+        encoding = cls.detect_encoding(data)
+        try:
+            return cls.parse_csv(data, encoding), encoding
+        except Exception:
+            return pd.DataFrame(), encoding
+    
+    @staticmethod
+    def detect_encoding(data: bytes) -> str:
+        for encoding in ENCODINGS:
+            try:
+                data.decode(encoding)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        return ENCODINGS[-1]
+    
+    @staticmethod
+    def parse_csv(data: bytes, encoding: str) -> pd.DataFrame:
+        try:
+            return pd.read_csv(io.BytesIO(data), encoding=encoding, usecols=list(CSV_DTYPES),
+                               dtype=CSV_DTYPES, engine=CSV_ENGINE)
+        except UnicodeDecodeError:
+            raise
+        except Exception:
+            # 列不全或类型不符（如成交量有缺失）时退回到C引擎自动推断
+            return pd.read_csv(io.BytesIO(data), encoding=encoding)
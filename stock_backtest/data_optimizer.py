@@ -1,15 +1,147 @@
 import os
 import pandas as pd
-import pickle
-import lz4.frame
-from typing import Dict, List, Optional
+from cache_codec import Codec, loads
+from typing import Callable, Dict, List, Optional
 import asyncio
+import functools
 import concurrent.futures
+import threading
+from collections import OrderedDict, deque
+
+# 内存缓存默认预算，全市场10年日线约需数GB
+DEFAULT_MEMORY_LIMIT_MB = 4096
+
+class MemoryLRU:
+    """按DataFrame实际占用字节数计量的LRU缓存，超出预算时淘汰最久未使用的数据"""
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 预加载在线程池中写入，读写都要加锁
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def sizeof(df: pd.DataFrame) -> int:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    
+    def get(self, key) -> Optional[pd.DataFrame]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, df: pd.DataFrame):
+        nbytes = self.sizeof(df)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            # 单个数据超过整个预算时不缓存，避免把其他数据全部挤出
+            if nbytes > self.max_bytes:
+                return
+            
+            self.entries[key] = (df, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+    
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            return key in self.entries
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'memory_cache_size': len(self.entries),
+                'memory_cache_mb': self.current_bytes / 1024 / 1024,
+                'memory_limit_mb': self.max_bytes / 1024 / 1024,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+class Prefetcher:
+    """按回测的访问顺序在线程池中提前加载并解压后面window只股票，处理第k只时第k+1..k+window只已在解压；
+    load为按股票代码加载一只股票的函数，on_close在结束时于工作线程中调用一次，用于释放load在线程内打开的资源"""
+    def __init__(self, load: Callable[[str], pd.DataFrame], stock_codes: List[str], window: int = 8, max_workers: int = 4,
+                 on_close: Optional[Callable[[], None]] = None):
+        self.load = load
+        self.stock_codes = list(stock_codes)
+        self.window = max(1, window)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.pending = deque()
+        self.next_index = 0
+        self.on_close = on_close
+        self.closed = False
+    
+    def _fill(self):
+        while len(self.pending) < self.window and self.next_index < len(self.stock_codes):
+            stock_code = self.stock_codes[self.next_index]
+            future = self.executor.submit(self.load, stock_code)
+            self.pending.append((stock_code, future))
+            self.next_index += 1
+    
+    def __iter__(self):
+        try:
+            self._fill()
+            while self.pending:
+                stock_code, future = self.pending.popleft()
+                # 取走一只后立即补满窗口，消费方处理这只时后面的仍在解压
+                self._fill()
+                yield stock_code, future.result()
+        finally:
+            self.close()
+    
+    async def _aiter(self):
+        try:
+            self._fill()
+            while self.pending:
+                stock_code, future = self.pending.popleft()
+                self._fill()
+                yield stock_code, await asyncio.wrap_future(future)
+        finally:
+            self.close()
+    
+    def __aiter__(self):
+        return self._aiter()
+    
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for _, future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        # 排在未完成的加载之后执行，不等待
+        if self.on_close is not None:
+            self.executor.submit(self.on_close)
+        self.executor.shutdown(wait=False)
 
 class DataOptimizer:
-    def __init__(self, cache_dir: str = 'data_cache'):
+    def __init__(self, cache_dir: str = 'data_cache', memory_limit_mb: int = DEFAULT_MEMORY_LIMIT_MB, codec: str = 'lz4frame'):
         self.cache_dir = cache_dir
-        self.memory_cache = {}
+        # 写入时使用的压缩编码，读取时按文件头自动识别
+        self.codec = Codec.parse(codec)
+        self.memory_cache = MemoryLRU(memory_limit_mb * 1024 * 1024)
         self.batch_size = 100
         os.makedirs(self.cache_dir, exist_ok=True)
     
@@ -33,10 +165,11 @@ class DataOptimizer:
         if df.empty:
             return
         cache_key = (stock_code, tuple(sorted(years)))
-        self.memory_cache[cache_key] = df
+        self.memory_cache.put(cache_key, df)
     
     def is_cached(self, stock_code: str, years: List[int]) -> bool:
-        if self.load_from_memory_cache(stock_code, years) is not None:
+        # 只判断存在与否，不计入命中统计，也不更新使用顺序
+        if (stock_code, tuple(sorted(years))) in self.memory_cache:
             return True
         return os.path.exists(self.get_cache_path(stock_code, years))
     
@@ -50,10 +183,7 @@ class DataOptimizer:
             return pd.DataFrame()
         
         try:
-            with lz4.frame.open(cache_path, 'rb') as f:
-                data = f.read()
-                df = pickle.loads(data)
-            
+            df = self._read_file(cache_path)
             self.save_to_memory_cache(stock_code, years, df)
             return df
         except Exception:
@@ -67,29 +197,24 @@ class DataOptimizer:
         
         cache_path = self.get_cache_path(stock_code, years)
         try:
-            data = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
-            with lz4.frame.open(cache_path, 'wb') as f:
+            data = self.codec.dumps(df)
+            with open(cache_path, 'wb') as f:
                 f.write(data)
         except Exception:
             pass
     
-    async def preload_cache(self, stock_codes: List[str], years: List[int]):
-        """异步预加载缓存"""
-        def preload_one(stock_code):
-            cache_path = self.get_cache_path(stock_code, years)
-            if os.path.exists(cache_path):
-                try:
-                    with lz4.frame.open(cache_path, 'rb') as f:
-                        data = f.read()
-                        df = pickle.loads(data)
-                    self.save_to_memory_cache(stock_code, years, df)
-                except Exception:
-                    pass
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            tasks = [executor.submit(preload_one, code) for code in stock_codes]
-            for task in concurrent.futures.as_completed(tasks):
-                pass
+    def _read_file(self, cache_path: str) -> pd.DataFrame:
+        with open(cache_path, 'rb') as f:
+            return loads(f.read())
+    
+    def prefetch(self, stock_codes: List[str], years: List[int], window: int = 8, max_workers: int = 4) -> Prefetcher:
+        """按stock_codes的顺序逐只返回(代码, 数据)，后台始终保持window只在提前加载"""
+        return Prefetcher(functools.partial(self.load_from_cache, years=years), stock_codes, window, max_workers)
+    
+    async def preload_cache(self, stock_codes: List[str], years: List[int], window: int = 8, max_workers: int = 4):
+        """按stock_codes的顺序异步预加载到内存缓存：同时最多window只在线程池中解压，等待期间事件循环可以继续处理其他任务"""
+        async for _ in self.prefetch(stock_codes, years, window, max_workers):
+            pass
     
     def clear_cache(self):
         self.memory_cache.clear()
@@ -110,8 +235,9 @@ class DataOptimizer:
             if os.path.isfile(file_path):
                 disk_size += os.path.getsize(file_path)
         
-        return {
-            'memory_cache_size': len(self.memory_cache),
+        stats = self.memory_cache.stats()
+        stats.update({
             'disk_cache_size': disk_size / 1024 / 1024,
             'disk_cache_files': len(os.listdir(self.cache_dir))
-        }
+        })
+        return stats
@@ -0,0 +1,259 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Dict, List, Optional
+from data_db_cache import DAILY_COLUMNS
+
+# 面板字段：字段名 -> 日线列名，统一保存为float64，未交易的日期为NaN
+PANEL_FIELDS = {
+    'open': '开盘价',
+    'close': '收盘价',
+    'high': '最高价',
+    'low': '最低价',
+    'volume': '成交量',
+    'amount': '成交额',
+    'pct_change': '涨跌幅',
+}
+
+INTEGER_FIELDS = ('volume', 'amount')
+
+# 日线列名 -> 面板字段名
+COLUMN_FIELDS = {column: field for field, column in PANEL_FIELDS.items()}
+
+# StockArrays可以读取的列
+ARRAY_COLUMNS = ('日期',) + tuple(COLUMN_FIELDS)
+
+META_FILE = 'meta.json'
+
+def _to_days(dates) -> np.ndarray:
+    dates = np.asarray(dates)
+    if dates.dtype.kind in 'iu':
+        return dates.astype(np.int64)
+    return dates.astype('datetime64[D]').astype(np.int64)
+
+def _field_path(panel_dir: str, field: str) -> str:
+    return os.path.join(panel_dir, f'{field}.dat')
+
+class PanelWriter:
+    """按(交易日 × 股票)写入内存映射面板，每只股票的序列在文件中连续存放"""
+    def __init__(self, panel_dir: str, dates: np.ndarray, codes: List[str]):
+        if len(dates) == 0 or len(codes) == 0:
+            raise ValueError("面板至少需要一个交易日和一只股票")
+        
+        self.panel_dir = panel_dir
+        self.dates = _to_days(dates)
+        self.codes = list(codes)
+        self.code_index = {code: j for j, code in enumerate(self.codes)}
+        self.names = [[] for _ in self.codes]
+        os.makedirs(panel_dir, exist_ok=True)
+        
+        # 写入完成前先移除元数据，避免读取方打开写了一半的面板
+        meta_path = os.path.join(panel_dir, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        
+        shape = (len(self.dates), len(self.codes))
+        self.fields = {}
+        for field in PANEL_FIELDS:
+            panel = np.memmap(_field_path(panel_dir, field), dtype=np.float64, mode='w+', shape=shape, order='F')
+            panel[:] = np.nan
+            self.fields[field] = panel
+    
+    def write_stock(self, stock_code: str, df: pd.DataFrame):
+        if df.empty or stock_code not in self.code_index:
+            return
+        
+        j = self.code_index[stock_code]
+        days = _to_days(df['日期'])
+        rows = np.clip(np.searchsorted(self.dates, days), 0, len(self.dates) - 1)
+        valid = self.dates[rows] == days
+        rows = rows[valid]
+        
+        for field, column in PANEL_FIELDS.items():
+            self.fields[field][rows, j] = df[column].to_numpy(dtype=np.float64)[valid]
+        
+        # 名称只保存变更点（如更名为ST），读取时按日期展开
+        if '名称' in df.columns:
+            names = df['名称'].to_numpy()
+            changed = np.ones(len(names), dtype=bool)
+            changed[1:] = names[1:] != names[:-1]
+            self.names[j] = [[int(day), str(name)] for day, name in zip(days[changed], names[changed])]
+    
+    def close(self) -> 'MarketPanel':
+        shape = (len(self.dates), len(self.codes))
+        for panel in self.fields.values():
+            panel.flush()
+        self.fields.clear()
+        
+        meta = {
+            'shape': list(shape),
+            'dates': self.dates.tolist(),
+            'codes': self.codes,
+            'names': self.names,
+        }
+        with open(os.path.join(self.panel_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        
+        return MarketPanel(self.panel_dir)
+
+def write_panel(data: Dict[str, pd.DataFrame], panel_dir: str) -> 'MarketPanel':
+    codes = sorted(code for code, df in data.items() if not df.empty)
+    all_days = [_to_days(data[code]['日期']) for code in codes]
+    dates = np.unique(np.concatenate(all_days)) if all_days else np.empty(0, dtype=np.int64)
+    
+    writer = PanelWriter(panel_dir, dates, codes)
+    for code in codes:
+        writer.write_stock(code, data[code])
+    return writer.close()
+
+class MarketPanel:
+    """只读打开面板文件，多个进程打开同一目录时共享同一份页缓存，传给子进程时只序列化目录路径"""
+    def __init__(self, panel_dir: str):
+        self.panel_dir = panel_dir
+        
+        with open(os.path.join(panel_dir, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        
+        self.shape = tuple(meta['shape'])
+        self.days = np.array(meta['dates'], dtype=np.int64)
+        self.dates = pd.DatetimeIndex(pd.to_datetime(self.days.astype('datetime64[D]')))
+        self.codes = meta['codes']
+        self.names = meta['names']
+        self.code_index = {code: j for j, code in enumerate(self.codes)}
+        
+        self.fields = {
+            field: np.memmap(_field_path(panel_dir, field), dtype=np.float64, mode='r', shape=self.shape, order='F')
+            for field in PANEL_FIELDS
+        }
+    
+    @staticmethod
+    def exists(panel_dir: str) -> bool:
+        return os.path.exists(os.path.join(panel_dir, META_FILE))
+    
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+    
+    def __getstate__(self):
+        return {'panel_dir': self.panel_dir}
+    
+    def __setstate__(self, state):
+        self.__init__(state['panel_dir'])
+    
+    def stock_frame(self, stock_code: str, years: Optional[List[int]] = None) -> pd.DataFrame:
+        """取出单只股票的日线，列与_convert_to_daily一致；指定years时派生列按该区间重新计算"""
+        j = self.code_index.get(stock_code)
+        if j is None:
+            return pd.DataFrame()
+        
+        rows = self._rows(j, years)
+        if len(rows) == 0:
+            return pd.DataFrame()
+        
+        df = pd.DataFrame({'日期': self.dates[rows]})
+        df['代码'] = np.full(len(rows), stock_code, dtype=object)
+        df['名称'] = self._expand_names(j, self.days[rows])
+        
+        for field, column in PANEL_FIELDS.items():
+            values = self.fields[field][rows, j]
+            df[column] = values.astype(np.int64) if field in INTEGER_FIELDS else values
+        
+        if years is not None:
+            df['涨跌幅'] = df['收盘价'].pct_change() * 100
+        df['振幅'] = ((df['最高价'] - df['最低价']) / df['收盘价'].shift(1) * 100).fillna(0)
+        
+        return df[DAILY_COLUMNS]
+    
+    def stock_arrays(self, stock_code: str, years: Optional[List[int]] = None) -> Optional['StockArrays']:
+        """单只股票的列视图，不生成DataFrame，取某列时才从内存映射中读取"""
+        j = self.code_index.get(stock_code)
+        if j is None:
+            return None
+        
+        rows = self._rows(j, years)
+        if len(rows) == 0:
+            return None
+        return StockArrays(self, j, rows, years is not None)
+    
+    def _rows(self, j: int, years: Optional[List[int]]) -> np.ndarray:
+        mask = ~np.isnan(self.fields['close'][:, j])
+        if years is not None:
+            mask &= np.isin(self.dates.year, years)
+        return np.flatnonzero(mask)
+    
+    def _expand_names(self, j: int, days: np.ndarray) -> np.ndarray:
+        changes = self.names[j]
+        if not changes:
+            return np.full(len(days), '', dtype=object)
+        
+        starts = np.array([start for start, _ in changes], dtype=np.int64)
+        labels = np.array([name for _, name in changes], dtype=object)
+        return labels[np.clip(np.searchsorted(starts, days, side='right') - 1, 0, None)]
+    
+    def to_frames(self, stock_codes: Optional[List[str]] = None, years: Optional[List[int]] = None) -> Dict[str, pd.DataFrame]:
+        data = {}
+        for stock_code in stock_codes or self.codes:
+            df = self.stock_frame(stock_code, years)
+            if not df.empty:
+                data[stock_code] = df
+        return data
+
+class StockArrays:
+    """面板中单只股票的只读列视图，按日线列名取值：日期为DatetimeIndex，数值列为float64数组；
+    交易日连续时直接切片内存映射，不复制数据"""
+    def __init__(self, panel: MarketPanel, j: int, rows: np.ndarray, recompute_pct: bool):
+        self.panel = panel
+        self.j = j
+        self.length = len(rows)
+        if rows[-1] - rows[0] + 1 == len(rows):
+            rows = slice(rows[0], rows[-1] + 1)
+        self.rows = rows
+        # 与stock_frame一致：指定年份时涨跌幅按该区间重新计算
+        self.recompute_pct = recompute_pct
+    
+    def __len__(self) -> int:
+        return self.length
+    
+    def __getitem__(self, column: str):
+        if column == '日期':
+            return self.panel.dates[self.rows]
+        if column == '涨跌幅' and self.recompute_pct:
+            close = self['收盘价']
+            pct = np.empty(self.length)
+            pct[0] = np.nan
+            pct[1:] = (close[1:] / close[:-1] - 1) * 100
+            return pct
+        return self.panel.fields[COLUMN_FIELDS[column]][self.rows, self.j]
+
+class PanelData(Mapping):
+    """面板中一组股票的只读映射：按股票取值时才生成日线DataFrame，arrays直接读取面板的列；
+    传给子进程时只序列化面板目录、股票代码和年份"""
+    def __init__(self, panel: MarketPanel, stock_codes: Optional[List[str]] = None, years: Optional[List[int]] = None):
+        self.panel = panel
+        self.years = years
+        
+        rows = np.flatnonzero(np.isin(panel.dates.year, years)) if years is not None else slice(None)
+        traded = ~np.isnan(panel['close'][rows]).all(axis=0)
+        codes = dict.fromkeys(stock_codes or panel.codes)
+        self.codes = [code for code in codes if code in panel.code_index and traded[panel.code_index[code]]]
+        self.code_set = set(self.codes)
+    
+    def __getitem__(self, stock_code: str) -> pd.DataFrame:
+        if stock_code not in self.code_set:
+            raise KeyError(stock_code)
+        return self.panel.stock_frame(stock_code, self.years)
+    
+    def __contains__(self, stock_code) -> bool:
+        return stock_code in self.code_set
+    
+    def __iter__(self):
+        return iter(self.codes)
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def arrays(self, stock_code: str) -> StockArrays:
+        if stock_code not in self.code_set:
+            raise KeyError(stock_code)
+        return self.panel.stock_arrays(stock_code, self.years)
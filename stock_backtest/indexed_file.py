@@ -0,0 +1,153 @@
+import os
+import pickle
+import struct
+from typing import Dict, Optional, Tuple
+
+# 文件尾：索引在文件中的偏移 + 魔数
+FOOTER = struct.Struct('<Q8s')
+
+# 末尾不完整时每次向前读取的块大小
+SCAN_BYTES = 1024 * 1024
+
+# 文件超过该大小且不再被索引的部分超过一半时重写整理
+COMPACT_MIN_BYTES = 16 * 1024 * 1024
+
+class IndexedFiles:
+    """末尾带索引的追加式文件：依次存放各条记录，之后是索引(键 -> (偏移, 长度))和文件尾。
+    追加时新记录、新索引和新文件尾都写在原文件尾之后，新文件尾写入并落盘之前原文件尾一直有效；
+    读取时以最后一个完整的文件尾为准，写入中途崩溃留下的不完整数据在下次追加时截掉"""
+    def __init__(self, magic: bytes, kind: str):
+        self.magic = magic
+        self.kind = kind
+        # 文件路径 -> (文件大小, 修改时间, 有效部分的长度, 索引)
+        self._indexes = {}
+    
+    def read_index(self, path: str) -> Dict[str, tuple]:
+        return self._load(path)[1]
+    
+    def read(self, path: str, key: str) -> Optional[bytes]:
+        entry = self.read_index(path).get(key)
+        if entry is None:
+            return None
+        
+        offset, length = entry
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+    
+    def forget(self):
+        self._indexes.clear()
+    
+    def _load(self, path: str) -> Tuple[int, Dict[str, tuple]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 0, {}
+        
+        cached = self._indexes.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2], cached[3]
+        
+        with open(path, 'rb') as f:
+            end, index = self._last_commit(f, stat.st_size)
+        if end == 0 and stat.st_size > 0:
+            print(f"{self.kind}中没有完整的索引，按空文件处理: {path}")
+        
+        self._indexes[path] = (stat.st_size, stat.st_mtime_ns, end, index)
+        return end, index
+    
+    def _last_commit(self, f, size: int) -> Tuple[int, Dict[str, tuple]]:
+        """从文件末尾向前找最后一个完整的文件尾，返回(其结束位置, 索引)；找不到时为(0, {})"""
+        end = size
+        while end >= FOOTER.size:
+            start = max(0, end - SCAN_BYTES)
+            f.seek(start)
+            chunk = f.read(end - start)
+            
+            pos = chunk.rfind(self.magic)
+            while pos >= 0:
+                footer_end = start + pos + len(self.magic)
+                index = self._index_before(f, footer_end)
+                if index is not None:
+                    return footer_end, index
+                pos = chunk.rfind(self.magic, 0, pos + len(self.magic) - 1)
+            
+            if start == 0:
+                break
+            # 与下一块重叠，跨块的魔数也能找到
+            end = start + len(self.magic) - 1
+        return 0, {}
+    
+    @staticmethod
+    def _index_before(f, footer_end: int) -> Optional[Dict[str, tuple]]:
+        """校验以footer_end结束的文件尾：索引能完整解析且所有记录都在索引之前"""
+        footer_start = footer_end - FOOTER.size
+        if footer_start < 0:
+            return None
+        
+        f.seek(footer_start)
+        index_offset, _ = FOOTER.unpack(f.read(FOOTER.size))
+        if index_offset > footer_start:
+            return None
+        
+        f.seek(index_offset)
+        try:
+            index = pickle.loads(f.read(footer_start - index_offset))
+        except Exception:
+            return None
+        if not isinstance(index, dict):
+            return None
+        if any(offset + length > index_offset for offset, length in index.values()):
+            return None
+        return index
+    
+    def append(self, path: str, records: Dict[str, bytes]):
+        """追加记录，同名的键指向新数据；写入失败时抛出异常，已有数据不受影响"""
+        end, index = self._load(path)
+        index = dict(index)
+        
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+            # 截掉最后一个完整文件尾之后、上次写了一半的数据
+            f.truncate(end)
+            f.seek(end)
+            offset = end
+            for key, blob in records.items():
+                f.write(blob)
+                index[key] = (offset, len(blob))
+                offset += len(blob)
+            f.write(pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+            
+            # 记录和索引落盘后才写文件尾
+            f.flush()
+            os.fsync(f.fileno())
+            f.write(FOOTER.pack(offset, self.magic))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        
+        self._indexes.pop(path, None)
+        
+        live = sum(length for _, length in index.values())
+        if size > COMPACT_MIN_BYTES and live < size / 2:
+            self.compact(path)
+    
+    def compact(self, path: str):
+        """只保留被索引的记录，写入临时文件后原子替换"""
+        _, index = self._load(path)
+        tmp_path = path + '.tmp'
+        
+        compacted = {}
+        offset = 0
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            for key, (start, length) in sorted(index.items(), key=lambda item: item[1][0]):
+                src.seek(start)
+                dst.write(src.read(length))
+                compacted[key] = (offset, length)
+                offset += length
+            dst.write(pickle.dumps(compacted, protocol=pickle.HIGHEST_PROTOCOL))
+            dst.write(FOOTER.pack(offset, self.magic))
+            dst.flush()
+            os.fsync(dst.fileno())
+        
+        os.replace(tmp_path, path)
+        self._indexes.pop(path, None)
@@ -6,6 +6,8 @@ import warnings
 warnings.filterwarnings('ignore')
 
 from config import BACKTEST_CONFIG, SELECTION_CONFIG, RESULTS_DIR
+from daily_signals import DailySignals
+from performance import simple_returns, summarize
 import os
 
 class MockDataGenerator:
@@ -231,12 +233,12 @@ class BacktestEngineDemo:
             self.sell(stock_code, price, date, reason)
 
     def run(self, data: Dict[str, pd.DataFrame], signals: pd.DataFrame):
-        all_dates = sorted(signals['date'].unique())
+        # 按日期排序分组一次，每天只切片当天的信号
+        daily_signals = DailySignals.from_frame(signals)
         
-        for date in all_dates:
-            daily_signals = signals[signals['date'] == date]
-            for _, signal in daily_signals.iterrows():
-                self.buy(signal['stock_code'], signal['price'], date)
+        for date, codes, buy_prices, _ in daily_signals:
+            for stock_code, price in zip(codes, buy_prices):
+                self.buy(stock_code, price, date)
             
             self.update(data, date)
             
@@ -261,54 +263,11 @@ class BacktestEngineDemo:
         if not self.trades:
             return {}
         
-        final_value = self.portfolio_values[-1] if self.portfolio_values else self.initial_capital
-        total_return = (final_value - self.initial_capital) / self.initial_capital
-        
-        days = len(self.portfolio_values)
-        years = days / 252
-        annualized_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else 0
-        
-        returns = []
-        for i in range(1, len(self.portfolio_values)):
-            returns.append((self.portfolio_values[i] - self.portfolio_values[i-1]) / self.portfolio_values[i-1])
-        
-        if returns:
-            volatility = np.std(returns) * np.sqrt(252)
-            excess_returns = np.array(returns) - 0.03 / 252
-            sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252) if np.std(excess_returns) > 0 else 0
-        else:
-            volatility = 0
-            sharpe_ratio = 0
-        
-        win_trades = [t for t in self.trades if t['return_pct'] > 0]
-        lose_trades = [t for t in self.trades if t['return_pct'] <= 0]
-        
-        win_rate = len(win_trades) / len(self.trades) if self.trades else 0
-        
         values = np.array(self.portfolio_values)
-        peak = np.maximum.accumulate(values)
-        drawdown = (values - peak) / peak
-        max_drawdown = np.min(drawdown) if len(drawdown) > 0 else 0
-        
-        trades_df = pd.DataFrame(self.trades)
-        avg_holding_days = trades_df['holding_days'].mean() if not trades_df.empty else 0
-        
-        return {
-            'initial_capital': self.initial_capital,
-            'final_value': final_value,
-            'total_return': total_return,
-            'annualized_return': annualized_return,
-            'volatility': volatility,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': max_drawdown,
-            'total_trades': len(self.trades),
-            'win_rate': win_rate,
-            'win_trades': len(win_trades),
-            'lose_trades': len(lose_trades),
-            'avg_win': np.mean([t['return_pct'] for t in win_trades]) if win_trades else 0,
-            'avg_loss': np.mean([t['return_pct'] for t in lose_trades]) if lose_trades else 0,
-            'avg_holding_days': avg_holding_days,
-        }
+        trade_returns = np.array([t['return_pct'] for t in self.trades])
+        holding_days = np.array([t['holding_days'] for t in self.trades])
+        # 波动率和夏普比率只用第二天起的收益率
+        return summarize(values, simple_returns(values)[1:], trade_returns, holding_days, self.initial_capital)
 
 def main():
     print("=" * 80)
@@ -5,6 +5,10 @@ from datetime import datetime
 from typing import Dict, List
 import os
 import io
+from daily_signals import DailySignals
+from performance import simple_returns, summarize
+from price_matrix import PriceMatrix
+from resampler import convert_to_daily
 
 DATA_DIR = r'D:\BaiduNetdiskDownload\沪深个股60分钟_按年汇总'
 
@@ -53,27 +57,8 @@ class LocalDataLoader:
         return df
 
     def convert_to_daily(self, df: pd.DataFrame) -> pd.DataFrame:
-        if df.empty:
-            return pd.DataFrame()
-        
-        df['日期'] = pd.to_datetime(df['时间']).dt.date
-        df['日期'] = pd.to_datetime(df['日期'])
-        
-        daily = df.groupby('日期').agg({
-            '代码': 'first',
-            '名称': 'first',
-            '开盘价': 'first',
-            '收盘价': 'last',
-            '最高价': 'max',
-            '最低价': 'min',
-            '成交量': 'sum',
-            '成交额': 'sum',
-        }).reset_index()
-        
-        daily['涨幅'] = daily['收盘价'].pct_change() * 100
-        daily['振幅'] = ((daily['最高价'] - daily['最低价']) / daily['收盘价'].shift(1) * 100).fillna(0)
-        
-        return daily
+        # 本模块的策略按“涨幅”列取涨跌幅
+        return convert_to_daily(df).rename(columns={'涨跌幅': '涨幅'})
 
 class LimitUpStrategy:
     def __init__(self):
@@ -150,6 +135,7 @@ class BacktestEngine:
         self.initial_capital = initial_capital
         self.cash = initial_capital
         self.positions = {}
+        self.prices = None
         self.trades = []
         self.portfolio_values = []
         self.dates = []
@@ -210,19 +196,17 @@ class BacktestEngine:
         del self.positions[stock_code]
 
     def update(self, data: Dict[str, pd.DataFrame], date: pd.Timestamp):
+        if self.prices is None:
+            self.prices = PriceMatrix.from_frames(data)
+        
         to_sell = []
+        row = self.prices.date_row(date)
         
         for stock_code, pos in self.positions.items():
-            if stock_code not in data:
-                continue
-            
-            df = data[stock_code]
-            row = df[df['日期'] == date]
-            if row.empty:
+            current_price = self.prices.price_at(row, stock_code)
+            if np.isnan(current_price):
                 continue
             
-            current_price = row.iloc[0]['收盘价']
-            
             if current_price > pos['highest_price']:
                 pos['highest_price'] = current_price
             
@@ -243,22 +227,23 @@ class BacktestEngine:
             self.sell(stock_code, price, date, reason)
 
     def run(self, data: Dict[str, pd.DataFrame], signals: pd.DataFrame):
-        all_dates = sorted(signals['date'].unique())
-        
-        for date in all_dates:
-            daily_signals = signals[signals['date'] == date]
-            for _, signal in daily_signals.iterrows():
-                self.buy(signal['stock_code'], signal['price'], date)
+        # 一次性构建日期×股票价格矩阵，之后每个持仓每天O(1)取价
+        self.prices = PriceMatrix.from_frames(data)
+        # 按日期排序分组一次，每天只切片当天的信号
+        daily_signals = DailySignals.from_frame(signals)
+        
+        for date, codes, buy_prices, _ in daily_signals:
+            for stock_code, price in zip(codes, buy_prices):
+                self.buy(stock_code, price, date)
             
             self.update(data, date)
             
             portfolio_value = self.cash
+            row = self.prices.date_row(date)
             for stock_code, pos in self.positions.items():
-                if stock_code in data:
-                    df = data[stock_code]
-                    row = df[df['日期'] == date]
-                    if not row.empty:
-                        portfolio_value += row.iloc[0]['收盘价'] * pos['quantity']
+                current_price = self.prices.price_at(row, stock_code)
+                if not np.isnan(current_price):
+                    portfolio_value += current_price * pos['quantity']
             
             self.portfolio_values.append(portfolio_value)
             self.dates.append(date)
@@ -273,54 +258,11 @@ class BacktestEngine:
         if not self.trades:
             return {}
         
-        final_value = self.portfolio_values[-1] if self.portfolio_values else self.initial_capital
-        total_return = (final_value - self.initial_capital) / self.initial_capital
-        
-        days = len(self.portfolio_values)
-        years = days / 252
-        annualized_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else 0
-        
-        returns = []
-        for i in range(1, len(self.portfolio_values)):
-            returns.append((self.portfolio_values[i] - self.portfolio_values[i-1]) / self.portfolio_values[i-1])
-        
-        if returns:
-            volatility = np.std(returns) * np.sqrt(252)
-            excess_returns = np.array(returns) - 0.03 / 252
-            sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252) if np.std(excess_returns) > 0 else 0
-        else:
-            volatility = 0
-            sharpe_ratio = 0
-        
-        win_trades = [t for t in self.trades if t['return_pct'] > 0]
-        lose_trades = [t for t in self.trades if t['return_pct'] <= 0]
-        
-        win_rate = len(win_trades) / len(self.trades) if self.trades else 0
-        
         values = np.array(self.portfolio_values)
-        peak = np.maximum.accumulate(values)
-        drawdown = (values - peak) / peak
-        max_drawdown = np.min(drawdown) if len(drawdown) > 0 else 0
-        
-        trades_df = pd.DataFrame(self.trades)
-        avg_holding_days = trades_df['holding_days'].mean() if not trades_df.empty else 0
-        
-        return {
-            'initial_capital': self.initial_capital,
-            'final_value': final_value,
-            'total_return': total_return,
-            'annualized_return': annualized_return,
-            'volatility': volatility,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': max_drawdown,
-            'total_trades': len(self.trades),
-            'win_rate': win_rate,
-            'win_trades': len(win_trades),
-            'lose_trades': len(lose_trades),
-            'avg_win': np.mean([t['return_pct'] for t in win_trades]) if win_trades else 0,
-            'avg_loss': np.mean([t['return_pct'] for t in lose_trades]) if lose_trades else 0,
-            'avg_holding_days': avg_holding_days,
-        }
+        trade_returns = np.array([t['return_pct'] for t in self.trades])
+        holding_days = np.array([t['holding_days'] for t in self.trades])
+        # 波动率和夏普比率只用第二天起的收益率
+        return summarize(values, simple_returns(values)[1:], trade_returns, holding_days, self.initial_capital)
 
 def main():
     print("=" * 80)
@@ -0,0 +1,196 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+RISK_FREE_RATE = 0.03
+TRADING_DAYS_PER_YEAR = 252
+
+# 卖出原因的类别取第一个空格或冒号之前的部分，如 '止损 -5.23%'、'时间止损: 持仓7天' -> '止损'、'时间止损'
+_REASON_KIND = re.compile(r'[\s:：]')
+
+def simple_returns(values: np.ndarray) -> np.ndarray:
+    """逐日收益率，第一天为0"""
+    values = np.asarray(values, dtype=np.float64)
+    returns = np.zeros(len(values))
+    returns[1:] = (values[1:] - values[:-1]) / values[:-1]
+    return returns
+
+def summarize(values: np.ndarray, daily_returns: np.ndarray, trade_returns: np.ndarray, holding_days: np.ndarray,
+              initial_capital: float, risk_free_rate: float = RISK_FREE_RATE,
+              periods_per_year: int = TRADING_DAYS_PER_YEAR) -> Dict:
+    """汇总指标：values为逐日净值，daily_returns为用于波动率和夏普比率的收益率序列，
+    trade_returns和holding_days为逐笔交易的收益率和持有天数"""
+    values = np.asarray(values, dtype=np.float64)
+    daily_returns = np.asarray(daily_returns, dtype=np.float64)
+    trade_returns = np.asarray(trade_returns, dtype=np.float64)
+    
+    final_value = values[-1] if len(values) > 0 else initial_capital
+    total_return = (final_value - initial_capital) / initial_capital
+    
+    years = len(values) / periods_per_year
+    annualized_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else 0
+    
+    if len(daily_returns) > 1:
+        volatility = np.std(daily_returns) * np.sqrt(periods_per_year)
+        excess_returns = daily_returns - risk_free_rate / periods_per_year
+        sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(periods_per_year) if np.std(excess_returns) > 0 else 0
+    else:
+        volatility = 0
+        sharpe_ratio = 0
+    
+    win_returns = trade_returns[trade_returns > 0]
+    lose_returns = trade_returns[trade_returns <= 0]
+    win_rate = len(win_returns) / len(trade_returns) if len(trade_returns) > 0 else 0
+    avg_win = np.mean(win_returns) if len(win_returns) > 0 else 0
+    avg_loss = np.mean(lose_returns) if len(lose_returns) > 0 else 0
+    profit_factor = abs(avg_win / avg_loss) * (len(win_returns) / len(lose_returns)) if len(lose_returns) > 0 and avg_loss != 0 else 0
+    
+    max_drawdown = np.min(drawdown_series(values)[0]) if len(values) > 0 else 0
+    avg_holding_days = np.mean(holding_days) if len(holding_days) > 0 else 0
+    
+    return {
+        'initial_capital': initial_capital,
+        'final_value': final_value,
+        'total_return': total_return,
+        'annualized_return': annualized_return,
+        'volatility': volatility,
+        'sharpe_ratio': sharpe_ratio,
+        'max_drawdown': max_drawdown,
+        'total_trades': len(trade_returns),
+        'win_rate': win_rate,
+        'win_trades': len(win_returns),
+        'lose_trades': len(lose_returns),
+        'avg_win': avg_win,
+        'avg_loss': avg_loss,
+        'profit_factor': profit_factor,
+        'avg_holding_days': avg_holding_days,
+    }
+
+def rolling_volatility_sharpe(daily_returns: np.ndarray, window: int, risk_free_rate: float = RISK_FREE_RATE,
+                              periods_per_year: int = TRADING_DAYS_PER_YEAR):
+    """滚动窗口的年化波动率和夏普比率，用累计和一次算出全部窗口；不满一个窗口的位置为NaN"""
+    returns = np.asarray(daily_returns, dtype=np.float64)
+    volatility = np.full(len(returns), np.nan)
+    sharpe = np.full(len(returns), np.nan)
+    if window < 2 or len(returns) < window:
+        return volatility, sharpe
+    
+    sums = np.concatenate([[0.0], np.cumsum(returns)])
+    squares = np.concatenate([[0.0], np.cumsum(returns * returns)])
+    mean = (sums[window:] - sums[:-window]) / window
+    variance = np.maximum((squares[window:] - squares[:-window]) / window - mean * mean, 0)
+    std = np.sqrt(variance)
+    
+    volatility[window - 1:] = std * np.sqrt(periods_per_year)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe[window - 1:] = np.where(std > 1e-12, (mean - risk_free_rate / periods_per_year) / std, 0) * np.sqrt(periods_per_year)
+    return volatility, sharpe
+
+def drawdown_series(values: np.ndarray):
+    """逐日回撤深度（相对此前最高净值）和回撤持续的交易日数（创新高当天为0）"""
+    values = np.asarray(values, dtype=np.float64)
+    peak = np.maximum.accumulate(values)
+    depth = (values - peak) / peak
+    positions = np.arange(len(values))
+    last_peak = np.maximum.accumulate(np.where(values >= peak, positions, 0))
+    return depth, positions - last_peak
+
+def period_returns(dates: np.ndarray, values: np.ndarray, initial_capital: float, unit: str = 'M') -> pd.Series:
+    """按月（'M'）或按年（'Y'）的收益率，以每期最后一个交易日的净值计算，第一期相对初始资金"""
+    values = np.asarray(values, dtype=np.float64)
+    periods = np.asarray(dates, dtype='datetime64[ns]').astype(f'datetime64[{unit}]')
+    if len(periods) == 0:
+        return pd.Series(dtype=np.float64)
+    
+    ends = np.flatnonzero(np.append(periods[1:] != periods[:-1], True))
+    closes = values[ends]
+    opens = np.concatenate([[initial_capital], closes[:-1]])
+    index = pd.PeriodIndex(periods[ends], freq=unit)
+    return pd.Series(closes / opens - 1, index=index)
+
+def monthly_table(monthly: pd.Series) -> pd.DataFrame:
+    """月度收益率排成 年 × 月 的表"""
+    table = pd.DataFrame({'year': monthly.index.year, 'month': monthly.index.month, 'return': monthly.to_numpy()})
+    return table.pivot(index='year', columns='month', values='return')
+
+def attribution(group_ids: np.ndarray, labels: List[str], profit: np.ndarray, trade_returns: np.ndarray,
+                holding_days: np.ndarray) -> pd.DataFrame:
+    """按编号分组统计交易次数、胜率、平均收益率、总盈亏和平均持有天数，按总盈亏从高到低排列"""
+    group_ids = np.asarray(group_ids, dtype=np.int64)
+    size = len(labels)
+    counts = np.bincount(group_ids, minlength=size)
+    wins = np.bincount(group_ids, weights=trade_returns > 0, minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df = pd.DataFrame({
+            'trades': counts,
+            'win_rate': wins / counts,
+            'avg_return': np.bincount(group_ids, weights=trade_returns, minlength=size) / counts,
+            'total_profit': np.bincount(group_ids, weights=profit, minlength=size),
+            'avg_holding_days': np.bincount(group_ids, weights=holding_days, minlength=size) / counts,
+        }, index=pd.Index(labels, dtype=object))
+    return df[counts > 0].sort_values('total_profit', ascending=False)
+
+def reason_kinds(labels: List[str]):
+    """把逐笔的卖出原因归为类别，返回(每个原因对应的类别编号, 类别名)"""
+    kinds = {}
+    kind_ids = np.array([kinds.setdefault(_REASON_KIND.split(label, 1)[0], len(kinds)) for label in labels], dtype=np.int64)
+    return kind_ids, list(kinds)
+
+def return_distribution(trade_returns: np.ndarray, bins: int = 50) -> Dict:
+    """逐笔收益率的分布：直方图、分位数、偏度和峰度"""
+    returns = np.asarray(trade_returns, dtype=np.float64)
+    if len(returns) == 0:
+        return {}
+    
+    counts, edges = np.histogram(returns, bins=bins)
+    quantiles = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+    deviations = returns - returns.mean()
+    std = deviations.std()
+    return {
+        'histogram': pd.DataFrame({'left': edges[:-1], 'right': edges[1:], 'count': counts}),
+        'quantiles': pd.Series(np.quantile(returns, quantiles), index=quantiles),
+        'mean': returns.mean(),
+        'std': std,
+        'skew': np.mean(deviations ** 3) / std ** 3 if std > 0 else 0,
+        'kurtosis': np.mean(deviations ** 4) / std ** 4 - 3 if std > 0 else 0,
+    }
+
+def analyze(equity_curve, trades, initial_capital: float, window: int = 63, bins: int = 50,
+            risk_free_rate: float = RISK_FREE_RATE, periods_per_year: int = TRADING_DAYS_PER_YEAR) -> Dict:
+    """对EquityCurve和TradeLedger做完整分析：汇总指标、逐日滚动/回撤序列、月度和年度收益、
+    按卖出原因和按股票的盈亏归因、逐笔收益分布"""
+    values = equity_curve.values
+    dates = equity_curve.dates
+    daily_returns = simple_returns(values)
+    trade_returns = trades.return_pct
+    holding_days = trades.holding_days
+    profit = trades.column('profit')
+    
+    volatility, sharpe = rolling_volatility_sharpe(daily_returns, window, risk_free_rate, periods_per_year)
+    depth, duration = drawdown_series(values)
+    daily = pd.DataFrame({
+        'portfolio_value': values,
+        'return': daily_returns,
+        'rolling_volatility': volatility,
+        'rolling_sharpe': sharpe,
+        'drawdown': depth,
+        'drawdown_days': duration,
+    }, index=pd.DatetimeIndex(dates, name='date'))
+    
+    summary = summarize(values, daily_returns, trade_returns, holding_days, initial_capital, risk_free_rate, periods_per_year)
+    summary['max_drawdown_days'] = int(duration.max()) if len(duration) > 0 else 0
+    
+    monthly = period_returns(dates, values, initial_capital, 'M')
+    kind_ids, kinds = reason_kinds(trades.reasons.labels)
+    reason_ids = kind_ids[trades.column('reason')] if len(trades) > 0 else np.zeros(0, dtype=np.int64)
+    
+    return {
+        'summary': summary,
+        'daily': daily,
+        'monthly_returns': monthly_table(monthly),
+        'yearly_returns': period_returns(dates, values, initial_capital, 'Y'),
+        'by_reason': attribution(reason_ids, kinds, profit, trade_returns, holding_days),
+        'by_stock': attribution(trades.column('code'), trades.codes.labels, profit, trade_returns, holding_days),
+        'return_distribution': return_distribution(trade_returns, bins),
+    }
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+
+NS_PER_DAY = 86400 * 10**9
+
+class PositionBook:
+    """持仓表：每个持仓占预分配数组中的一行（槽位），代码 -> 槽位按开仓顺序排列；
+    每天对全部持仓的止损、移动止盈和持有期检查一次向量化完成"""
+    def __init__(self, capacity: int = 8):
+        self.capacity = max(1, capacity)
+        self.column = np.full(self.capacity, -1, dtype=np.int64)
+        self.entry_price = np.zeros(self.capacity)
+        self.entry_time = np.zeros(self.capacity, dtype=np.int64)
+        self.quantity = np.zeros(self.capacity, dtype=np.int64)
+        self.highest_price = np.zeros(self.capacity)
+        self.last_price = np.zeros(self.capacity)
+        self.take_profit_active = np.zeros(self.capacity, dtype=bool)
+        self.slots: Dict[str, int] = {}
+        self.free = list(range(self.capacity - 1, -1, -1))
+    
+    def __len__(self) -> int:
+        return len(self.slots)
+    
+    def __contains__(self, stock_code: str) -> bool:
+        return stock_code in self.slots
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.slots))
+    
+    def _grow(self):
+        extra = self.capacity
+        for name in ('column', 'entry_price', 'entry_time', 'quantity', 'highest_price', 'last_price', 'take_profit_active'):
+            array = getattr(self, name)
+            fill = -1 if name == 'column' else 0
+            setattr(self, name, np.concatenate([array, np.full(extra, fill, dtype=array.dtype)]))
+        self.free = list(range(self.capacity + extra - 1, self.capacity - 1, -1))
+        self.capacity += extra
+    
+    def open(self, stock_code: str, column: Optional[int], entry_price: float, date: pd.Timestamp, quantity: int, last_price: float):
+        """column为价格矩阵中的列号，不在矩阵中时为None"""
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        self.column[slot] = -1 if column is None else column
+        self.entry_price[slot] = entry_price
+        self.entry_time[slot] = pd.Timestamp(date).value
+        self.quantity[slot] = quantity
+        self.highest_price[slot] = entry_price
+        self.last_price[slot] = last_price
+        self.take_profit_active[slot] = False
+        self.slots[stock_code] = slot
+    
+    def close(self, stock_code: str) -> Tuple[float, pd.Timestamp, int]:
+        """移除持仓，返回(买入价, 买入日期, 数量)"""
+        slot = self.slots.pop(stock_code)
+        self.free.append(slot)
+        return self.entry_price[slot], pd.Timestamp(self.entry_time[slot]), int(self.quantity[slot])
+    
+    def _active(self) -> np.ndarray:
+        return np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+    
+    def _prices(self, slots: np.ndarray, day_prices: Optional[np.ndarray]) -> np.ndarray:
+        if day_prices is None:
+            return np.full(len(slots), np.nan)
+        columns = self.column[slots]
+        return np.where(columns >= 0, day_prices[np.maximum(columns, 0)], np.nan)
+    
+    def check_exits(self, day_prices: Optional[np.ndarray], date: pd.Timestamp, stop_loss_pct: float,
+                    take_profit_trigger: float, take_profit_fallback: float, max_holding_days: int) -> List[tuple]:
+        """按当日价格更新最高价和最近有效价，返回按开仓顺序排列的[(代码, 价格, 原因)]；当日无价格的持仓不检查"""
+        if not self.slots:
+            return []
+        
+        codes = list(self.slots)
+        slots = self._active()
+        prices = self._prices(slots, day_prices)
+        valid = ~np.isnan(prices)
+        if not valid.any():
+            return []
+        
+        codes = [code for code, ok in zip(codes, valid) if ok]
+        slots, prices = slots[valid], prices[valid]
+        self.last_price[slots] = prices
+        highest = np.maximum(self.highest_price[slots], prices)
+        self.highest_price[slots] = highest
+        
+        entry = self.entry_price[slots]
+        pct_return = (prices - entry) / entry
+        holding_days = (pd.Timestamp(date).value - self.entry_time[slots]) // NS_PER_DAY
+        
+        # 与逐个判断时的优先级一致：止损优先，达到止盈触发线后只看回撤，都不满足才看持有期
+        stop = pct_return <= stop_loss_pct
+        triggered = ~stop & (pct_return >= take_profit_trigger)
+        self.take_profit_active[slots[triggered]] = True
+        fallback = triggered & ((highest - prices) / highest >= abs(take_profit_fallback))
+        expired = ~stop & ~triggered & (holding_days >= max_holding_days)
+        
+        exits = []
+        for i in np.flatnonzero(stop | fallback | expired):
+            if stop[i]:
+                reason = f'止损 {pct_return[i]:.2%}'
+            elif fallback[i]:
+                reason = f'止盈 {pct_return[i]:.2%}'
+            else:
+                reason = f'时间止损 {holding_days[i]}天'
+            exits.append((codes[i], prices[i], reason))
+        return exits
+    
+    def market_value(self, day_prices: Optional[np.ndarray] = None) -> np.ndarray:
+        """按开仓顺序排列的各持仓市值；不传day_prices时按最近一个有效价格，否则当日无价格的持仓计为0"""
+        slots = self._active()
+        if day_prices is None:
+            prices = self.last_price[slots]
+        else:
+            prices = self._prices(slots, day_prices)
+            prices = np.where(np.isnan(prices), 0.0, prices)
+        return prices * self.quantity[slots]
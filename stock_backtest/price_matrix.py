@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+class PriceMatrix:
+    """(交易日 × 股票)价格矩阵，回测开始时构建一次，之后按日期和股票O(1)取价，无数据处为NaN"""
+    def __init__(self, dates, codes: List[str], values: np.ndarray):
+        self.dates = pd.DatetimeIndex(dates)
+        self.codes = list(codes)
+        self.values = values
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        self.code_index = {code: j for j, code in enumerate(self.codes)}
+    
+    @classmethod
+    def from_frames(cls, data: Dict[str, pd.DataFrame], price_column: str = '收盘价', date_column: str = '日期') -> 'PriceMatrix':
+        codes = [code for code, df in data.items() if not df.empty]
+        if not codes:
+            return cls([], [], np.empty((0, 0)))
+        
+        stock_dates = [data[code][date_column].to_numpy() for code in codes]
+        dates = np.unique(np.concatenate(stock_dates))
+        
+        values = np.full((len(dates), len(codes)), np.nan)
+        for j, code in enumerate(codes):
+            rows = np.searchsorted(dates, stock_dates[j])
+            values[rows, j] = data[code][price_column].to_numpy(dtype=np.float64)
+        
+        return cls(dates, codes, values)
+    
+    @classmethod
+    def from_panel(cls, panel, field: str = 'close', years: Optional[List[int]] = None) -> 'PriceMatrix':
+        """指定years时只保留这些年份的交易日，回测不会走到加载区间之外"""
+        values = panel[field]
+        if years is None:
+            # 直接引用面板的内存映射，不复制数据
+            return cls(panel.dates, panel.codes, values)
+        
+        rows = np.flatnonzero(np.isin(panel.dates.year, years))
+        if len(rows) > 0 and rows[-1] - rows[0] + 1 == len(rows):
+            # 连续的年份切片仍是内存映射的视图
+            rows = slice(rows[0], rows[-1] + 1)
+        return cls(panel.dates[rows], panel.codes, values[rows])
+    
+    def date_row(self, date) -> Optional[int]:
+        return self.date_index.get(pd.Timestamp(date))
+    
+    def price_at(self, row: Optional[int], stock_code: str) -> float:
+        j = self.code_index.get(stock_code)
+        if row is None or j is None:
+            return np.nan
+        return self.values[row, j]
+    
+    def get(self, stock_code: str, date) -> float:
+        return self.price_at(self.date_row(date), stock_code)
@@ -0,0 +1,130 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+
+# 转换结果变化（列名、计算方式等）时加1，缓存中按旧版本转换的数据随之失效并重新导入
+RESAMPLER_VERSION = 1
+
+# 1970-01-01是星期四，加3后按7整除即按周一起始分周
+WEEK_OFFSET = 3
+
+def _bars_per_group(freq: str) -> int:
+    """日内周期换算为每根K线包含的60分钟线根数，如120min -> 2"""
+    match = re.fullmatch(r'(\d+)min', freq)
+    if match is None or int(match.group(1)) % 60 != 0:
+        raise ValueError(f"不支持的周期: {freq}，可选 daily、weekly 或 60 的整数倍分钟如 120min")
+    return int(match.group(1)) // 60
+
+def _segment_starts(*keys: np.ndarray) -> np.ndarray:
+    changed = np.zeros(len(keys[0]), dtype=bool)
+    changed[0] = True
+    for key in keys:
+        changed[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(changed)
+
+def _first_valid(valid: np.ndarray, starts: np.ndarray, size: int) -> np.ndarray:
+    # 与groupby的first一致，跳过缺失值；整段缺失时取段首
+    positions = np.where(valid, np.arange(size), size)
+    first = np.minimum.reduceat(positions, starts)
+    return np.where(first < size, first, starts)
+
+def _last_valid(valid: np.ndarray, starts: np.ndarray, ends: np.ndarray, size: int) -> np.ndarray:
+    positions = np.where(valid, np.arange(size), -1)
+    last = np.maximum.reduceat(positions, starts)
+    return np.where(last >= 0, last, ends - 1)
+
+def _resample(df: pd.DataFrame, freq: str, stock_ids: np.ndarray) -> tuple:
+    """返回(按股票、时间排序的K线, 每根K线所属的股票编号)"""
+    times = pd.to_datetime(df['时间'])
+    keep = times.notna().to_numpy()
+    if not keep.all():
+        df, times, stock_ids = df[keep], times[keep], stock_ids[keep]
+    if len(df) == 0:
+        return pd.DataFrame(), np.empty(0, dtype=np.int64)
+    
+    stamps = times.to_numpy()
+    order = np.lexsort((stamps, stock_ids))
+    df = df.iloc[order].reset_index(drop=True)
+    stamps = stamps[order]
+    stock_ids = stock_ids[order]
+    days = stamps.astype('datetime64[D]').astype(np.int64)
+    size = len(df)
+    
+    if freq == 'daily':
+        starts = _segment_starts(stock_ids, days)
+    elif freq == 'weekly':
+        starts = _segment_starts(stock_ids, (days + WEEK_OFFSET) // 7)
+    else:
+        # 日内按当天第几根60分钟线分组，如120min把上午、下午各两根合并为一根
+        day_starts = _segment_starts(stock_ids, days)
+        day_lengths = np.diff(np.append(day_starts, size))
+        position = np.arange(size) - np.repeat(day_starts, day_lengths)
+        starts = _segment_starts(stock_ids, days, position // _bars_per_group(freq))
+    
+    ends = np.append(starts[1:], size)
+    bars = pd.DataFrame()
+    last_bar = ends - 1
+    if freq not in ('daily', 'weekly'):
+        bars['时间'] = stamps[last_bar]
+    bars['日期'] = stamps[last_bar].astype('datetime64[D]').astype('datetime64[s]')
+    
+    for column in ('代码', '名称', '开盘价'):
+        first = _first_valid(df[column].notna().to_numpy(), starts, size)
+        bars[column] = df[column].take(first).reset_index(drop=True)
+    
+    close = df['收盘价']
+    last = _last_valid(close.notna().to_numpy(), starts, ends, size)
+    bars['收盘价'] = close.take(last).reset_index(drop=True)
+    
+    bars['最高价'] = np.fmax.reduceat(df['最高价'].to_numpy(), starts)
+    bars['最低价'] = np.fmin.reduceat(df['最低价'].to_numpy(), starts)
+    for column in ('成交量', '成交额'):
+        values = df[column].to_numpy()
+        if values.dtype.kind == 'f':
+            values = np.where(np.isnan(values), 0, values)
+        bars[column] = np.add.reduceat(values, starts)
+    
+    # 涨跌幅、振幅以同一只股票的上一根K线收盘价为基准，每只股票的第一根没有基准
+    bar_stock = stock_ids[starts]
+    close_values = bars['收盘价'].to_numpy(dtype=np.float64)
+    prev_close = np.empty(len(bars))
+    prev_close[0] = np.nan
+    prev_close[1:] = close_values[:-1]
+    prev_close[_segment_starts(bar_stock)] = np.nan
+    
+    bars['涨跌幅'] = (close_values / prev_close - 1) * 100
+    amplitude = (bars['最高价'].to_numpy(dtype=np.float64) - bars['最低价'].to_numpy(dtype=np.float64)) / prev_close * 100
+    bars['振幅'] = np.where(np.isnan(amplitude), 0, amplitude)
+    
+    return bars, bar_stock
+
+def resample_bars(df: pd.DataFrame, freq: str = 'daily', keys: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """把多只股票拼接在一起的60分钟线一次性转换为daily、weekly或120min等K线；keys为每行所属股票，默认取代码列"""
+    if df.empty:
+        return pd.DataFrame()
+    
+    stock_ids, _ = pd.factorize(df['代码'] if keys is None else pd.Series(np.asarray(keys)), sort=True)
+    bars, _ = _resample(df, freq, stock_ids.astype(np.int64))
+    return bars
+
+def resample_stocks(frames: Dict[str, pd.DataFrame], freq: str = 'daily') -> Dict[str, pd.DataFrame]:
+    """按股票分别给出的60分钟线合并后一次转换，再按股票拆分"""
+    codes = [code for code, df in frames.items() if not df.empty]
+    if not codes:
+        return {}
+    
+    df = pd.concat([frames[code] for code in codes], ignore_index=True)
+    stock_ids = np.repeat(np.arange(len(codes), dtype=np.int64), [len(frames[code]) for code in codes])
+    bars, bar_stock = _resample(df, freq, stock_ids)
+    
+    result = {}
+    starts = _segment_starts(bar_stock) if len(bars) else np.empty(0, dtype=np.int64)
+    ends = np.append(starts[1:], len(bars))
+    for start, end in zip(starts, ends):
+        result[codes[bar_stock[start]]] = bars.iloc[start:end].reset_index(drop=True)
+    return result
+
+def convert_to_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """单只股票的60分钟线转换为日线"""
+    return resample_bars(df, 'daily', np.zeros(len(df), dtype=np.int64))
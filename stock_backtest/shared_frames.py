@@ -0,0 +1,58 @@
+import os
+import pickle
+import weakref
+import numpy as np
+import pandas as pd
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict
+
+# Windows上命名共享内存在最后一个句柄关闭时即释放，工作进程写完关闭后主进程来不及打开，只在POSIX系统上使用
+SHARED_MEMORY = os.name != 'nt'
+
+# 每个缓冲区在块中的起始位置按8字节对齐
+ALIGNMENT = 8
+
+def ensure_tracker():
+    """创建进程池之前在主进程启动资源跟踪进程，工作进程与主进程共用它，主进程删除块后不会被误报为泄漏"""
+    if SHARED_MEMORY:
+        resource_tracker.ensure_running()
+
+def pack_frames(frames: Dict[str, pd.DataFrame], shared: bool = SHARED_MEMORY) -> Dict:
+    """工作进程：以带外缓冲区pickle一组DataFrame，数值数据连续写入一块共享内存，只返回pickle主体和各缓冲区的位置；
+    shared为False时原样返回，由进程池正常序列化"""
+    if not shared:
+        return {'name': None, 'frames': frames}
+    
+    buffers = []
+    body = pickle.dumps(frames, protocol=5, buffer_callback=buffers.append)
+    
+    layout = []
+    size = 0
+    for buffer in buffers:
+        nbytes = buffer.raw().nbytes
+        layout.append((size, nbytes))
+        size += -(-nbytes // ALIGNMENT) * ALIGNMENT
+    
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    block = np.ndarray((size,), dtype=np.uint8, buffer=shm.buf)
+    for (offset, nbytes), buffer in zip(layout, buffers):
+        block[offset:offset + nbytes] = np.frombuffer(buffer.raw(), dtype=np.uint8)
+    
+    # 只关闭本进程的映射，块由主进程打开后删除
+    del block
+    shm.close()
+    return {'name': shm.name, 'size': size, 'body': body, 'buffers': layout}
+
+def unpack_frames(packed: Dict) -> Dict[str, pd.DataFrame]:
+    """主进程：打开共享内存块，DataFrame的数值数据直接引用其中的缓冲区，不复制；
+    块的名称随即删除，映射在最后一个引用它的DataFrame释放后关闭"""
+    if packed['name'] is None:
+        return packed['frames']
+    
+    shm = shared_memory.SharedMemory(name=packed['name'])
+    shm.unlink()
+    block = np.ndarray((packed['size'],), dtype=np.uint8, buffer=shm.buf)
+    weakref.finalize(block, shm.close)
+    
+    buffers = [block[offset:offset + nbytes] for offset, nbytes in packed['buffers']]
+    return pickle.loads(packed['body'], buffers=buffers)
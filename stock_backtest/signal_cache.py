@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence
+from cache_codec import Codec, loads
+from data_panel import ARRAY_COLUMNS, PanelData
+
+def _canonical(value):
+    # numpy标量转为Python数值，使相等的参数得到相同的键
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def _column_bytes(values) -> bytes:
+    """列的原始数据：数值统一为float64、日期统一为纳秒整数，DataFrame和面板列视图得到相同的字节"""
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return np.ascontiguousarray(values.astype('datetime64[ns]').view(np.int64)).tobytes()
+    if values.dtype.kind in 'OUS':
+        return '\x1f'.join(map(str, values)).encode('utf-8')
+    return np.ascontiguousarray(values, dtype=np.float64).tobytes()
+
+class SignalCache:
+    """选股信号的持久缓存：以策略类、参数、年份、股票池和数据指纹为键，只改交易引擎参数时直接复用"""
+    def __init__(self, cache_dir: str = 'signal_cache', codec: str = 'lz4'):
+        self.cache_dir = cache_dir
+        self.codec = Codec.parse(codec)
+    
+    @staticmethod
+    def data_fingerprint(data: Dict[str, pd.DataFrame], columns: Optional[Sequence[str]] = None) -> str:
+        """对每只股票columns中各列的全部数据做哈希，columns为None时使用全部列；面板数据直接读取列视图"""
+        use_arrays = isinstance(data, PanelData) and columns is not None and set(columns) <= set(ARRAY_COLUMNS)
+        digest = hashlib.sha1()
+        for stock_code in sorted(data):
+            df = data.arrays(stock_code) if use_arrays else data[stock_code]
+            if len(df) == 0:
+                continue
+            digest.update(f"{stock_code}:{len(df)}\n".encode('utf-8'))
+            for column in (columns if columns is not None else df.columns):
+                digest.update(f"{column}:".encode('utf-8'))
+                digest.update(_column_bytes(df[column]))
+        return digest.hexdigest()
+    
+    def get_key(self, strategy, years: List[int], data: Dict[str, pd.DataFrame]) -> str:
+        strategy_class = type(strategy)
+        payload = json.dumps({
+            'strategy': f"{strategy_class.__module__}.{strategy_class.__qualname__}",
+            'version': getattr(strategy, 'cache_version', 0),
+            'params': strategy.params,
+            'years': sorted(years),
+            'stocks': sorted(data),
+            'data': self.data_fingerprint(data, getattr(strategy, 'signal_columns', None)),
+        }, sort_keys=True, default=_canonical, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
+    def get_cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.sig")
+    
+    def load(self, key: str) -> Optional[pd.DataFrame]:
+        cache_path = self.get_cache_path(key)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, 'rb') as f:
+                return loads(f.read())
+        except Exception:
+            return None
+    
+    def save(self, key: str, signals: pd.DataFrame):
+        # 先写临时文件再替换，多个进程同时写同一个键时不会读到写了一半的文件
+        # 第一次保存时才创建缓存目录
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self.get_cache_path(key)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self.codec.dumps(signals))
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def clear_cache(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for file in os.listdir(self.cache_dir):
+            file_path = os.path.join(self.cache_dir, file)
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+        print(f"信号缓存已清空: {self.cache_dir}")
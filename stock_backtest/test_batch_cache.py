@@ -0,0 +1,99 @@
+from data_cache_optimized import OptimizedDataCache
+from data_cache_batch import BatchDataCache
+import pandas as pd
+import tempfile
+import pickle
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+
+def test_batch_cache():
+    print("测试批量缓存...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    template = source.load_from_cache(sorted(os.listdir(CACHE_DIR))[0].split('_')[0], YEARS)
+    # 同一批次内的100只股票
+    data = {f"{600000 + i:06d}": template.assign(收盘价=template['收盘价'] + i) for i in range(100)}
+    payload = sum(len(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)) for df in data.values())
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = BatchDataCache(tmp_dir)
+        
+        start_time = time.time()
+        for stock_code, df in data.items():
+            cache.save_to_cache(stock_code, YEARS, df)
+        print(f"逐只写入 {len(data)} 只股票耗时: {time.time() - start_time:.2f} 秒")
+        
+        # 每只股票的数据只写一次，文件中多出的只有每次追加留下的索引（每个都不超过最终的索引）
+        batch_path = cache.get_batch_path(6000, YEARS)
+        assert os.listdir(tmp_dir) == [os.path.basename(batch_path)]
+        index_size = len(pickle.dumps(cache._batches.read_index(batch_path), protocol=pickle.HIGHEST_PROTOCOL)) + 16
+        assert os.path.getsize(batch_path) - payload < len(data) * index_size
+        
+        start_time = time.time()
+        for stock_code, df in data.items():
+            assert cache.is_cached(stock_code, YEARS)
+            pd.testing.assert_frame_equal(cache.load_from_cache(stock_code, YEARS), df, check_exact=True)
+        print(f"读取耗时: {time.time() - start_time:.2f} 秒")
+        
+        assert not cache.is_cached('600100', YEARS)
+        assert not cache.is_cached('600000', [2018])
+        assert cache.load_from_cache('600100', YEARS).empty
+        
+        # 覆盖已有股票
+        cache.save_to_cache('600001', YEARS, data['600000'])
+        pd.testing.assert_frame_equal(BatchDataCache(tmp_dir).load_from_cache('600001', YEARS), data['600000'], check_exact=True)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = BatchDataCache(tmp_dir)
+        start_time = time.time()
+        cache.save_many(data, YEARS)
+        print(f"save_many写入耗时: {time.time() - start_time:.2f} 秒")
+        for stock_code, df in data.items():
+            pd.testing.assert_frame_equal(cache.load_from_cache(stock_code, YEARS), df, check_exact=True)
+        
+        # 旧版整批pickle的文件仍可读取
+        with open(cache.get_legacy_batch_path(0, YEARS), 'wb') as f:
+            pickle.dump({'000001': template}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        assert cache.is_cached('000001', YEARS)
+        pd.testing.assert_frame_equal(cache.load_from_cache('000001', YEARS), template, check_exact=True)
+    
+    print("批量缓存测试通过")
+
+def test_torn_batch():
+    print("测试批量文件追加中断后仍可读写，写入失败时报错...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    template = source.load_from_cache(sorted(os.listdir(CACHE_DIR))[0].split('_')[0], YEARS)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = BatchDataCache(tmp_dir)
+        cache.save_to_cache('600000', YEARS, template)
+        cache.save_to_cache('600001', YEARS, template)
+        batch_path = cache.get_batch_path(6000, YEARS)
+        with open(batch_path, 'r+b') as f:
+            f.truncate(os.path.getsize(batch_path) - 5)
+        
+        # 只丢失写到一半的那次追加，之后的写入正常
+        reopened = BatchDataCache(tmp_dir)
+        assert reopened.is_cached('600000', YEARS) and not reopened.is_cached('600001', YEARS)
+        reopened.save_many({'600001': template, '600002': template}, YEARS)
+        for stock_code in ('600000', '600001', '600002'):
+            pd.testing.assert_frame_equal(BatchDataCache(tmp_dir).load_from_cache(stock_code, YEARS), template, check_exact=True)
+        
+        # 无法写入批量文件时抛出异常，而不是静默丢弃
+        os.makedirs(cache.get_batch_path(6001, YEARS))
+        try:
+            cache.save_to_cache('600100', YEARS, template)
+        except OSError:
+            pass
+        else:
+            raise AssertionError("写入失败未报错")
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_batch_cache()
+    test_torn_batch()
@@ -0,0 +1,97 @@
+from cache_codec import Codec, available_codecs, decompress, loads
+from data_cache import DataCache
+from data_cache_optimized import OptimizedDataCache
+from data_cache_batch import BatchDataCache
+from data_optimizer import DataOptimizer
+from data_db_cache import DatabaseCache
+import numpy as np
+import pandas as pd
+import tempfile
+import pickle
+import time
+import os
+import lz4.frame
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+
+def test_cache_codec():
+    print("测试缓存压缩编码...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    stock_codes = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR) if f.endswith('.lz4'))[:10]
+    data = {code: source.load_from_cache(code, YEARS) for code in stock_codes}
+    for df in data.values():
+        # 与test_columnar_cache相同，名称、代码和列名按当前环境的字符串类型重建
+        df['名称'] = df['名称'].astype(str)
+        df['代码'] = df['代码'].astype(str)
+        df.columns = pd.Index(list(df.columns))
+    df = data[stock_codes[0]]
+    
+    # 旧格式：未压缩的pickle和lz4.frame压缩的pickle
+    raw = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    pd.testing.assert_frame_equal(loads(raw), df, check_exact=True)
+    pd.testing.assert_frame_equal(loads(lz4.frame.compress(raw)), df, check_exact=True)
+    
+    # 各文件缓存默认仍写旧格式
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pkl_cache = DataCache(os.path.join(tmp_dir, 'pkl'))
+        pkl_cache.save_to_cache(stock_codes[0], YEARS, df)
+        with open(pkl_cache.get_cache_path(pkl_cache.get_cache_key(stock_codes[0], YEARS)), 'rb') as f:
+            assert f.read() == raw
+        
+        optimizer = DataOptimizer(os.path.join(tmp_dir, 'optimizer'))
+        optimizer.save_to_cache(stock_codes[0], YEARS, df)
+        with open(optimizer.get_cache_path(stock_codes[0], YEARS), 'rb') as f:
+            assert lz4.frame.decompress(f.read()) == raw
+        
+        assert BatchDataCache(os.path.join(tmp_dir, 'batch')).codec.spec == 'pickle'
+        assert OptimizedDataCache(os.path.join(tmp_dir, 'shard')).codec.spec == 'lz4frame:0'
+    
+    values = np.arange(1000, dtype=np.int64).tobytes()
+    assert decompress(values) == values
+    
+    for spec in available_codecs():
+        codec = Codec.parse(spec)
+        assert Codec.parse(codec.spec).spec == codec.spec
+        
+        start_time = time.time()
+        blob = codec.dumps(df)
+        pd.testing.assert_frame_equal(loads(blob), df, check_exact=True)
+        assert decompress(codec.compress(values, 8)) == values
+        print(f"{codec.spec}: {len(raw) / len(blob):.2f} 倍, 耗时 {time.time() - start_time:.3f} 秒")
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            caches = [
+                DataCache(os.path.join(tmp_dir, 'pkl'), codec),
+                OptimizedDataCache(os.path.join(tmp_dir, 'shard'), codec=codec),
+                BatchDataCache(os.path.join(tmp_dir, 'batch'), codec),
+                DataOptimizer(os.path.join(tmp_dir, 'optimizer'), codec=codec),
+            ]
+            for cache in caches:
+                for stock_code, stock_df in data.items():
+                    cache.save_to_cache(stock_code, YEARS, stock_df)
+                if isinstance(cache, DataOptimizer):
+                    cache.clear_memory_cache()
+                for stock_code, stock_df in data.items():
+                    pd.testing.assert_frame_equal(cache.load_from_cache(stock_code, YEARS), stock_df, check_exact=True)
+            
+            db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'), codec)
+            db_cache.batch_save(data, YEARS)
+            for stock_code, stock_df in data.items():
+                pd.testing.assert_frame_equal(db_cache.load_from_cache(stock_code, YEARS), stock_df, check_exact=True)
+            
+            # 换用另一种编码打开，已有分区按各自的编码读取，新分区按新编码写入
+            reopened = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'), 'none' if db_cache.encoded else 'lz4')
+            reopened.save_to_cache('999999', YEARS, df)
+            for stock_code, stock_df in list(data.items()) + [('999999', df)]:
+                expected = stock_df.assign(代码=stock_code) if stock_code == '999999' else stock_df
+                pd.testing.assert_frame_equal(reopened.load_from_cache(stock_code, YEARS), expected, check_exact=True)
+            assert len(reopened.get_watermarks()) == len(data) + 1
+            db_cache.close()
+            reopened.close()
+    
+    print("缓存压缩编码测试通过")
+
+if __name__ == "__main__":
+    test_cache_codec()
@@ -0,0 +1,141 @@
+from data_db_cache import DatabaseCache
+from cache_codec import Codec
+from data_cache_optimized import OptimizedDataCache
+import pandas as pd
+import numpy as np
+import tempfile
+import sqlite3
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+
+def recompute_subset(df: pd.DataFrame, years: list) -> pd.DataFrame:
+    subset = df[df['日期'].dt.year.isin(years)].reset_index(drop=True)
+    subset['涨跌幅'] = subset['收盘价'].pct_change() * 100
+    subset['振幅'] = ((subset['最高价'] - subset['最低价']) / subset['收盘价'].shift(1) * 100).fillna(0)
+    return subset
+
+def test_columnar_cache_roundtrip():
+    print("测试列式数据库缓存...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    stock_codes = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR))
+    data = {code: source.load_from_cache(code, YEARS) for code in stock_codes}
+    for df in data.values():
+        # 部分CSV的名称列被解析成了数字，名称维表统一按字符串保存
+        df['名称'] = df['名称'].astype(str)
+        # 缓存文件保留了写入时的字符串存储类型，按当前环境的默认类型重建
+        df['代码'] = df['代码'].astype(str)
+        df.columns = pd.Index(list(df.columns))
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        
+        start_time = time.time()
+        db_cache.batch_save(data, YEARS)
+        print(f"写入 {len(data)} 只股票耗时: {time.time() - start_time:.2f} 秒")
+        
+        start_time = time.time()
+        for stock_code, df in data.items():
+            assert db_cache.is_cached(stock_code, YEARS)
+            pd.testing.assert_frame_equal(db_cache.load_from_cache(stock_code, YEARS), df, check_exact=True)
+        print(f"完整读取耗时: {time.time() - start_time:.2f} 秒")
+        
+        # 只读取部分年份分区，派生列按子区间重新计算
+        for stock_code, df in data.items():
+            assert db_cache.is_cached(stock_code, [2016, 2017])
+            expected = recompute_subset(df, [2016, 2017])
+            pd.testing.assert_frame_equal(db_cache.load_from_cache(stock_code, [2016, 2017]), expected, check_exact=True)
+        
+        # 只读取需要的列
+        stock_code = stock_codes[0]
+        partial = db_cache.load_from_cache(stock_code, [2016], columns=['收盘价', '涨跌幅'])
+        assert list(partial.columns) == ['日期', '收盘价', '涨跌幅']
+        pd.testing.assert_frame_equal(partial, recompute_subset(data[stock_code], [2016])[['日期', '收盘价', '涨跌幅']], check_exact=True)
+        
+        assert not db_cache.is_cached(stock_code, [2016, 2018])
+        assert db_cache.load_from_cache(stock_code, [2018]).empty
+        
+        stats = db_cache.get_cache_stats()
+        print(f"记录数: {stats['records']}, 分区数: {stats['partitions']}, 大小: {stats['size_mb']:.2f} MB")
+    
+    print("\n测试完成！")
+
+def test_corrupt_partition():
+    print("测试损坏的分区按未缓存处理，数据库错误照常抛出...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    stock_code = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR))[0]
+    df = source.load_from_cache(stock_code, YEARS)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'), 'lz4')
+        db_cache.save_to_cache(stock_code, YEARS, df)
+        assert db_cache.get_or_none(stock_code, YEARS) is not None
+        
+        # 截断一个分区的压缩数据，解压失败
+        blob = Codec('lz4').compress(df['收盘价'].to_numpy().tobytes())
+        conn = db_cache._connect()
+        conn.execute("UPDATE daily_bars SET close = ? WHERE year = 2016", (blob[:len(blob) // 2],))
+        conn.commit()
+        assert db_cache.get_or_none(stock_code, YEARS) is None
+        assert db_cache.load_from_cache(stock_code, YEARS).empty
+        assert db_cache.batch_load([stock_code], YEARS) == {}
+        
+        conn.execute("DROP TABLE daily_bars")
+        conn.commit()
+        try:
+            db_cache.get_or_none(stock_code, YEARS)
+            assert False
+        except sqlite3.OperationalError:
+            pass
+        db_cache.close()
+    
+    print("测试完成！")
+
+def test_lossless_fields():
+    print("测试默认类型不能无损保存的列...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    stock_code = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR))[0]
+    df = source.load_from_cache(stock_code, YEARS)
+    df['名称'] = df['名称'].astype(str)
+    df['代码'] = df['代码'].astype(str)
+    df.columns = pd.Index(list(df.columns))
+    
+    # 2016年：带小数的成交额、缺失的成交量、三位小数的价格
+    changed = df.copy()
+    in_2016 = np.flatnonzero(changed['日期'].dt.year == 2016)
+    changed['成交额'] = changed['成交额'].astype(np.float64)
+    changed.loc[in_2016[0], '成交额'] = 12345.67
+    changed['成交量'] = changed['成交量'].astype(np.float64)
+    changed.loc[in_2016[1], '成交量'] = np.nan
+    changed.loc[in_2016[2], '收盘价'] = 10.125
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for codec in ('none', 'lz4'):
+            db_cache = DatabaseCache(os.path.join(tmp_dir, f'{codec}.db'), codec)
+            db_cache.save_to_cache(stock_code, YEARS, changed)
+            loaded = db_cache.load_from_cache(stock_code, YEARS)
+            assert loaded.loc[in_2016[0], '成交额'] == 12345.67
+            assert np.isnan(loaded.loc[in_2016[1], '成交量'])
+            assert loaded.loc[in_2016[2], '收盘价'] == 10.125
+            pd.testing.assert_frame_equal(loaded, changed.assign(涨跌幅=loaded['涨跌幅'], 振幅=loaded['振幅']), check_exact=True)
+            
+            # 其余年份仍按默认类型保存，只读这些年份时类型不变
+            other = db_cache.load_from_cache(stock_code, [2015, 2017])
+            assert other['成交量'].dtype == np.int64 and other['成交额'].dtype == np.int64
+            
+            # 能无损保存的原始数据读回后完全一致
+            db_cache.save_to_cache(stock_code, YEARS, df)
+            pd.testing.assert_frame_equal(db_cache.load_from_cache(stock_code, YEARS), df, check_exact=True)
+            db_cache.close()
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_columnar_cache_roundtrip()
+    test_corrupt_partition()
+    test_lossless_fields()
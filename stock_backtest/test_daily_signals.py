@@ -0,0 +1,95 @@
+from daily_signals import DailySignals
+from a_stock_backtest_optimized import BacktestEngine
+import pandas as pd
+import numpy as np
+import time
+
+def make_signals(n: int, days: int = 700, stocks: int = 4000, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-05', periods=days)
+    return pd.DataFrame({
+        'stock_code': [f"sz{code:06d}" for code in rng.integers(0, stocks, n)],
+        'date': dates[rng.integers(0, days, n)],
+        'price': rng.uniform(5, 50, n).round(2),
+        'volume_ratio': rng.uniform(1, 5, n),
+    })
+
+def test_grouping():
+    print("测试信号按日期分组...")
+    
+    signals = make_signals(5000)
+    grouped = DailySignals.from_frame(signals)
+    
+    assert list(grouped.dates) == sorted(signals['date'].unique())
+    assert grouped.total == len(signals) and grouped.offsets[0] == 0
+    # 每组与按日期筛选的结果一致，且保持原来的先后顺序
+    for date, codes, prices, scores in grouped:
+        expected = signals[signals['date'] == date]
+        assert list(codes) == list(expected['stock_code'])
+        assert np.array_equal(prices, expected['price'].to_numpy())
+        assert np.array_equal(scores, expected['volume_ratio'].to_numpy())
+    
+    # 没有评分列时评分为NaN，空信号没有分组
+    grouped = DailySignals.from_frame(signals.drop(columns='volume_ratio'))
+    assert np.isnan(grouped.scores).all()
+    empty = DailySignals.from_frame(pd.DataFrame())
+    assert len(empty) == 0 and empty.total == 0 and list(empty) == []
+    
+    print("测试完成！")
+
+def test_grouping_speed():
+    print("测试分组与逐日筛选的耗时...")
+    
+    signals = make_signals(300000)
+    
+    start_time = time.time()
+    count = 0
+    for date in sorted(signals['date'].unique()):
+        count += len(signals[signals['date'] == date])
+    filter_time = time.time() - start_time
+    
+    start_time = time.time()
+    grouped = DailySignals.from_frame(signals)
+    total = sum(len(codes) for _, codes, _, _ in grouped)
+    group_time = time.time() - start_time
+    
+    print(f"{len(signals)} 个信号, {len(grouped)} 个信号日")
+    print(f"逐日筛选: {filter_time:.3f} 秒, 排序分组: {group_time:.3f} 秒")
+    assert count == total == len(signals)
+    
+    print("测试完成！")
+
+def test_engine_accepts_grouped():
+    print("测试交易引擎直接使用分组后的信号...")
+    
+    dates = pd.bdate_range('2016-01-04', periods=40)
+    rng = np.random.default_rng(1)
+    data = {
+        code: pd.DataFrame({'日期': dates, '收盘价': 10 * np.cumprod(1 + rng.normal(0, 0.03, len(dates)))})
+        for code in ['A', 'B', 'C']
+    }
+    signals = pd.DataFrame({
+        'stock_code': ['C', 'A', 'B', 'A'],
+        'date': [dates[10], dates[3], dates[3], dates[25]],
+        'price': [data['C']['收盘价'][10], data['A']['收盘价'][3], data['B']['收盘价'][3], data['A']['收盘价'][25]],
+    })
+    
+    for legacy_calendar in (False, True):
+        engines = []
+        for source in (signals, DailySignals.from_frame(signals)):
+            engine = BacktestEngine(
+                initial_capital=1000000, stop_loss_pct=-0.05, take_profit_trigger=0.10, take_profit_fallback=-0.03,
+                max_holding_days=10, max_positions=2, position_size=0.3, commission=0.0003, slippage=0.001,
+                legacy_calendar=legacy_calendar,
+            )
+            engine.run(data, source)
+            engines.append(engine)
+        pd.testing.assert_frame_equal(engines[0].trades.to_frame(), engines[1].trades.to_frame())
+        pd.testing.assert_frame_equal(engines[0].equity_curve.to_frame(), engines[1].equity_curve.to_frame())
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_grouping()
+    test_grouping_speed()
+    test_engine_accepts_grouped()
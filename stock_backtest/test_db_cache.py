@@ -21,8 +21,10 @@ def test_db_cache_performance():
     print()
     
     # 清理数据库
-    if os.path.exists('stock_data.db'):
-        os.remove('stock_data.db')
+    # WAL模式下还有-wal和-shm两个附属文件
+    for path in ['stock_data.db', 'stock_data.db-wal', 'stock_data.db-shm']:
+        if os.path.exists(path):
+            os.remove(path)
     print("数据库已清理")
     print()
     
@@ -0,0 +1,130 @@
+from a_stock_backtest_optimized import AStockBacktest, BacktestEngine
+from price_matrix import PriceMatrix
+from data_cache_optimized import OptimizedDataCache
+from data_panel import write_panel
+import pandas as pd
+import numpy as np
+import tempfile
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+PARAMS = {'limit_up_pct': 5.0, 'min_close_after_limit': 0.95, 'min_volume_ratio': 1.0, 'days_to_check': 10}
+
+def make_engine(legacy_calendar: bool) -> BacktestEngine:
+    return BacktestEngine(
+        initial_capital=1000000, stop_loss_pct=-0.05, take_profit_trigger=0.10, take_profit_fallback=-0.03,
+        max_holding_days=30, max_positions=5, position_size=0.15, commission=0.0003, slippage=0.001,
+        legacy_calendar=legacy_calendar,
+    )
+
+def test_stop_loss_between_signals():
+    print("测试信号之间的交易日也检查止损...")
+    
+    dates = pd.bdate_range('2016-01-04', periods=30)
+    close_a = np.full(30, 10.0)
+    close_a[5:] = 9.0
+    df_a = pd.DataFrame({'日期': dates, '收盘价': close_a})
+    # A在第6至8天停牌
+    df_a = df_a.drop(index=[6, 7, 8]).reset_index(drop=True)
+    df_b = pd.DataFrame({'日期': dates, '收盘价': np.full(30, 20.0)})
+    data = {'A': df_a, 'B': df_b}
+    signals = pd.DataFrame({
+        'stock_code': ['A', 'B'],
+        'date': [dates[2], dates[20]],
+        'price': [10.0, 20.0],
+    })
+    
+    engine = make_engine(False)
+    engine.run(data, signals)
+    trade = engine.trades[0]
+    assert trade['stock_code'] == 'A' and trade['exit_date'] == dates[5] and trade['reason'].startswith('止损')
+    assert [e['date'] for e in engine.equity_curve] == list(dates[2:])
+    
+    legacy = make_engine(True)
+    legacy.run(data, signals)
+    assert legacy.trades[0]['exit_date'] == dates[20]
+    assert [e['date'] for e in legacy.equity_curve] == [dates[2], dates[20]]
+    
+    # 停牌期间按最近一个有效收盘价估值
+    signals = signals.iloc[:1]
+    engine = make_engine(False)
+    engine.stop_loss_pct = -0.5
+    engine.run(data, signals)
+    values = [e['portfolio_value'] for e in engine.equity_curve]
+    assert values[4] == values[5] == values[6] == values[7]
+    
+    print("测试完成！")
+
+def test_event_engine_on_samples():
+    print("测试逐交易日回测...")
+    
+    cache = OptimizedDataCache(CACHE_DIR)
+    data = {}
+    for file in sorted(os.listdir(CACHE_DIR)):
+        stock_code = file.split('_')[0]
+        data[stock_code] = cache.load_from_cache(stock_code, YEARS)
+    
+    results = {}
+    for legacy_calendar in (True, False):
+        backtest = AStockBacktest(years=YEARS, signal_cache_dir=None, legacy_calendar=legacy_calendar)
+        backtest.strategy.params = dict(PARAMS)
+        backtest._load_data = lambda stock_pool, verbose, batch_size, on_stock=None: data
+        start_time = time.time()
+        results[legacy_calendar] = backtest.run(verbose=False)
+        print(f"{'仅信号日' if legacy_calendar else '全部交易日'}: 耗时 {time.time() - start_time:.2f} 秒, "
+              f"交易 {results[legacy_calendar]['total_trades']} 次, 净值点 {len(results[legacy_calendar]['equity_curve'])} 个")
+    
+    signals = backtest._generate_signals(data, False)
+    calendar = PriceMatrix.from_frames(data).dates
+    equity_dates = pd.DatetimeIndex([e['date'] for e in results[False]['equity_curve']])
+    assert equity_dates.equals(calendar[calendar >= signals['date'].min()])
+    legacy_dates = pd.DatetimeIndex([e['date'] for e in results[True]['equity_curve']])
+    assert legacy_dates.equals(pd.DatetimeIndex(sorted(signals['date'].unique())))
+    
+    # 止损在触发当天执行，不必等到下一个信号日，平均亏损更小
+    trades = results[False]['trades'].to_frame()
+    stops = trades[trades['reason'].str.startswith('止损')]
+    legacy_trades = results[True]['trades'].to_frame()
+    legacy_stops = legacy_trades[legacy_trades['reason'].str.startswith('止损')]
+    print(f"止损交易平均收益: 全部交易日 {stops['return_pct'].mean():.2%}, 仅信号日 {legacy_stops['return_pct'].mean():.2%}")
+    assert stops['return_pct'].mean() > legacy_stops['return_pct'].mean()
+    
+    print("测试完成！")
+
+def test_panel_subset_years():
+    print("测试面板覆盖更多年份时只回测指定年份...")
+    
+    cache = OptimizedDataCache(CACHE_DIR)
+    data = {}
+    for file in sorted(os.listdir(CACHE_DIR)):
+        stock_code = file.split('_')[0]
+        data[stock_code] = cache.load_from_cache(stock_code, YEARS)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        panel = write_panel(data, os.path.join(tmp_dir, 'panel'))
+        subset = panel.to_frames(years=[2015])
+        
+        results = {}
+        for use_panel in (True, False):
+            backtest = AStockBacktest(years=[2015], signal_cache_dir=None,
+                                      panel_dir=os.path.join(tmp_dir, 'panel') if use_panel else None)
+            backtest.strategy.params = dict(PARAMS)
+            if not use_panel:
+                backtest._load_data = lambda stock_pool, verbose, batch_size, on_stock=None: subset
+            results[use_panel] = backtest.run(verbose=False)
+        del panel
+    
+    # 净值曲线和卖出价格都不超出2015年，与直接传入2015年日线的结果一致
+    equity_dates = pd.DatetimeIndex(results[True]['equity_curve'].dates)
+    assert equity_dates.max() <= pd.Timestamp('2015-12-31')
+    pd.testing.assert_frame_equal(results[True]['trades'].to_frame(), results[False]['trades'].to_frame())
+    pd.testing.assert_frame_equal(results[True]['equity_curve'].to_frame(), results[False]['equity_curve'].to_frame())
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_stop_loss_between_signals()
+    test_event_engine_on_samples()
+    test_panel_subset_years()
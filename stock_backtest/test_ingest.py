@@ -0,0 +1,222 @@
+from a_stock_backtest_optimized import AStockBacktest
+from data_db_cache import DatabaseCache
+from data_ingest import ArchiveIngestor
+import data_ingest
+import pandas as pd
+import numpy as np
+import tempfile
+import io
+import zipfile
+import time
+import os
+
+YEARS = [2015, 2016, 2017]
+BAR_TIMES = ['10:30', '11:30', '14:00', '15:00']
+
+def make_archives(data_dir: str, years: list, num_stocks: int = 20, seed: int = 7, end: str = None) -> list:
+    """生成与真实数据格式相同的年度60分钟压缩包（GBK编码）；end为最后一根K线的时间，模拟尚未更新的数据"""
+    rng = np.random.default_rng(seed)
+    stock_codes = [f'sz{300000 + i:06d}' for i in range(num_stocks)]
+    
+    for year in years:
+        days = pd.bdate_range(f'{year}-01-01', f'{year}-12-31')
+        with zipfile.ZipFile(os.path.join(data_dir, f'{year}_60min.zip'), 'w', zipfile.ZIP_DEFLATED) as z:
+            for i, stock_code in enumerate(stock_codes):
+                # 部分股票晚一年上市
+                if i % 5 == 0 and year == years[0]:
+                    continue
+                n = len(days) * len(BAR_TIMES)
+                close = np.round(10 * np.cumprod(1 + rng.normal(0, 0.01, n)), 2)
+                df = pd.DataFrame({
+                    '时间': [f'{d:%Y-%m-%d} {t}' for d in days for t in BAR_TIMES],
+                    '代码': stock_code,
+                    '名称': f'测试股份{i}',
+                    '开盘价': np.round(close * (1 + rng.normal(0, 0.003, n)), 2),
+                    '收盘价': close,
+                    '最高价': np.round(close * 1.01, 2),
+                    '最低价': np.round(close * 0.99, 2),
+                    '成交量': rng.integers(1000, 100000, n),
+                    '成交额': rng.integers(10**6, 10**8, n),
+                })
+                if end is not None:
+                    df = df[df['时间'] <= end]
+                z.writestr(f'{stock_code}_{year}.csv', df.to_csv(index=False).encode('gbk'))
+    
+    return stock_codes
+
+def test_single_pass_ingest():
+    print("测试单遍压缩包导入...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stock_codes = make_archives(tmp_dir, YEARS)
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        ingestor = ArchiveIngestor(tmp_dir, db_cache)
+        
+        start_time = time.time()
+        stats = ingestor.ingest(YEARS, verbose=False)
+        print(f"导入 {stats['members']} 个文件耗时: {time.time() - start_time:.2f} 秒")
+        assert stats['archives'] == len(YEARS)
+        
+        # 与逐只股票读取压缩包的旧流程结果一致
+        backtest = AStockBacktest(data_dir=tmp_dir, years=YEARS)
+        for stock_code in stock_codes:
+            assert db_cache.is_cached(stock_code, YEARS)
+            expected = backtest._convert_to_daily(backtest._load_single_stock(stock_code))
+            pd.testing.assert_frame_equal(db_cache.load_from_cache(stock_code, YEARS), expected, check_exact=True)
+        
+        # 压缩包未变化时从断点跳过
+        stats = ingestor.ingest(YEARS, verbose=False)
+        assert stats['archives'] == 0 and stats['skipped'] == len(YEARS)
+    
+    print("\n测试完成！")
+
+def test_parallel_ingest():
+    print("测试多进程解析、单进程写入...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stock_codes = make_archives(tmp_dir, YEARS, num_stocks=40)
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        # 小分组、小批量，覆盖多次写入和压缩包断点延后记录
+        ingestor = ArchiveIngestor(tmp_dir, db_cache, flush_size=7, workers=4, chunk_size=6)
+        
+        stats = ingestor.ingest(YEARS, verbose=True)
+        assert stats['archives'] == len(YEARS) and stats['stocks'] == len(stock_codes)
+        assert stats['stages']['write']['rows'] > 0
+        
+        backtest = AStockBacktest(data_dir=tmp_dir, years=YEARS)
+        for stock_code in stock_codes:
+            expected = backtest._convert_to_daily(backtest._load_single_stock(stock_code))
+            pd.testing.assert_frame_equal(db_cache.load_from_cache(stock_code, YEARS), expected, check_exact=True)
+        
+        stats = ingestor.ingest(YEARS, verbose=False)
+        assert stats['archives'] == 0 and stats['skipped'] == len(YEARS)
+    
+    print("\n测试完成！")
+
+def test_incremental_update():
+    print("测试增量追加导入...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 先导入截止到某天上午的数据
+        make_archives(tmp_dir, YEARS, end='2017-06-30 11:30')
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        ingestor = ArchiveIngestor(tmp_dir, db_cache)
+        ingestor.ingest(YEARS, verbose=False)
+        before = db_cache.load_from_cache('sz300001', [2015, 2016])
+        
+        # 压缩包补齐后增量更新，只导入截断点之后的60分钟线
+        time.sleep(1)
+        stock_codes = make_archives(tmp_dir, YEARS)
+        start_time = time.time()
+        stats = ingestor.update(YEARS, verbose=False)
+        print(f"增量导入 {stats['rows']} 行耗时: {time.time() - start_time:.2f} 秒")
+        new_bars = len(pd.bdate_range('2017-07-01', '2017-12-31')) * len(BAR_TIMES) + 2
+        assert stats['rows'] == len(stock_codes) * new_bars
+        
+        # 结果与全量导入一致，包括盘中截断那天的合并和新数据第一天的涨跌幅
+        backtest = AStockBacktest(data_dir=tmp_dir, years=YEARS)
+        for stock_code in stock_codes:
+            expected = backtest._convert_to_daily(backtest._load_single_stock(stock_code))
+            pd.testing.assert_frame_equal(db_cache.load_from_cache(stock_code, YEARS), expected, check_exact=True)
+        pd.testing.assert_frame_equal(db_cache.load_from_cache('sz300001', [2015, 2016]), before, check_exact=True)
+        
+        # 再次更新没有新数据
+        stats = ingestor.update(YEARS, verbose=False)
+        assert stats['archives'] == 0 and stats['rows'] == 0
+    
+    print("\n测试完成！")
+
+def rewrite_member(zip_path: str, stock_code: str, scale: float = None):
+    """替换压缩包中一只股票的CSV：scale为None时删除该股票，否则价格乘以scale"""
+    # 其他成员保留原来的目录信息（修改时间等），与只替换了一个文件的新压缩包一致
+    with zipfile.ZipFile(zip_path) as z:
+        members = [(info, z.read(info)) for info in z.infolist()]
+    
+    i = next(i for i, (info, _) in enumerate(members) if info.filename.startswith(stock_code))
+    if scale is None:
+        del members[i]
+    else:
+        df = pd.read_csv(io.BytesIO(members[i][1]), encoding='gbk')
+        for column in ('开盘价', '收盘价', '最高价', '最低价'):
+            df[column] = np.round(df[column] * scale, 2)
+        members[i] = (members[i][0].filename, df.to_csv(index=False).encode('gbk'))
+    
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
+        for info, data in members:
+            z.writestr(info, data, zipfile.ZIP_DEFLATED)
+
+def test_source_fingerprints():
+    print("测试按源数据指纹判断缓存过期...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stock_codes = make_archives(tmp_dir, YEARS)
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        backtest = AStockBacktest(data_dir=tmp_dir, years=YEARS)
+        backtest.data_cache = db_cache
+        
+        data = backtest._load_data(stock_codes, False, 100)
+        ingestor = ArchiveIngestor(tmp_dir, db_cache)
+        assert db_cache.find_stale(stock_codes, YEARS, ingestor.source_fingerprints(YEARS)) == []
+        
+        # 替换一只股票、删除一只股票，只有这两只需要重新导入
+        changed, removed = stock_codes[1], stock_codes[2]
+        rewrite_member(os.path.join(tmp_dir, '2016_60min.zip'), changed, 1.1)
+        rewrite_member(os.path.join(tmp_dir, '2016_60min.zip'), removed)
+        assert sorted(db_cache.find_stale(stock_codes, YEARS, ingestor.source_fingerprints(YEARS))) == [changed, removed]
+        
+        start_time = time.time()
+        reloaded = backtest._load_data(stock_codes, False, 100)
+        print(f"重新导入过期股票并加载耗时: {time.time() - start_time:.2f} 秒")
+        assert db_cache.find_stale(stock_codes, YEARS, ingestor.source_fingerprints(YEARS)) == []
+        
+        for stock_code in stock_codes:
+            expected = backtest._convert_to_daily(backtest._load_single_stock(stock_code))
+            pd.testing.assert_frame_equal(reloaded[stock_code], expected, check_exact=True)
+        assert not reloaded[changed]['收盘价'].equals(data[changed]['收盘价'])
+        assert not (reloaded[removed]['日期'].dt.year == 2016).any()
+        
+        # 日线转换版本变化后全部过期，断点也不再跳过
+        version = data_ingest.RESAMPLER_VERSION
+        data_ingest.RESAMPLER_VERSION = version + 1
+        try:
+            assert sorted(db_cache.find_stale(stock_codes, YEARS, ingestor.source_fingerprints(YEARS))) == sorted(stock_codes)
+            stats = ingestor.ingest(YEARS, verbose=False)
+            assert stats['skipped'] == 0
+            assert db_cache.find_stale(stock_codes, YEARS, ingestor.source_fingerprints(YEARS)) == []
+            assert ingestor.ingest(YEARS, verbose=False)['skipped'] == len(YEARS)
+        finally:
+            data_ingest.RESAMPLER_VERSION = version
+    
+    print("\n测试完成！")
+
+def test_encoding_detected_once():
+    print("测试每个压缩包只检测一次编码...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        make_archives(tmp_dir, YEARS)
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        ingestor = ArchiveIngestor(tmp_dir, db_cache, chunk_size=6)
+        
+        calls = []
+        detect_encoding = ArchiveIngestor.detect_encoding
+        def counted(data):
+            calls.append(1)
+            return detect_encoding(data)
+        ArchiveIngestor.detect_encoding = staticmethod(counted)
+        try:
+            stats = ingestor.ingest(YEARS, verbose=False)
+        finally:
+            ArchiveIngestor.detect_encoding = staticmethod(detect_encoding)
+        
+        # 每个压缩包分为多个任务，编码仍只在规划时检测一次
+        assert len(calls) == len(YEARS)
+        assert [archive['encoding'] for archive in stats['archive_stats']] == ['gbk'] * len(YEARS)
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_single_pass_ingest()
+    test_parallel_ingest()
+    test_incremental_update()
+    test_source_fingerprints()
+    test_encoding_detected_once()
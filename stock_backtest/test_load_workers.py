@@ -0,0 +1,48 @@
+from a_stock_backtest_optimized import AStockBacktest
+from data_db_cache import DatabaseCache
+from test_ingest import make_archives, YEARS
+import a_stock_backtest_optimized
+import pandas as pd
+import tempfile
+import time
+import os
+
+def test_persistent_load_pool():
+    print("测试加载数据只启动一个进程池...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stock_codes = make_archives(tmp_dir, YEARS, num_stocks=30)
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        
+        # 记录创建进程池的次数
+        pools = []
+        original_pool = a_stock_backtest_optimized.Pool
+        def counting_pool(*args, **kwargs):
+            pools.append(args[0] if args else kwargs.get('processes'))
+            return original_pool(*args, **kwargs)
+        a_stock_backtest_optimized.Pool = counting_pool
+        
+        results = {}
+        try:
+            for workers in (1, 3):
+                backtest = AStockBacktest(data_dir=tmp_dir, years=YEARS, signal_cache_dir=None, workers=workers)
+                backtest.data_cache = db_cache
+                pool_count = len(pools)
+                start_time = time.time()
+                results[workers] = backtest._load_data(stock_codes, False, 4)
+                print(f"{workers} 个工作进程: 耗时 {time.time() - start_time:.2f} 秒, 进程池 {len(pools) - pool_count} 个")
+        finally:
+            a_stock_backtest_optimized.Pool = original_pool
+        
+        # 数据已在单进程时导入，加载全部股票只启动一个进程池，不随批次数增加
+        assert pools == [3]
+        
+        # 结果按股票池的顺序排列，与单进程一致
+        assert list(results[3]) == list(results[1]) == [code for code in stock_codes if code in results[1]]
+        for stock_code, df in results[1].items():
+            pd.testing.assert_frame_equal(results[3][stock_code], df)
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_persistent_load_pool()
@@ -0,0 +1,44 @@
+from data_optimizer import DataOptimizer, MemoryLRU
+import pandas as pd
+import numpy as np
+import tempfile
+
+def make_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'收盘价': np.arange(rows, dtype=np.float64), '成交量': np.arange(rows, dtype=np.int64)})
+
+def test_memory_lru_budget():
+    print("测试内存缓存字节预算...")
+    
+    df = make_frame(1000)
+    nbytes = MemoryLRU.sizeof(df)
+    cache = MemoryLRU(nbytes * 3)
+    
+    for key in 'abc':
+        cache.put(key, df)
+    assert cache.get('a') is df
+    
+    # 超出预算时淘汰最久未使用的b，刚访问过的a保留
+    cache.put('d', df)
+    assert 'b' not in cache and 'a' in cache
+    assert cache.current_bytes <= cache.max_bytes
+    
+    # 单个超过预算的数据不缓存
+    cache.put('big', make_frame(10000))
+    assert 'big' not in cache
+    
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['evictions'] == 1
+    print(stats)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        optimizer = DataOptimizer(tmp_dir, memory_limit_mb=1)
+        for i in range(50):
+            optimizer.save_to_memory_cache(f'sz{i:06d}', [2015], make_frame(5000))
+        stats = optimizer.get_cache_stats()
+        assert stats['memory_cache_mb'] <= 1 and stats['evictions'] > 0
+        print(stats)
+    
+    print("\n测试完成！")
+
+if __name__ == "__main__":
+    test_memory_lru_budget()
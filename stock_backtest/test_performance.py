@@ -0,0 +1,89 @@
+from performance import analyze, rolling_volatility_sharpe, drawdown_series, period_returns
+from trade_ledger import EquityCurve
+from test_trade_ledger import make_trades, fill_ledger
+import pandas as pd
+import numpy as np
+import time
+
+def make_curve(days: int, seed: int = 0) -> EquityCurve:
+    rng = np.random.default_rng(seed)
+    curve = EquityCurve()
+    values = 1000000 * np.cumprod(1 + rng.normal(0.0004, 0.012, days))
+    for date, value in zip(pd.bdate_range('2015-01-05', periods=days), values):
+        curve.append(date, value)
+    return curve
+
+def test_matches_pandas():
+    print("测试分析结果与pandas逐项计算一致...")
+    
+    curve = make_curve(700)
+    trades = make_trades(3000)
+    ledger = fill_ledger(trades)
+    report = analyze(curve, ledger, 1000000, window=20)
+    
+    values = pd.Series(curve.values, index=pd.DatetimeIndex(curve.dates))
+    returns = values.pct_change().fillna(0)
+    daily = report['daily']
+    rolling = returns.rolling(20)
+    assert np.allclose(daily['rolling_volatility'], rolling.std(ddof=0) * np.sqrt(252), equal_nan=True)
+    excess = rolling.mean() - 0.03 / 252
+    assert np.allclose(daily['rolling_sharpe'], excess / rolling.std(ddof=0) * np.sqrt(252), equal_nan=True)
+    
+    # 回撤持续天数：逐日计数，创新高时归零
+    duration, days, peak = [], 0, -np.inf
+    for value in values:
+        days = 0 if value >= peak else days + 1
+        peak = max(peak, value)
+        duration.append(days)
+    assert daily['drawdown_days'].tolist() == duration
+    assert np.allclose(daily['drawdown'], values / values.cummax() - 1)
+    assert report['summary']['max_drawdown_days'] == max(duration)
+    
+    monthly = values.resample('ME').last()
+    expected = monthly / monthly.shift(1, fill_value=1000000) - 1
+    assert np.allclose(period_returns(curve.dates, curve.values, 1000000, 'M').to_numpy(), expected.to_numpy())
+    table = report['monthly_returns']
+    assert np.isclose(table.loc[2016, 3], expected[(expected.index.year == 2016) & (expected.index.month == 3)].iloc[0])
+    yearly = values.resample('YE').last()
+    assert np.allclose(report['yearly_returns'].to_numpy(), (yearly / yearly.shift(1, fill_value=1000000) - 1).to_numpy())
+    
+    df = pd.DataFrame(trades)
+    by_stock = df.groupby('stock_code').agg(trades=('return_pct', 'size'), total_profit=('profit', 'sum'),
+                                            avg_return=('return_pct', 'mean'))
+    result = report['by_stock'].loc[by_stock.index]
+    assert (result['trades'] == by_stock['trades']).all()
+    assert np.allclose(result['total_profit'], by_stock['total_profit'])
+    assert np.allclose(result['avg_return'], by_stock['avg_return'])
+    by_reason = df.groupby(df['reason'].str.split(' ').str[0])['profit'].sum()
+    assert np.allclose(report['by_reason']['total_profit'].loc[by_reason.index], by_reason)
+    
+    distribution = report['return_distribution']
+    assert distribution['histogram']['count'].sum() == len(trades)
+    assert np.isclose(distribution['quantiles'][0.5], df['return_pct'].median())
+    assert np.isclose(distribution['skew'], df['return_pct'].skew(), atol=1e-2)
+    
+    # 数据太少时滚动指标全为NaN，回撤为0
+    volatility, sharpe = rolling_volatility_sharpe(np.zeros(5), 20)
+    assert np.isnan(volatility).all() and np.isnan(sharpe).all()
+    depth, duration = drawdown_series(np.array([1.0]))
+    assert depth.tolist() == [0.0] and duration.tolist() == [0]
+    
+    print("测试完成！")
+
+def test_analyze_speed():
+    print("测试十年净值和十万笔交易的分析耗时...")
+    
+    curve = make_curve(2520)
+    ledger = fill_ledger(make_trades(100000))
+    
+    start_time = time.time()
+    report = analyze(curve, ledger, 1000000)
+    elapsed = time.time() - start_time
+    print(f"{len(curve)} 个净值点, {len(ledger)} 笔交易: 耗时 {elapsed:.3f} 秒, 股票 {len(report['by_stock'])} 只")
+    assert elapsed < 1.0
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_matches_pandas()
+    test_analyze_speed()
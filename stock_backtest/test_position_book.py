@@ -0,0 +1,101 @@
+from position_book import PositionBook
+import pandas as pd
+import numpy as np
+import time
+
+RULES = {'stop_loss_pct': -0.05, 'take_profit_trigger': 0.10, 'take_profit_fallback': -0.03, 'max_holding_days': 7}
+
+def exit_reason(pos: dict, current_price: float, date: pd.Timestamp):
+    """逐个持仓判断的原实现，作为对照"""
+    if current_price > pos['highest_price']:
+        pos['highest_price'] = current_price
+    
+    pct_return = (current_price - pos['entry_price']) / pos['entry_price']
+    holding_days = (date - pos['entry_date']).days
+    
+    if pct_return <= RULES['stop_loss_pct']:
+        return f'止损 {pct_return:.2%}'
+    elif pct_return >= RULES['take_profit_trigger']:
+        pos['take_profit_active'] = True
+        drawdown = (pos['highest_price'] - current_price) / pos['highest_price']
+        if drawdown >= abs(RULES['take_profit_fallback']):
+            return f'止盈 {pct_return:.2%}'
+    elif holding_days >= RULES['max_holding_days']:
+        return f'时间止损 {holding_days}天'
+    return None
+
+def simulate(num_stocks: int, days: int, capacity: int, seed: int = 0):
+    """随机开平仓，逐日对比向量化检查与逐个判断的结果"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2016-01-04', periods=days)
+    prices = 10 * np.cumprod(1 + rng.normal(0, 0.03, (days, num_stocks)), axis=0)
+    prices[rng.random((days, num_stocks)) < 0.05] = np.nan
+    codes = [f'sz{300000 + j:06d}' for j in range(num_stocks)]
+    
+    book = PositionBook(capacity)
+    positions = {}
+    book_time = dict_time = 0.0
+    for row, date in enumerate(dates):
+        day_prices = prices[row]
+        
+        start_time = time.time()
+        exits = book.check_exits(day_prices, date, **RULES)
+        for stock_code, _, _ in exits:
+            book.close(stock_code)
+        book_time += time.time() - start_time
+        
+        start_time = time.time()
+        expected = []
+        for stock_code, pos in positions.items():
+            current_price = day_prices[pos['column']]
+            if np.isnan(current_price):
+                continue
+            reason = exit_reason(pos, current_price, date)
+            if reason is not None:
+                expected.append((stock_code, current_price, reason))
+        for stock_code, _, _ in expected:
+            del positions[stock_code]
+        dict_time += time.time() - start_time
+        
+        assert exits == expected, (date, exits, expected)
+        
+        for j in rng.choice(num_stocks, size=max(1, num_stocks // 20), replace=False):
+            if codes[j] in positions or np.isnan(day_prices[j]):
+                continue
+            book.open(codes[j], j, day_prices[j], date, 100, day_prices[j])
+            positions[codes[j]] = {
+                'entry_price': day_prices[j], 'entry_date': date, 'quantity': 100,
+                'highest_price': day_prices[j], 'take_profit_active': False, 'column': j,
+            }
+        assert list(book) == list(positions)
+    
+    return book_time, dict_time
+
+def test_matches_scalar_checks():
+    print("测试向量化卖出检查与逐个判断一致...")
+    
+    # 槽位从1个开始，覆盖扩容
+    simulate(40, 120, capacity=1, seed=1)
+    
+    book = PositionBook(2)
+    date = pd.Timestamp('2016-01-04')
+    book.open('A', 0, 10.0, date, 100, 10.0)
+    book.open('B', None, 20.0, date, 200, 20.0)
+    # B不在价格矩阵中，按最近一个有效价格估值
+    assert book.market_value().tolist() == [1000.0, 4000.0]
+    assert book.market_value(np.array([11.0])).tolist() == [1100.0, 0.0]
+    assert book.close('A') == (10.0, date, 100) and list(book) == ['B']
+    
+    print("测试完成！")
+
+def test_check_speed():
+    print("测试大量持仓时的检查耗时...")
+    
+    book_time, dict_time = simulate(4000, 250, capacity=1000)
+    print(f"向量化: {book_time:.2f} 秒, 逐个判断: {dict_time:.2f} 秒")
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_matches_scalar_checks()
+    test_check_speed()
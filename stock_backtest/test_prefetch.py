@@ -0,0 +1,160 @@
+from data_optimizer import DataOptimizer, Prefetcher
+from a_stock_backtest_optimized import AStockBacktest, LimitUpStrategy
+from data_db_cache import DatabaseCache
+from test_ingest import make_archives
+import pandas as pd
+import tempfile
+import asyncio
+import threading
+import copy
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+PARAMS = {
+    'limit_up_pct': 9.9,
+    'min_close_after_limit': 0.70,
+    'min_volume_ratio': 1.2,
+    'days_to_check': 20,
+}
+
+def generate(strategy: LimitUpStrategy, df) -> int:
+    return len(strategy.select_signals(df)['index'])
+
+def test_prefetch_overlaps_signal_generation():
+    print("测试按访问顺序预取...")
+    
+    stock_codes = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR))
+    strategy = LimitUpStrategy(PARAMS)
+    
+    # 顺序加载后再计算信号
+    optimizer = DataOptimizer(CACHE_DIR)
+    start_time = time.time()
+    expected = {}
+    for stock_code in stock_codes:
+        expected[stock_code] = generate(strategy, optimizer.load_from_cache(stock_code, YEARS))
+    print(f"顺序加载: {time.time() - start_time:.2f} 秒")
+    
+    # 计算第k只时后面的股票在后台解压，返回顺序与给定顺序一致
+    optimizer = DataOptimizer(CACHE_DIR)
+    start_time = time.time()
+    order = []
+    for stock_code, df in optimizer.prefetch(stock_codes, YEARS, window=8):
+        order.append(stock_code)
+        assert generate(strategy, df) == expected[stock_code]
+    print(f"预取窗口8: {time.time() - start_time:.2f} 秒")
+    assert order == stock_codes
+    
+    # asyncio中使用
+    async def consume():
+        results = {}
+        async for stock_code, df in DataOptimizer(CACHE_DIR).prefetch(stock_codes, YEARS, window=4):
+            results[stock_code] = generate(strategy, df)
+        return results
+    assert asyncio.run(consume()) == expected
+    
+    optimizer = DataOptimizer(CACHE_DIR)
+    asyncio.run(optimizer.preload_cache(stock_codes, YEARS))
+    assert optimizer.get_cache_stats()['memory_cache_size'] == len(stock_codes)
+    
+    print("\n测试完成！")
+
+def test_signals_during_load():
+    print("测试加载过程中生成信号...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stock_codes = make_archives(tmp_dir, YEARS, num_stocks=12)
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        
+        for workers in (1, 3):
+            backtest = AStockBacktest(data_dir=tmp_dir, years=YEARS, signal_cache_dir=None, workers=workers)
+            backtest.data_cache = db_cache
+            
+            # 每只股票到达时生成信号，按数据顺序合并后与加载完再一次性生成的一致
+            stock_signals = {}
+            def on_stock(stock_code, df):
+                stock_signals[stock_code] = backtest._stock_signals(stock_code, df, backtest.strategy)
+            data = backtest._load_data(stock_codes, False, 4, on_stock)
+            assert set(stock_signals) == set(data)
+            
+            expected = backtest._generate_signals_vectorized(data)
+            assert len(expected) > 0
+            pd.testing.assert_frame_equal(backtest._merge_signals(data, stock_signals, False), expected)
+            print(f"{workers} 个工作进程: {len(expected)} 个信号")
+    
+    print("测试完成！")
+
+def test_prefetch_close():
+    print("测试预取结束时在工作线程中释放资源...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stock_codes = make_archives(tmp_dir, YEARS, num_stocks=6)
+        db_cache = DatabaseCache(os.path.join(tmp_dir, 'stock_data.db'))
+        
+        # 数据缓存的副本在预取线程中打开SQLite连接，结束后在同一线程中关闭，提前结束迭代时同样关闭
+        for consumed in (len(stock_codes), 2):
+            cache = copy.copy(db_cache)
+            load_threads = []
+            close_threads = []
+            def load(stock_code):
+                load_threads.append(threading.get_ident())
+                return cache.get_or_none(stock_code, YEARS)
+            def on_close():
+                close_threads.append(threading.get_ident())
+                cache.close()
+            prefetcher = Prefetcher(load, stock_codes, window=2, max_workers=1, on_close=on_close)
+            iterator = iter(prefetcher)
+            for _ in range(consumed):
+                next(iterator)
+            iterator.close()
+            prefetcher.close()
+            prefetcher.executor.shutdown(wait=True)
+            assert len(close_threads) == 1
+            assert set(load_threads) == set(close_threads)
+            assert cache._conn is None
+    
+    print("测试完成！")
+
+def test_streamed_signals_cached():
+    print("测试加载过程中生成的信号写入信号缓存...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stock_codes = make_archives(tmp_dir, YEARS, num_stocks=12)
+        signal_dir = os.path.join(tmp_dir, 'signals')
+        
+        results = []
+        for _ in range(2):
+            backtest = AStockBacktest(data_dir=tmp_dir, years=YEARS, db_path=os.path.join(tmp_dir, 'stock_data.db'),
+                                      signal_cache_dir=signal_dir, workers=1)
+            # 开启信号缓存时仍在加载过程中生成信号，不再加载完成后重新生成
+            generated = []
+            def generate_signals(*args, **kwargs):
+                generated.append(1)
+                return AStockBacktest._generate_signals(backtest, *args, **kwargs)
+            backtest._generate_signals = generate_signals
+            streamed = []
+            def stock_signals(*args, _stock_signals=backtest._stock_signals):
+                streamed.append(1)
+                return _stock_signals(*args)
+            backtest._stock_signals = stock_signals
+            
+            results.append(backtest.run(stock_codes, verbose=False))
+            assert not generated
+            assert len(streamed) == len(stock_codes)
+        assert results[1]['total_trades'] == results[0]['total_trades']
+        assert results[1]['final_value'] == results[0]['final_value']
+        
+        data = backtest._load_data(stock_codes, False, 100)
+        key = backtest.signal_cache.get_key(backtest.strategy, YEARS, data)
+        expected = backtest._generate_signals_vectorized(data)
+        assert len(expected) > 0
+        pd.testing.assert_frame_equal(backtest.signal_cache.load(key), expected)
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_prefetch_overlaps_signal_generation()
+    test_signals_during_load()
+    test_prefetch_close()
+    test_streamed_signals_cached()
@@ -0,0 +1,108 @@
+from resampler import convert_to_daily, resample_bars, resample_stocks
+from test_ingest import BAR_TIMES
+import pandas as pd
+import numpy as np
+import time
+
+def groupby_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """原_convert_to_daily的逐只股票groupby实现，作为对照"""
+    df = df.sort_values('时间').reset_index(drop=True)
+    df['日期'] = pd.to_datetime(df['时间']).dt.date
+    df['日期'] = pd.to_datetime(df['日期'])
+    
+    daily = df.groupby('日期').agg({
+        '代码': 'first',
+        '名称': 'first',
+        '开盘价': 'first',
+        '收盘价': 'last',
+        '最高价': 'max',
+        '最低价': 'min',
+        '成交量': 'sum',
+        '成交额': 'sum',
+    }).reset_index()
+    
+    daily['涨跌幅'] = daily['收盘价'].pct_change() * 100
+    daily['振幅'] = ((daily['最高价'] - daily['最低价']) / daily['收盘价'].shift(1) * 100).fillna(0)
+    return daily
+
+def make_minute_frames(num_stocks: int = 100, seed: int = 3) -> dict:
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range('2015-01-01', '2017-12-31')
+    n = len(days) * len(BAR_TIMES)
+    
+    frames = {}
+    for i in range(num_stocks):
+        stock_code = f'sz{300000 + i:06d}'
+        close = np.round(10 * np.cumprod(1 + rng.normal(0, 0.01, n)), 2)
+        df = pd.DataFrame({
+            '时间': [f'{d:%Y-%m-%d} {t}' for d in days for t in BAR_TIMES],
+            '代码': stock_code,
+            # 中途更名，检验名称取当天第一根
+            '名称': np.where(np.arange(n) < n // 2, f'测试股份{i}', f'ST测试{i}'),
+            '开盘价': np.round(close * (1 + rng.normal(0, 0.003, n)), 2),
+            '收盘价': close,
+            '最高价': np.round(close * 1.01, 2),
+            '最低价': np.round(close * 0.99, 2),
+            '成交量': rng.integers(1000, 100000, n),
+            '成交额': rng.integers(10**6, 10**8, n),
+        })
+        # 部分股票含缺失值，检验first/last/max/min跳过缺失值的行为
+        if i % 3 == 0:
+            df.loc[rng.choice(n, 30), '收盘价'] = np.nan
+            df.loc[rng.choice(n, 30), '最高价'] = np.nan
+        frames[stock_code] = df
+    return frames
+
+def test_resampler_matches_groupby():
+    print("测试向量化K线重采样...")
+    
+    frames = make_minute_frames()
+    
+    start_time = time.time()
+    expected = {code: groupby_daily(df) for code, df in frames.items()}
+    print(f"逐只股票groupby耗时: {time.time() - start_time:.2f} 秒")
+    
+    start_time = time.time()
+    result = resample_stocks(frames)
+    print(f"多股票一次重采样耗时: {time.time() - start_time:.2f} 秒")
+    
+    for stock_code, df in frames.items():
+        pd.testing.assert_frame_equal(result[stock_code], expected[stock_code], check_exact=True)
+        # 输入顺序打乱后结果不变
+        shuffled = df.sample(frac=1, random_state=0)
+        pd.testing.assert_frame_equal(convert_to_daily(shuffled), expected[stock_code], check_exact=True)
+    
+    # 直接传入拼接好的多股票数据，按代码区分股票
+    combined = pd.concat(frames.values(), ignore_index=True).sample(frac=1, random_state=1)
+    pd.testing.assert_frame_equal(resample_bars(combined), pd.concat(expected.values(), ignore_index=True), check_exact=True)
+    
+    print("\n测试完成！")
+
+def test_resampler_other_periods():
+    print("测试120分钟与周线...")
+    
+    df = make_minute_frames(num_stocks=1)['sz300000']
+    df['时间'] = pd.to_datetime(df['时间'])
+    
+    # 120分钟：上午、下午各合并两根
+    bars = resample_bars(df, '120min')
+    session = np.where(df['时间'].dt.hour < 12, 11, 15)
+    expected = df.groupby([df['时间'].dt.normalize(), session]).agg({'开盘价': 'first', '最高价': 'max', '成交量': 'sum'})
+    assert len(bars) == len(expected)
+    assert (bars['时间'].dt.hour.to_numpy() == expected.index.get_level_values(1)).all()
+    np.testing.assert_array_equal(bars['开盘价'].to_numpy(), expected['开盘价'].to_numpy())
+    np.testing.assert_array_equal(bars['最高价'].to_numpy(), expected['最高价'].to_numpy())
+    np.testing.assert_array_equal(bars['成交量'].to_numpy(), expected['成交量'].to_numpy())
+    
+    # 周线：按周一起始分周，日期取该周最后一个交易日
+    bars = resample_bars(df, 'weekly')
+    week = df.groupby(df['时间'].dt.to_period('W-SUN')).agg({'时间': 'max', '收盘价': 'last', '成交额': 'sum'})
+    np.testing.assert_array_equal(bars['日期'].to_numpy(), week['时间'].dt.normalize().to_numpy().astype('datetime64[s]'))
+    np.testing.assert_array_equal(bars['收盘价'].to_numpy(), week['收盘价'].to_numpy())
+    np.testing.assert_array_equal(bars['成交额'].to_numpy(), week['成交额'].to_numpy())
+    
+    print("\n测试完成！")
+
+if __name__ == "__main__":
+    test_resampler_matches_groupby()
+    test_resampler_other_periods()
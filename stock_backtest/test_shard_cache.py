@@ -0,0 +1,153 @@
+from data_cache_optimized import OptimizedDataCache
+import pandas as pd
+import tempfile
+import shutil
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+
+def test_shard_cache():
+    print("测试分片缓存...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    stock_codes = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR) if f.endswith('.lz4'))
+    data = {code: source.load_from_cache(code, YEARS) for code in stock_codes}
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 旧版每只股票一个文件原样打包进分片
+        for name in os.listdir(CACHE_DIR):
+            shutil.copy(os.path.join(CACHE_DIR, name), tmp_dir)
+        cache = OptimizedDataCache(tmp_dir)
+        
+        start_time = time.time()
+        assert cache.migrate_legacy() == len(stock_codes)
+        print(f"迁移 {len(stock_codes)} 个文件耗时: {time.time() - start_time:.2f} 秒")
+        assert os.listdir(tmp_dir) == ['shard_2015_2016_2017_0000.lz4s']
+        
+        start_time = time.time()
+        for stock_code, df in data.items():
+            assert cache.is_cached(stock_code, YEARS)
+            pd.testing.assert_frame_equal(cache.load_from_cache(stock_code, YEARS), df, check_exact=True)
+        print(f"读取耗时: {time.time() - start_time:.2f} 秒")
+        
+        # 追加新股票、覆盖已有股票
+        new_df = data[stock_codes[0]].head(10)
+        cache.save_to_cache('999999', YEARS, new_df)
+        cache.save_to_cache(stock_codes[1], YEARS, new_df)
+        pd.testing.assert_frame_equal(cache.load_from_cache('999999', YEARS), new_df, check_exact=True)
+        pd.testing.assert_frame_equal(cache.load_from_cache(stock_codes[1], YEARS), new_df, check_exact=True)
+        pd.testing.assert_frame_equal(cache.load_from_cache(stock_codes[2], YEARS), data[stock_codes[2]], check_exact=True)
+        
+        # 新建的实例只依赖文件尾的索引
+        reopened = OptimizedDataCache(tmp_dir)
+        pd.testing.assert_frame_equal(reopened.load_from_cache(stock_codes[1], YEARS), new_df, check_exact=True)
+        assert not reopened.is_cached(stock_codes[0], [2018])
+        assert reopened.load_from_cache(stock_codes[0], [2018]).empty
+        
+        stats = reopened.get_cache_stats()
+        print(f"分片数: {stats['shards']}, 记录数: {stats['records']}, 大小: {stats['size_mb']:.2f} MB")
+    
+    # 分片达到上限后写入下一个分片
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OptimizedDataCache(tmp_dir, max_shard_bytes=1024 * 1024)
+        for stock_code, df in data.items():
+            cache.save_to_cache(stock_code, YEARS, df)
+        stats = cache.get_cache_stats()
+        assert stats['shards'] > 1 and stats['records'] == len(data)
+        for stock_code, df in data.items():
+            pd.testing.assert_frame_equal(cache.load_from_cache(stock_code, YEARS), df, check_exact=True)
+        print(f"1MB上限下分片数: {stats['shards']}")
+    
+    print("分片缓存测试通过")
+
+def test_torn_append():
+    print("测试追加写到一半中断后分片仍可读写...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    stock_codes = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR) if f.endswith('.lz4'))[:3]
+    data = {code: source.load_from_cache(code, YEARS) for code in stock_codes}
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OptimizedDataCache(tmp_dir)
+        cache.save_to_cache(stock_codes[0], YEARS, data[stock_codes[0]])
+        shard_path = cache._list_shards(YEARS)[0]
+        committed = os.path.getsize(shard_path)
+        
+        # 第二次追加的文件尾只写了一部分
+        cache.save_to_cache(stock_codes[1], YEARS, data[stock_codes[1]])
+        with open(shard_path, 'r+b') as f:
+            f.truncate(os.path.getsize(shard_path) - 5)
+        
+        reopened = OptimizedDataCache(tmp_dir)
+        pd.testing.assert_frame_equal(reopened.load_from_cache(stock_codes[0], YEARS), data[stock_codes[0]], check_exact=True)
+        assert not reopened.is_cached(stock_codes[1], YEARS)
+        
+        # 之后的追加截掉不完整的部分，从上一个完整的文件尾之后继续写
+        reopened.save_to_cache(stock_codes[2], YEARS, data[stock_codes[2]])
+        for stock_code in (stock_codes[0], stock_codes[2]):
+            pd.testing.assert_frame_equal(OptimizedDataCache(tmp_dir).load_from_cache(stock_code, YEARS), data[stock_code], check_exact=True)
+        
+        # 记录写到一半：文件尾之后只有部分数据
+        with open(shard_path, 'ab') as f:
+            f.write(cache.codec.dumps(data[stock_codes[1]])[:1000])
+        assert OptimizedDataCache(tmp_dir).get_cache_stats()['records'] == 2
+        
+        # 第一次写入就中断时按空分片处理
+        with open(shard_path, 'r+b') as f:
+            f.truncate(committed - 5)
+        reopened = OptimizedDataCache(tmp_dir)
+        assert not reopened.is_cached(stock_codes[0], YEARS)
+        reopened.save_to_cache(stock_codes[1], YEARS, data[stock_codes[1]])
+        pd.testing.assert_frame_equal(OptimizedDataCache(tmp_dir).load_from_cache(stock_codes[1], YEARS), data[stock_codes[1]], check_exact=True)
+    
+    print("测试完成！")
+
+def test_shard_list_cached():
+    print("测试读取时不重复列出缓存目录...")
+    
+    source = OptimizedDataCache(CACHE_DIR)
+    stock_codes = sorted(f.split('_')[0] for f in os.listdir(CACHE_DIR) if f.endswith('.lz4'))
+    data = {code: source.load_from_cache(code, YEARS) for code in stock_codes}
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OptimizedDataCache(tmp_dir, max_shard_bytes=1024 * 1024)
+        
+        listdir = os.listdir
+        calls = []
+        def counted(path):
+            calls.append(path)
+            return listdir(path)
+        os.listdir = counted
+        try:
+            # 写入时新建的分片直接加入列表
+            cache.save_many(dict(list(data.items())[:len(data) // 2]), YEARS)
+            for stock_code, df in list(data.items())[len(data) // 2:]:
+                cache.save_to_cache(stock_code, YEARS, df)
+            for stock_code, df in data.items():
+                assert cache.is_cached(stock_code, YEARS)
+                pd.testing.assert_frame_equal(cache.load_from_cache(stock_code, YEARS), df, check_exact=True)
+        finally:
+            os.listdir = listdir
+        assert cache.get_cache_stats()['shards'] > 1
+        assert len(calls) == 1, len(calls)
+        
+        # 另一个实例新建分片后目录变化，重新列出
+        other = OptimizedDataCache(tmp_dir, max_shard_bytes=1)
+        other.save_to_cache('999999', YEARS, data[stock_codes[0]])
+        pd.testing.assert_frame_equal(cache.load_from_cache('999999', YEARS), data[stock_codes[0]], check_exact=True)
+        
+        # 记录损坏时提示并按未缓存处理
+        shard_path, offset, length = cache._locate('999999', YEARS)
+        with open(shard_path, 'r+b') as f:
+            f.seek(offset)
+            f.write(b'\0' * length)
+        assert cache.load_from_cache('999999', YEARS).empty
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_shard_cache()
+    test_torn_append()
+    test_shard_list_cached()
@@ -0,0 +1,95 @@
+from shared_frames import pack_frames, unpack_frames, ensure_tracker, SHARED_MEMORY
+from multiprocessing import Pool
+import pandas as pd
+import numpy as np
+import time
+import gc
+import os
+
+def make_daily(stock_code: str, days: int = 2400, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = np.round(10 * np.cumprod(1 + rng.normal(0, 0.02, days)), 2)
+    df = pd.DataFrame({
+        '日期': pd.bdate_range('2015-01-05', periods=days),
+        '代码': stock_code,
+        '名称': ['测试股份'] * (days // 2) + ['ST测试'] * (days - days // 2),
+        '开盘价': close,
+        '收盘价': close,
+        '成交量': rng.integers(1000, 100000, days),
+    })
+    df['涨跌幅'] = df['收盘价'].pct_change() * 100
+    return df
+
+# 工作进程中只生成一次日线，任务耗时只剩结果传输
+_template = {}
+
+def _frames_task(i: int) -> dict:
+    if 'df' not in _template:
+        _template['df'] = make_daily('sz300000')
+    return {f'sz{300000 + i:06d}': _template['df']}
+
+def _packed_task(i: int) -> dict:
+    return pack_frames(_frames_task(i))
+
+def test_round_trip():
+    print("测试共享内存传输的往返一致...")
+    
+    frames = {code: make_daily(code, seed=i) for i, code in enumerate(['sz300001', 'sh600000'])}
+    frames['sz300002'] = frames['sz300001'].iloc[:0]
+    
+    for shared in ([True, False] if SHARED_MEMORY else [False]):
+        packed = pack_frames(frames, shared)
+        restored = unpack_frames(packed)
+        assert list(restored) == list(frames)
+        for stock_code, df in frames.items():
+            pd.testing.assert_frame_equal(restored[stock_code], df)
+        
+        if shared:
+            # 传回的只有pickle主体，数值数据留在共享内存中并被直接引用
+            nbytes = sum(df.memory_usage(deep=False).sum() for df in frames.values())
+            assert len(packed['body']) < nbytes / 5
+            close = restored['sz300001']['收盘价'].to_numpy()
+            while isinstance(close.base, np.ndarray):
+                close = close.base
+            assert close.nbytes == packed['size']
+    
+    print("测试完成！")
+
+def test_transport_speed():
+    print("测试多进程结果经管道和共享内存传回的耗时...")
+    
+    if not SHARED_MEMORY:
+        print("当前系统不使用共享内存，跳过")
+        return
+    
+    ensure_tracker()
+    with Pool(4) as pool:
+        pool.map(_frames_task, range(4))
+        
+        start_time = time.time()
+        pickled = {}
+        for frames in pool.imap_unordered(_frames_task, range(2000)):
+            pickled.update(frames)
+        pickle_time = time.time() - start_time
+        
+        start_time = time.time()
+        shared = {}
+        for packed in pool.imap_unordered(_packed_task, range(2000)):
+            shared.update(unpack_frames(packed))
+        shared_time = time.time() - start_time
+    
+    print(f"{len(shared)} 只股票: 序列化DataFrame {pickle_time:.2f} 秒, 共享内存 {shared_time:.2f} 秒")
+    for stock_code in list(pickled)[:20]:
+        pd.testing.assert_frame_equal(shared[stock_code], pickled[stock_code])
+    
+    # DataFrame释放后映射关闭，共享内存中不留下数据块
+    del shared
+    gc.collect()
+    if os.path.isdir('/dev/shm'):
+        assert not [name for name in os.listdir('/dev/shm') if name.startswith('psm_')]
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_transport_speed()
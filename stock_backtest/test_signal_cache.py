@@ -0,0 +1,138 @@
+from a_stock_backtest_optimized import AStockBacktest, LimitUpStrategy
+from data_cache_optimized import OptimizedDataCache
+from data_panel import PanelData, write_panel
+from signal_cache import SignalCache
+import pandas as pd
+import tempfile
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+PARAMS = {'limit_up_pct': 5.0, 'min_close_after_limit': 0.95, 'min_volume_ratio': 1.0, 'days_to_check': 10}
+
+def load_sample_data(max_stocks: int = 20):
+    cache = OptimizedDataCache(CACHE_DIR)
+    data = {}
+    for file in sorted(os.listdir(CACHE_DIR))[:max_stocks]:
+        stock_code = file.split('_')[0]
+        df = cache.load_from_cache(stock_code, YEARS)
+        if not df.empty:
+            data[stock_code] = df
+    return data
+
+def make_backtest(data: dict, signal_cache_dir: str, calls: list, **kwargs) -> AStockBacktest:
+    backtest = AStockBacktest(years=YEARS, signal_cache_dir=signal_cache_dir, **kwargs)
+    backtest.strategy.params = dict(PARAMS)
+    backtest._load_data = lambda stock_pool, verbose, batch_size, on_stock=None: data
+    
+    # 记录实际生成信号的次数，关闭缓存时信号在加载过程中生成并由_merge_signals合并
+    for name in ('_generate_signals', '_merge_signals'):
+        def counted(*args, _generate=getattr(backtest, name), **kw):
+            calls.append(1)
+            return _generate(*args, **kw)
+        setattr(backtest, name, counted)
+    return backtest
+
+def test_signal_cache():
+    print("测试选股信号缓存...")
+    
+    data = load_sample_data()
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        calls = []
+        
+        start_time = time.time()
+        first = make_backtest(data, tmp_dir, calls).run(verbose=False)
+        print(f"首次运行耗时: {time.time() - start_time:.2f} 秒")
+        assert len(calls) == 1
+        
+        start_time = time.time()
+        second = make_backtest(data, tmp_dir, calls).run(verbose=False)
+        print(f"命中信号缓存耗时: {time.time() - start_time:.2f} 秒")
+        assert len(calls) == 1
+        assert second['total_trades'] == first['total_trades']
+        assert second['final_value'] == first['final_value']
+        
+        # 只改交易引擎参数，信号仍然复用
+        make_backtest(data, tmp_dir, calls, position_size=0.2, commission=0.0005, slippage=0.002).run(verbose=False)
+        assert len(calls) == 1
+        
+        # 选股参数变化
+        backtest = make_backtest(data, tmp_dir, calls)
+        backtest.strategy.params['min_volume_ratio'] = 1.5
+        backtest.run(verbose=False)
+        assert len(calls) == 2
+        
+        # 股票池变化
+        subset = dict(list(data.items())[:10])
+        make_backtest(subset, tmp_dir, calls).run(verbose=False)
+        assert len(calls) == 3
+        
+        # 数据变化
+        changed = dict(data)
+        stock_code = next(iter(changed))
+        changed[stock_code] = changed[stock_code].assign(收盘价=changed[stock_code]['收盘价'] * 1.01)
+        make_backtest(changed, tmp_dir, calls).run(verbose=False)
+        assert len(calls) == 4
+        
+        # 关闭缓存
+        make_backtest(data, None, calls).run(verbose=False)
+        assert len(calls) == 5
+        
+        cached = make_backtest(data, tmp_dir, calls)
+        key = cached.signal_cache.get_key(cached.strategy, YEARS, data)
+        pd.testing.assert_frame_equal(cached.signal_cache.load(key), cached._generate_signals(data, False))
+    
+    print("\n测试完成！")
+
+def test_fingerprint_columns():
+    print("测试数据指纹覆盖选股读取的列...")
+    
+    data = load_sample_data(5)
+    stock_code = next(iter(data))
+    strategy = LimitUpStrategy(dict(PARAMS))
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_dir = os.path.join(tmp_dir, 'signals')
+        cache = SignalCache(cache_dir)
+        AStockBacktest(years=YEARS, signal_cache_dir=cache_dir)
+        # 默认不启用信号缓存
+        assert AStockBacktest(years=YEARS).signal_cache is None
+        # 构造时不创建目录，第一次保存时才创建
+        assert not os.path.exists(cache_dir)
+        key = cache.get_key(strategy, YEARS, data)
+        cache.save(key, pd.DataFrame({'stock_code': [stock_code]}))
+        assert os.path.isdir(cache_dir)
+        
+        # 交换两天的成交量，总和不变，指纹仍然变化
+        df = data[stock_code].copy()
+        volume = df['成交量'].to_numpy().copy()
+        volume[[30, 31]] = volume[[31, 30]]
+        assert volume[30] != volume[31]
+        df['成交量'] = volume
+        assert cache.get_key(strategy, YEARS, {**data, stock_code: df}) != key
+        
+        # 选股不读取的列变化时仍复用信号
+        renamed = {**data, stock_code: data[stock_code].assign(名称='更名')}
+        assert cache.get_key(strategy, YEARS, renamed) == key
+        
+        # 重写了select_stock的子类对全部列做指纹
+        class CustomStrategy(LimitUpStrategy):
+            def select_stock(self, df, idx):
+                return super().select_stock(df, idx)
+        custom = CustomStrategy(dict(PARAMS))
+        assert CustomStrategy.signal_columns is None
+        assert cache.get_key(custom, YEARS, renamed) != cache.get_key(custom, YEARS, data)
+        
+        # 面板的列视图与日线DataFrame得到相同的键
+        panel = write_panel(data, os.path.join(tmp_dir, 'panel'))
+        panel_data = PanelData(panel, years=YEARS)
+        assert cache.get_key(strategy, YEARS, panel_data) == cache.get_key(strategy, YEARS, panel.to_frames(years=YEARS))
+        del panel, panel_data
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_signal_cache()
+    test_fingerprint_columns()
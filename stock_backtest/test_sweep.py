@@ -0,0 +1,125 @@
+from a_stock_backtest_optimized import AStockBacktest
+from data_cache_optimized import OptimizedDataCache
+from data_panel import MarketPanel, PanelData, write_panel
+import pandas as pd
+import numpy as np
+import tempfile
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+
+def load_sample_data(max_stocks: int = 20):
+    cache = OptimizedDataCache(CACHE_DIR)
+    data = {}
+    for file in sorted(os.listdir(CACHE_DIR))[:max_stocks]:
+        stock_code = file.split('_')[0]
+        df = cache.load_from_cache(stock_code, YEARS)
+        if not df.empty:
+            data[stock_code] = df
+    return data
+
+def test_parameter_sweep():
+    print("测试参数扫描...")
+    
+    data = load_sample_data()
+    param_grid = {
+        'limit_up_pct': [5.0, 3.0],
+        'min_close_after_limit': [0.95],
+        'stop_loss_pct': [-0.05, -0.08, -0.10],
+        'take_profit_trigger': [0.10, 0.15],
+    }
+    
+    backtest = AStockBacktest(years=YEARS)
+    backtest._load_data = lambda stock_pool, verbose, batch_size, on_stock=None: data
+    
+    start_time = time.time()
+    results = backtest.sweep(param_grid, workers=4, verbose=True)
+    sweep_elapsed = time.time() - start_time
+    assert len(results) == 12
+    assert results['total_trades'].notna().all()
+    
+    # 与逐组参数完整运行run的结果一致
+    start_time = time.time()
+    for _, row in results.iterrows():
+        single = AStockBacktest(years=YEARS, stop_loss_pct=row['stop_loss_pct'], take_profit_trigger=row['take_profit_trigger'])
+        single.strategy.params = {**single.strategy_params, 'limit_up_pct': row['limit_up_pct'],
+                                  'min_close_after_limit': row['min_close_after_limit']}
+        single._load_data = lambda stock_pool, verbose, batch_size, on_stock=None: data
+        metrics = single.run(verbose=False)
+        for metric in ('total_return', 'sharpe_ratio', 'max_drawdown', 'total_trades', 'win_rate', 'final_value'):
+            assert np.isclose(metrics[metric], row[metric], rtol=0, atol=1e-12), (metric, metrics[metric], row[metric])
+    loop_elapsed = time.time() - start_time
+    
+    print(results[['limit_up_pct', 'stop_loss_pct', 'take_profit_trigger', 'total_return', 'total_trades']].to_string(index=False))
+    print(f"参数扫描耗时: {sweep_elapsed:.2f} 秒, 逐组运行耗时: {loop_elapsed:.2f} 秒")
+    
+    # 单进程运行结果相同
+    serial = backtest.sweep(param_grid, workers=1, verbose=False)
+    pd.testing.assert_frame_equal(serial, results)
+    
+    comparison = backtest.compare_strategies([
+        {'stop_loss_pct': -0.05, 'limit_up_pct': 5.0, 'name': '止损5%'},
+        {'stop_loss_pct': -0.08, 'limit_up_pct': 5.0},
+    ])
+    assert list(comparison['strategy_name']) == ['止损5%', '策略2']
+    
+    # 配置中可单独设置初始资金，只在构造时生效的参数提示后忽略
+    configs = backtest.run_configs([
+        {'limit_up_pct': 5.0, 'initial_capital': 500000, 'min_holding_days': 3},
+        {'limit_up_pct': 5.0},
+    ], verbose=False)
+    single = AStockBacktest(years=YEARS, initial_capital=500000)
+    single.strategy.params = {**single.strategy_params, 'limit_up_pct': 5.0}
+    single._load_data = lambda stock_pool, verbose, batch_size, on_stock=None: data
+    assert configs['final_value'][0] == single.run(verbose=False)['final_value']
+    assert configs['final_value'][0] != configs['final_value'][1]
+    
+    try:
+        backtest.sweep({'unknown_param': [1]})
+        assert False
+    except ValueError:
+        pass
+    
+    print("\n测试完成！")
+
+def test_panel_sweep():
+    print("测试从内存映射面板扫描参数...")
+    
+    data = load_sample_data()
+    param_grid = {'limit_up_pct': [5.0, 3.0], 'stop_loss_pct': [-0.05, -0.08]}
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        panel_dir = os.path.join(tmp_dir, 'panel')
+        frames = write_panel(data, panel_dir).to_frames(years=YEARS)
+        
+        expected = AStockBacktest(years=YEARS, signal_cache_dir=None)
+        expected._load_data = lambda stock_pool, verbose, batch_size, on_stock=None: frames
+        
+        backtest = AStockBacktest(years=YEARS, signal_cache_dir=os.path.join(tmp_dir, 'signals'), panel_dir=panel_dir)
+        panel_data = backtest._load_data(None, False, 100)
+        assert isinstance(panel_data, PanelData) and list(panel_data) == list(frames)
+        
+        # 信号生成和信号缓存的指纹只读取面板的列，不生成日线DataFrame
+        stock_frame = MarketPanel.stock_frame
+        def no_frames(*args, **kwargs):
+            raise AssertionError("不应生成日线DataFrame")
+        MarketPanel.stock_frame = no_frames
+        try:
+            signals = backtest._get_signals(panel_data, False)
+        finally:
+            MarketPanel.stock_frame = stock_frame
+        pd.testing.assert_frame_equal(signals, expected._generate_signals(frames, False))
+        
+        # 工作进程收到的只是面板目录，结果与传入日线DataFrame一致
+        pd.testing.assert_frame_equal(backtest.sweep(param_grid, workers=2, verbose=False),
+                                      expected.sweep(param_grid, workers=1, verbose=False))
+        del panel_data
+        backtest.panel = None
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_parameter_sweep()
+    test_panel_sweep()
@@ -0,0 +1,98 @@
+from trade_ledger import TradeLedger, EquityCurve
+import pandas as pd
+import numpy as np
+import time
+
+def make_trades(num_trades: int, seed: int = 0) -> list:
+    """随机生成逐笔成交记录，字段与原来交易引擎记录的字典一致"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-05', periods=2500)
+    reasons = ['止损', '止盈', '时间止损', '回测结束']
+    trades = []
+    for i in range(num_trades):
+        entry = int(rng.integers(0, len(dates) - 30))
+        entry_price = float(np.round(rng.uniform(5, 50), 2))
+        exit_price = float(np.round(entry_price * rng.uniform(0.9, 1.2), 2))
+        quantity = int(rng.integers(1, 50)) * 100
+        trades.append({
+            'stock_code': f'sz{300000 + int(rng.integers(0, 3000)):06d}',
+            'entry_date': dates[entry],
+            'exit_date': dates[entry + int(rng.integers(1, 30))],
+            'entry_price': entry_price,
+            'exit_price': exit_price,
+            'quantity': quantity,
+            'return_pct': (exit_price - entry_price) / entry_price,
+            'profit': (exit_price - entry_price) * quantity,
+            'reason': f'{reasons[i % 4]} {i % 7}天',
+        })
+    for trade in trades:
+        trade['holding_days'] = (trade['exit_date'] - trade['entry_date']).days
+    return trades
+
+def fill_ledger(trades: list, capacity: int = 256) -> TradeLedger:
+    ledger = TradeLedger(capacity)
+    for t in trades:
+        ledger.append(t['stock_code'], t['entry_date'], t['exit_date'], t['entry_price'], t['exit_price'],
+                      t['quantity'], t['profit'], t['reason'])
+    return ledger
+
+def test_ledger_round_trip():
+    print("测试列式成交记录与逐笔字典一致...")
+    
+    trades = make_trades(500)
+    # 容量从1开始，覆盖多次扩容
+    ledger = fill_ledger(trades, capacity=1)
+    assert len(ledger) == len(trades)
+    assert list(ledger) == trades and ledger[-1] == trades[-1]
+    
+    df = ledger.to_frame()
+    expected = pd.DataFrame(trades)[list(df.columns)]
+    for column in ('stock_code', 'reason'):
+        expected[column] = expected[column].astype(df[column].dtype)
+    expected['entry_date'] = expected['entry_date'].astype('datetime64[ns]')
+    expected['exit_date'] = expected['exit_date'].astype('datetime64[ns]')
+    pd.testing.assert_frame_equal(df, expected)
+    
+    # 导出的数值列直接引用数组，之后继续追加不影响已导出的行
+    assert np.shares_memory(df['return_pct'].to_numpy(), ledger.arrays['return_pct'])
+    assert np.shares_memory(df['exit_date'].to_numpy(), ledger.arrays['exit_time'])
+    ledger.append('sz399999', trades[0]['entry_date'], trades[0]['exit_date'], 10.0, 11.0, 100, 100.0, '止盈')
+    pd.testing.assert_frame_equal(df, expected)
+    assert len(ledger.to_frame()) == len(trades) + 1
+    
+    curve = EquityCurve(1)
+    dates = pd.bdate_range('2016-01-04', periods=5)
+    for date, value in zip(dates, [100.0, 110.0, 99.0, 99.0, 120.0]):
+        curve.append(date, value)
+    assert [e['date'] for e in curve] == list(dates)
+    assert curve[1] == {'date': dates[1], 'portfolio_value': 110.0}
+    assert np.allclose(curve.returns(), [0, 0.1, -0.1, 0, 120 / 99 - 1])
+    assert curve.to_frame()['date'].tolist() == list(dates)
+    
+    print("测试完成！")
+
+def test_metrics_speed():
+    print("测试大量成交时统计指标的耗时...")
+    
+    trades = make_trades(100000)
+    ledger = fill_ledger(trades)
+    
+    start_time = time.time()
+    win_returns = [t['return_pct'] for t in trades if t['return_pct'] > 0]
+    lose_returns = [t['return_pct'] for t in trades if t['return_pct'] <= 0]
+    dict_stats = (len(win_returns), np.mean(win_returns), np.mean(lose_returns), pd.DataFrame(trades)['holding_days'].mean())
+    dict_time = time.time() - start_time
+    
+    start_time = time.time()
+    returns = ledger.return_pct
+    ledger_stats = ((returns > 0).sum(), returns[returns > 0].mean(), returns[returns <= 0].mean(), ledger.holding_days.mean())
+    ledger_time = time.time() - start_time
+    
+    print(f"{len(trades)} 笔交易: 逐笔字典 {dict_time:.3f} 秒, 列式数组 {ledger_time:.3f} 秒")
+    assert np.allclose(dict_stats, ledger_stats)
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_ledger_round_trip()
+    test_metrics_speed()
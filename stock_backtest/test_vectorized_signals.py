@@ -0,0 +1,89 @@
+from a_stock_backtest_optimized import AStockBacktest, LimitUpStrategy
+from data_cache_optimized import OptimizedDataCache
+import pandas as pd
+import time
+import os
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_cache')
+YEARS = [2015, 2016, 2017]
+
+def load_sample_data(max_stocks: int = 10):
+    cache = OptimizedDataCache(CACHE_DIR)
+    data = {}
+    for file in sorted(os.listdir(CACHE_DIR))[:max_stocks]:
+        stock_code = file.split('_')[0]
+        df = cache.load_from_cache(stock_code, YEARS)
+        if not df.empty:
+            data[stock_code] = df
+    return data
+
+def test_vectorized_signals_match_loop():
+    print("测试向量化信号与逐行循环是否一致...")
+    
+    data = load_sample_data()
+    print(f"使用 {len(data)} 只股票进行测试...")
+    
+    param_sets = [
+        {'limit_up_pct': 9.9, 'min_close_after_limit': 0.70, 'min_volume_ratio': 1.2, 'days_to_check': 20},
+        {'limit_up_pct': 5.0, 'min_close_after_limit': 0.95, 'min_volume_ratio': 1.0, 'days_to_check': 10},
+        {'limit_up_pct': 3.0, 'min_close_after_limit': 0.98, 'min_volume_ratio': 0.8, 'days_to_check': 30},
+    ]
+    
+    for params in param_sets:
+        backtest = AStockBacktest(years=YEARS)
+        backtest.strategy.params = params
+        
+        backtest.strategy.vectorized = False
+        start_time = time.time()
+        loop_signals = backtest._generate_signals(data, verbose=False)
+        loop_elapsed = time.time() - start_time
+        
+        backtest.strategy.vectorized = True
+        start_time = time.time()
+        vector_signals = backtest._generate_signals(data, verbose=False)
+        vector_elapsed = time.time() - start_time
+        
+        pd.testing.assert_frame_equal(loop_signals, vector_signals, check_exact=True)
+        print(f"参数 {params}: 信号数 {len(vector_signals)}, "
+              f"逐行 {loop_elapsed:.2f} 秒, 向量化 {vector_elapsed:.3f} 秒")
+    
+    print("\n测试完成！")
+
+def test_helper_overrides_disable_vectorized():
+    print("测试重写辅助方法时回退到逐行选股...")
+    
+    data = load_sample_data(5)
+    params = {'limit_up_pct': 5.0, 'min_close_after_limit': 0.95, 'min_volume_ratio': 1.0, 'days_to_check': 10}
+    
+    # 只重写is_limit_up：涨停阈值改为涨幅达到参数的80%
+    class LooseLimitUp(LimitUpStrategy):
+        def is_limit_up(self, pct_change):
+            return pct_change >= self.params['limit_up_pct'] * 0.8
+    
+    class CountOverride(LimitUpStrategy):
+        def count_limit_up_days(self, df, end_idx):
+            return 1
+    
+    class InfoOverride(LimitUpStrategy):
+        def get_latest_limit_up_info(self, df, end_idx):
+            return super().get_latest_limit_up_info(df, end_idx)
+    
+    # 同时提供了向量化实现的子类仍使用select_signals
+    class Both(LooseLimitUp):
+        def select_signals(self, df):
+            return super().select_signals(df)
+    
+    assert LimitUpStrategy.vectorized and Both.vectorized
+    assert not LooseLimitUp.vectorized and not CountOverride.vectorized and not InfoOverride.vectorized
+    
+    backtest = AStockBacktest(years=YEARS, signal_cache_dir=None)
+    base = backtest._generate_signals(data, False, LimitUpStrategy(dict(params)))
+    loose = backtest._generate_signals(data, False, LooseLimitUp(dict(params)))
+    # 重写的is_limit_up生效，信号与基类不同
+    assert not loose.equals(base)
+    
+    print("测试完成！")
+
+if __name__ == "__main__":
+    test_vectorized_signals_match_loop()
+    test_helper_overrides_disable_vectorized()
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+from performance import simple_returns
+from typing import Dict, Iterator, List
+
+NS_PER_DAY = 86400 * 10**9
+
+class _Columns:
+    """只追加的列式存储：每列一个预分配的定长数组，写满后容量翻倍；对外只暴露已写入部分的视图"""
+    COLUMNS: Dict[str, type] = {}
+    
+    def __init__(self, capacity: int = 256):
+        self.capacity = max(1, capacity)
+        self.size = 0
+        self.arrays = {name: np.zeros(self.capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def _grow(self):
+        for name, array in self.arrays.items():
+            self.arrays[name] = np.concatenate([array, np.zeros(self.capacity, dtype=array.dtype)])
+        self.capacity *= 2
+    
+    def _next_row(self) -> int:
+        if self.size == self.capacity:
+            self._grow()
+        self.size += 1
+        return self.size - 1
+    
+    def column(self, name: str) -> np.ndarray:
+        # 已写入的行不再改动，视图在之后追加或扩容时保持不变
+        return self.arrays[name][:self.size]
+    
+    def _row_index(self, i: int) -> int:
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        return i
+
+class _Labels:
+    """字符串 -> 整数编号，编号按首次出现的顺序分配"""
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.labels: List[str] = []
+    
+    def __call__(self, label: str) -> int:
+        label_id = self.ids.get(label)
+        if label_id is None:
+            label_id = self.ids[label] = len(self.labels)
+            self.labels.append(label)
+        return label_id
+    
+    def categorical(self, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, categories=pd.Index(self.labels, dtype=object))
+
+class TradeLedger(_Columns):
+    """成交记录：股票代码和卖出原因存为编号，日期存为纳秒整数，其余为数值列"""
+    COLUMNS = {
+        'code': np.int32,
+        'entry_time': np.int64,
+        'exit_time': np.int64,
+        'entry_price': np.float64,
+        'exit_price': np.float64,
+        'quantity': np.int64,
+        'return_pct': np.float64,
+        'profit': np.float64,
+        'reason': np.int32,
+    }
+    
+    def __init__(self, capacity: int = 256):
+        super().__init__(capacity)
+        self.codes = _Labels()
+        self.reasons = _Labels()
+    
+    def append(self, stock_code: str, entry_date: pd.Timestamp, exit_date: pd.Timestamp, entry_price: float,
+               exit_price: float, quantity: int, profit: float, reason: str):
+        row = self._next_row()
+        arrays = self.arrays
+        arrays['code'][row] = self.codes(stock_code)
+        arrays['entry_time'][row] = pd.Timestamp(entry_date).value
+        arrays['exit_time'][row] = pd.Timestamp(exit_date).value
+        arrays['entry_price'][row] = entry_price
+        arrays['exit_price'][row] = exit_price
+        arrays['quantity'][row] = quantity
+        arrays['return_pct'][row] = (exit_price - entry_price) / entry_price
+        arrays['profit'][row] = profit
+        arrays['reason'][row] = self.reasons(reason)
+    
+    @property
+    def return_pct(self) -> np.ndarray:
+        return self.column('return_pct')
+    
+    @property
+    def holding_days(self) -> np.ndarray:
+        return (self.column('exit_time') - self.column('entry_time')) // NS_PER_DAY
+    
+    def stock_codes(self) -> pd.Categorical:
+        return self.codes.categorical(self.column('code'))
+    
+    def reason_labels(self) -> pd.Categorical:
+        return self.reasons.categorical(self.column('reason'))
+    
+    def to_frame(self) -> pd.DataFrame:
+        """导出为DataFrame，数值列和日期列直接引用数组，不复制"""
+        return pd.DataFrame({
+            'stock_code': self.stock_codes(),
+            'entry_date': self.column('entry_time').view('datetime64[ns]'),
+            'exit_date': self.column('exit_time').view('datetime64[ns]'),
+            'entry_price': self.column('entry_price'),
+            'exit_price': self.column('exit_price'),
+            'quantity': self.column('quantity'),
+            'return_pct': self.column('return_pct'),
+            'holding_days': self.holding_days,
+            'profit': self.column('profit'),
+            'reason': self.reason_labels(),
+        }, copy=False)
+    
+    def __getitem__(self, i: int) -> Dict:
+        """单笔交易的字典形式，与原来逐笔记录的字段一致"""
+        i = self._row_index(i)
+        arrays = self.arrays
+        return {
+            'stock_code': self.codes.labels[arrays['code'][i]],
+            'entry_date': pd.Timestamp(arrays['entry_time'][i]),
+            'exit_date': pd.Timestamp(arrays['exit_time'][i]),
+            'entry_price': float(arrays['entry_price'][i]),
+            'exit_price': float(arrays['exit_price'][i]),
+            'quantity': int(arrays['quantity'][i]),
+            'return_pct': float(arrays['return_pct'][i]),
+            'holding_days': int((arrays['exit_time'][i] - arrays['entry_time'][i]) // NS_PER_DAY),
+            'profit': float(arrays['profit'][i]),
+            'reason': self.reasons.labels[arrays['reason'][i]],
+        }
+    
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self.size):
+            yield self[i]
+
+class EquityCurve(_Columns):
+    """逐日净值：日期存为纳秒整数"""
+    COLUMNS = {
+        'time': np.int64,
+        'portfolio_value': np.float64,
+    }
+    
+    def append(self, date: pd.Timestamp, portfolio_value: float):
+        row = self._next_row()
+        self.arrays['time'][row] = pd.Timestamp(date).value
+        self.arrays['portfolio_value'][row] = portfolio_value
+    
+    @property
+    def dates(self) -> np.ndarray:
+        return self.column('time').view('datetime64[ns]')
+    
+    @property
+    def values(self) -> np.ndarray:
+        return self.column('portfolio_value')
+    
+    def returns(self) -> np.ndarray:
+        """逐日收益率，第一天为0"""
+        return simple_returns(self.values)
+    
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({'date': self.dates, 'portfolio_value': self.values}, copy=False)
+    
+    def __getitem__(self, i: int) -> Dict:
+        i = self._row_index(i)
+        return {'date': pd.Timestamp(self.arrays['time'][i]), 'portfolio_value': float(self.arrays['portfolio_value'][i])}
+    
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self.size):
+            yield self[i]